@@ -47,7 +47,7 @@ if __name__ == "__main__":
         # load the world file, catch any warnings and manually log them
         # to make the output less ugly
         with warnings.catch_warnings(record=True) as warn_list:
-            world = World.from_file(args.world)
+            world = World.from_file(args.world, use_cache=True)
         for warn in warn_list:
             logging.warning(str(warn.message))
     else:
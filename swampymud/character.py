@@ -9,10 +9,12 @@ import enum
 import functools
 import inspect
 import weakref
-import asyncio
+from collections.abc import Mapping
 import swampymud.inventory as inv
 from swampymud import util
 from swampymud.util.shadowdict import ShadowDict
+from swampymud.util.msgqueue import MessageQueue, OverflowPolicy
+from swampymud.util.dirty import mark_dirty
 
 class Filter:
     """Filter for screening out certain CharacterClasses and Characters
@@ -39,6 +41,11 @@ class Filter:
     WHITELIST = _FilterMode.WHITELIST
     BLACKLIST = _FilterMode.BLACKLIST
 
+    # incremented whenever any Filter is changed by include / exclude,
+    # so that anything derived from Filters (e.g. the command tables of
+    # each CharacterClass) knows to recompute itself
+    generation = 0
+
     def __init__(self, mode, classes=(),
                  include_chars=(), exclude_chars=()):
         """initialize a Filter with [mode]
@@ -61,6 +68,9 @@ class Filter:
         # prevent them from getting garbage collected
         self._include_chars = weakref.WeakSet(include_chars)
         self._exclude_chars = weakref.WeakSet(exclude_chars)
+        # cache of permits() results for each CharacterClass
+        # (this is cleared whenever _classes changes)
+        self._class_cache = {}
         if isinstance(mode, self._FilterMode):
             self._mode = mode
         elif isinstance(mode, bool):
@@ -90,22 +100,28 @@ class Filter:
                 return False
             # now try the Character's class
             other = type(other)
-        if isinstance(other, CharacterClass):
-            # cycle through each ancestor
-            ancestors = filter(lambda x: isinstance(x, CharacterClass),
-                               other.__mro__)
-            for char_class in ancestors:
-                if char_class in self._classes:
-                    return self._mode.value
         # "other" is neither a CharClass nor Character
-        else:
+        if not isinstance(other, CharacterClass):
             return False
+        try:
+            return self._class_cache[other]
+        except KeyError:
+            pass
+        # cycle through each ancestor
+        for char_class in other.__mro__:
+            if char_class in self._classes:
+                result = self._mode.value
+                break
         # the character / ancestors cannot be found in the list
-        return not self._mode.value
+        else:
+            result = not self._mode.value
+        self._class_cache[other] = result
+        return result
 
     def include(self, other):
         """Set the filter to return 'True' if [other] is supplied
         to permit()"""
+        Filter.generation += 1
         # check that other is a Character / CharacterClass
         if isinstance(other, CharacterClass):
             if self._mode is Filter.WHITELIST:
@@ -113,6 +129,7 @@ class Filter:
             else:
                 if other in self._classes:
                     self._classes.remove(other)
+            self._class_cache.clear()
         elif isinstance(other, Character):
             if other in self._exclude_chars:
                 self._exclude_chars.remove(other)
@@ -124,6 +141,7 @@ class Filter:
     def exclude(self, other):
         """Set the filter to return 'False' if [other] is supplied
         to permit()"""
+        Filter.generation += 1
         # check that other is a Character / CharacterClass
         if isinstance(other, CharacterClass):
             if self._mode == Filter.WHITELIST:
@@ -131,6 +149,7 @@ class Filter:
                     self._classes.remove(other)
             else:
                 self._classes.add(other)
+            self._class_cache.clear()
         elif isinstance(other, Character):
             if other in self._include_chars:
                 self._include_chars.remove(other)
@@ -206,6 +225,8 @@ class Command(functools.partial):
         self.label = None
         # by default, add a filter that permits all (empty blacklist)
         self.filter = Filter(Filter.BLACKLIST)
+        # maps (name, label) to the help entry (see help_entry)
+        self._help_cache = {}
 
     def __eq__(self, other):
         """Two commands are equal iff the base functions are equal,
@@ -221,6 +242,14 @@ class Command(functools.partial):
         """overriding hash"""
         return hash((self.func, self.args, self._keys))
 
+    def __get__(self, obj, objtype=None):
+        """Commands stored in a class are bound like normal methods
+        when accessed from an instance (e.g. bill.say is equivalent to
+        Character.say.specify(bill))"""
+        if obj is None:
+            return self
+        return self.specify(obj)
+
     def specify(self, *newargs, **new_keywords) -> 'Command':
         """Derive a new version of this function by applying additional
         arguments.
@@ -238,6 +267,8 @@ class Command(functools.partial):
         # note that a new filter is not created, so any changes to the
         # old NewCommand will change to the old Command, and visa versa
         new_cmd.filter = self.filter
+        # the help entry is shared as well
+        new_cmd._help_cache = self._help_cache
         return new_cmd
 
     def __str__(self):
@@ -250,9 +281,17 @@ class Command(functools.partial):
 
     def help_entry(self) -> str:
         """return a help message for this command"""
+        key = (self.name, self.label)
+        try:
+            return self._help_cache[key]
+        except KeyError:
+            pass
         if self.label is not None:
-            return f"{self} [from {self.label}]:\n{self.__doc__}"
-        return f"{self}:\n{self.__doc__}"
+            entry = f"{self} [from {self.label}]:\n{self.__doc__}"
+        else:
+            entry = f"{self}:\n{self.__doc__}"
+        self._help_cache[key] = entry
+        return entry
 
     @staticmethod
     def with_traits(name: str = None, label: str = None,
@@ -273,6 +312,16 @@ class Command(functools.partial):
         return decorator
 
 
+class Handoff(Exception):
+    """Raised when a character tries to enter a remote Location (one
+    that is simulated by another process, see sharding). The character
+    is left where it was."""
+
+    def __init__(self, location):
+        super().__init__(location)
+        self.location = location
+
+
 class CharacterClass(type):
     """metaclass establishing basic Character behaviors
     CharacterClasses include the following important attributes:
@@ -307,14 +356,103 @@ class CharacterClass(type):
             cls._commands.update(base._local_commands)
         cls._commands.update(cls._local_commands)
 
+        # table of the commands permitted for this class, built lazily
+        # (see command_table)
+        cls._cmd_table = None
+        cls._cmd_table_gen = None
+
+        # help menus shared by characters of this class, mapping each
+        # location to a (version, menu) tuple (see Character.help_menu)
+        # (weak, so that the class does not keep locations alive)
+        cls._help_menus = weakref.WeakKeyDictionary()
+
         # calling the super init
         super().__init__(name, bases, namespace)
 
+    def command_table(cls):
+        """return a dict mapping command names to tuples of the form
+        (Command, check_chars), one for each of this class's Commands
+        whose filter permits this class.
+        If check_chars is True, the Command's filter also includes or
+        excludes specific characters, so it must be checked for each
+        character. (Such Commands are in the table even if the class
+        itself is not permitted.)
+        The table is shared by all characters of this class, and is
+        rebuilt only when a Filter changes.
+        """
+        if cls._cmd_table_gen != Filter.generation:
+            table = {}
+            for name, cmd in cls._commands.items():
+                cmd_filter = cmd.filter
+                check_chars = bool(cmd_filter._include_chars or
+                                   cmd_filter._exclude_chars)
+                if check_chars or cmd_filter.permits(cls):
+                    table[name] = (cmd, check_chars)
+            cls._cmd_table = table
+            cls._cmd_table_gen = Filter.generation
+        return cls._cmd_table
+
     def __str__(cls):
         """overriding str to return classname"""
         return cls.classname
 
 
+class CharacterCommands(Mapping):
+    """read-only mapping of the Commands available to a particular
+    Character from its class and from the entities in its location
+    Entity Commands shadow class Commands with the same name.
+    (This mapping is the base of a Character's cmd_dict, so Commands
+    pushed onto the cmd_dict, such as those of equipped items, shadow
+    entity Commands no matter which was added most recently.)
+    Both are found using shared tables (see CharacterClass.command_table
+    and Location.command_table), and Commands are bound to the
+    Character only when they are looked up.
+    """
+    __slots__ = ("_char",)
+
+    def __init__(self, char):
+        self._char = char
+
+    def _location_table(self):
+        """return the command table of the character's location, or an
+        empty dict if the character is not in a location"""
+        char = self._char
+        location = char.location
+        # spawning characters have a location, but are not in it yet
+        if location is None or char not in location.characters:
+            return {}
+        return location.command_table(type(char))
+
+    def __getitem__(self, name):
+        char = self._char
+        # entity commands, with the most recent entity first
+        entries = self._location_table().get(name, ())
+        for entity, cmd, check_chars in entries:
+            if not check_chars or cmd.filter.permits(char):
+                return cmd.specify(entity, char)
+        cmd, check_chars = type(char).command_table()[name]
+        if check_chars and not cmd.filter.permits(char):
+            raise KeyError(name)
+        return cmd.specify(char)
+
+    def __iter__(self):
+        char = self._char
+        table = type(char).command_table()
+        for name, (cmd, check_chars) in table.items():
+            if not check_chars or cmd.filter.permits(char):
+                yield name
+        for name, entries in self._location_table().items():
+            if name in table:
+                continue
+            for _, cmd, check_chars in entries:
+                if not check_chars or cmd.filter.permits(char):
+                    yield name
+                    break
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
 class Character(metaclass=CharacterClass):
     """Base class for all other CharacterClasses"""
 
@@ -330,24 +468,29 @@ class Character(metaclass=CharacterClass):
     # Valid equip slots for characters of this class
     equip_slots = []
 
+    # Limits for the queue of messages waiting to be sent to the player
+    # (None means no limit), and what to do when the queue overflows
+    msg_limit = 1000
+    msg_byte_limit = 2 ** 20
+    overflow_policy = OverflowPolicy.DROP_OLDEST
+
+    # How often (in seconds) the server calls 'update' on characters of
+    # this class (None means never)
+    update_interval = None
+
     def __init__(self, name=None):
         super().__init__()
         self._name = name
         self.location = None
-        self.msgs = asyncio.Queue()
-
-        # build dict from Commands collected by CharacterClass
-        self.cmd_dict = ShadowDict()
-        for (name, cmd) in self._commands.items():
-            cmd = cmd.specify(self)
-            # add command only if filter permits it
-            if cmd.filter.permits(self):
-                self.cmd_dict[name] = cmd
-            # because sCommands are not bound properly like a normal
-            # method, we must manually bind the methods
-            # TODO: override getattribute__ to solve the super() issue?
-            if isinstance(getattr(self, cmd.func.__name__), Command):
-                setattr(self, cmd.func.__name__, cmd)
+        self.msgs = MessageQueue(self.msg_limit, self.msg_byte_limit,
+                                 self.overflow_policy)
+
+        # the Commands collected by CharacterClass and the entities in
+        # the character's location are looked up lazily, and other
+        # Commands (e.g. from equipped items) are layered on top of them
+        self.cmd_dict = ShadowDict(base=CharacterCommands(self))
+        # (key, menu) tuple, used if the help menu cannot be shared
+        self._help_cache = None
 
         # set up inventory and equipping items
         self.inv = inv.Inventory()
@@ -368,8 +511,8 @@ class Character(metaclass=CharacterClass):
             self._parser(msg)
 
     def update(self):
-        """periodically called method that updates character state"""
-        print(f"[{self}] received update")
+        """periodically called method that updates character state
+        (see 'update_interval')"""
 
     def spawn(self, spawn_location):
         """Send a greeting to the character and put them into a
@@ -392,9 +535,10 @@ class Character(metaclass=CharacterClass):
         if self.location is not None:
             self.location.message(f"{self} died.", exclude={self})
             try:
-                self.location.characters.remove(self)
-            except ValueError:
+                self.location.remove_char(self)
+            except KeyError:
                 pass
+            mark_dirty(self.location, self)
         self.location = None
         self._parser = self._dead_parser
 
@@ -424,10 +568,12 @@ class Character(metaclass=CharacterClass):
         # command is always the first word
         args = line.split()
         cmd_name = args[0]
-        if not cmd_name in self.cmd_dict:
+        # a single lookup, since looking up an entity or class command
+        # binds it to this character
+        cmd = self.cmd_dict.get(cmd_name)
+        if cmd is None:
             self.message("Command \'%s\' not recognized." % cmd_name)
             return
-        cmd = self.cmd_dict[cmd_name]
         cmd(args)
 
     def _dead_parser(self, line: str):
@@ -457,26 +603,26 @@ class Character(metaclass=CharacterClass):
     #location manipulation methods
     def set_location(self, new_location):
         """sets location, updating the previous and new locations as
-        necessary and gathering commands from any entities in the
-        location
+        necessary and triggering any entities in the locations
+        (commands from entities are looked up lazily, so they do not
+        need to be added / removed here)
+        raises Handoff if [new_location] is remote
         """
+        if new_location.remote:
+            raise Handoff(new_location)
         try:
-            self.location.characters.remove(self)
-            # remove commands from all the entities
-            # in the current location
-            for entity in self.location.entities:
+            self.location.remove_char(self)
+            # trigger the entities in the current location
+            for entity in self.location.entities_with("on_exit"):
                 entity.on_exit(self)
-                entity.remove_cmds(self)
         except AttributeError:
             # location was none
             pass
         self.location = new_location
         self.location.add_char(self)
-        # add commands from all the entities
-        # in the current locations
-        for entity in new_location.entities:
+        # trigger the entities in the new location
+        for entity in new_location.entities_with("on_enter"):
             entity.on_enter(self)
-            entity.add_cmds(self)
 
     #inventory/item related methods
     def add_item(self, item, amt=1):
@@ -485,6 +631,7 @@ class Character(metaclass=CharacterClass):
         if isinstance(item, inv.ItemStack):
             self.inv.add_item(item.copy(), item.amount)
         self.inv.add_item(item, amt)
+        mark_dirty(self)
 
     def equip(self, item, from_inv=True):
         """place [item] in this player's equip dict
@@ -553,7 +700,6 @@ class Character(metaclass=CharacterClass):
         If no command is supplied, a list of all commands is shown.
         """
         if len(args) < 2:
-            # TODO: cache this or something
             menu = self.help_menu()
             self.message(menu)
         else:
@@ -587,22 +733,20 @@ class Character(metaclass=CharacterClass):
         """
         ex_name = " ".join(args[1:])
 
-        # Manually iterating over our location's list of exits
+        # Look up the exit directly in our location's name index.
         # Note! If writing your own method, just do
         #   util.find(location, ex_name, location.Exit, char=my_char)
         # I'm only writing this to avoid a cyclic dependency.
-
-        for ex in self.location._exit_list:
-            if ex_name in ex.names:
-                found_exit = ex
-                break
-        else:
+        found_exit = self.location.find_exit(ex_name)
+        if found_exit is None:
             self.message(f"No exit with name '{ex_name}'.")
             return
 
         if found_exit.interact.permits(self):
             old_location = self.location
             new_location = found_exit.destination
+            if new_location.remote:
+                raise Handoff(new_location)
             new_location.message(f"{self} entered.")
             self.set_location(new_location)
             # TODO: only show the exit if a character can see it?
@@ -616,6 +760,37 @@ class Character(metaclass=CharacterClass):
             else:
                 self.message(f"No exit with name '{ex_name}'.")
 
+    @Command
+    def travel(self, args):
+        """Travel to a distant location by the shortest route.
+        usage: travel [location name]
+        """
+        if len(args) < 2:
+            self.message("Provide a location to travel to.")
+            return
+        name = " ".join(args[1:])
+        graph = self.location.graph
+        if graph is None:
+            self.message("You cannot travel from here.")
+            return
+        # if several locations have this name, go to the closest one
+        route = None
+        for goal in graph.locations_named(name):
+            found = graph.path(self.location, goal, self)
+            if found is not None and (route is None or
+                                      len(found) < len(route)):
+                route = found
+        if route is None:
+            self.message(f"Could not find a route to '{name}'.")
+        elif not route:
+            self.message(f"You are already in {self.location}.")
+        for ex in route or ():
+            old_location = self.location
+            self.go(["go", str(ex)])
+            # stop if something prevented us from moving
+            if self.location is old_location:
+                break
+
     @Command.with_traits(name="equip")
     def cmd_equip(self, args):
         """Equip an equippable item from your inventory."""
@@ -707,10 +882,9 @@ class Character(metaclass=CharacterClass):
                 equipped.append(f"{target}: {item[0]}")
         equipped.sort()
         self.message("\n".join(equipped))
-        inv_msg = self.inv.readable()
         # only send a message if inv has items
-        if inv_msg:
-            self.message(inv_msg)
+        if self.inv.item_count:
+            self.message(self.inv.readable())
 
     @Command.with_traits(name="use")
     def cmd_use(self, args):
@@ -738,6 +912,54 @@ class Character(metaclass=CharacterClass):
 
     # miscellaneous methods
     def help_menu(self) -> str:
+        """return a menu of this character's commands, grouped by label
+        Menus are cached until a Filter changes, an entity enters / leaves
+        the character's location, or the character moves. Characters of
+        the same class in the same location share one menu, unless they
+        have commands of their own (e.g. from an equipped item).
+        """
+        location = self.location
+        # spawning characters have a location, but are not in it yet
+        if location is not None and self not in location.characters:
+            location = None
+        if location is None:
+            version = (Filter.generation, None)
+        else:
+            version = (Filter.generation, location._entity_version)
+        cmd_dict = self.cmd_dict
+        # characters outside of a location do not share menus
+        if location is not None and not cmd_dict.modified:
+            menus = type(self)._help_menus
+            cached = menus.get(location)
+            if cached is None or cached[0] != version:
+                # menus cannot be shared if a filter names characters
+                if self._filters_chars(location):
+                    cached = (version, None)
+                else:
+                    cached = (version, self._make_help_menu())
+                menus[location] = cached
+            if cached[1] is not None:
+                return cached[1]
+        key = (version, location, cmd_dict.version)
+        if self._help_cache is None or self._help_cache[0] != key:
+            self._help_cache = (key, self._make_help_menu())
+        return self._help_cache[1]
+
+    def _filters_chars(self, location):
+        """returns True if any Command available to this character's
+        class (from the class or from [location]) has a filter that
+        includes / excludes specific characters"""
+        table = type(self).command_table()
+        if any(check_chars for _, check_chars in table.values()):
+            return True
+        if location is None:
+            return False
+        return any(check_chars
+                   for entries in location.command_table(type(self)).values()
+                   for _, _, check_chars in entries)
+
+    def _make_help_menu(self) -> str:
+        """build a new help menu (see help_menu)"""
         sources = {}
         # walk the mro, to get the list of CharacterClasses in order
         for cls in reversed(type(self).__mro__):
@@ -1,6 +1,8 @@
 '''Module defining the entity class'''
 import inspect
+import warnings
 from swampymud.util import camel_to_space
+from swampymud.util.dirty import mark_dirty
 import swampymud.character as character
 
 
@@ -49,33 +51,40 @@ class Entity(metaclass=EntityClass):
         '''
         return self.classname
 
+    def view(self):
+        '''return a longer, user-focused depiction of this entity'''
+        return str(self)
+
     def set_location(self, new_location):
         '''sets location, updating previous location as appropriate'''
         try:
-            self.location.entities.remove(self)
-            # remove this entity's commands from all the
-            # characters in the current location
-            for char in self.location.characters:
-                self.remove_cmds(char)
+            self.location.remove_entity(self)
         except AttributeError:
             # location was none
             pass
+        # note that characters look up this entity's commands through
+        # the location, so we don't need to update the characters
         self.location = new_location
         self.location.add_entity(self)
-        # add this entity's commands to all the
-        # characters in the current location
-        for char in new_location.characters:
-            self.add_cmds(char)
 
     def add_cmds(self, char):
-        '''add a command to a character'''
+        '''add this entity's commands to [char]
+        Deprecated: characters now find the commands of the entities in
+        their location automatically (see Location.command_table).'''
+        warnings.warn("Entity.add_cmds is deprecated; characters use the "
+                      "commands of entities in their location "
+                      "automatically", DeprecationWarning, stacklevel=2)
         for cmd in self._commands.values():
             if cmd.filter.permits(char):
                 cmd = cmd.specify(self, char)
                 char.cmd_dict[str(cmd)] = cmd
 
     def remove_cmds(self, char):
-        '''remove all commands from this char from this entity'''
+        '''remove the commands added by add_cmds from [char]
+        Deprecated: see add_cmds.'''
+        warnings.warn("Entity.remove_cmds is deprecated; characters use "
+                      "the commands of entities in their location "
+                      "automatically", DeprecationWarning, stacklevel=2)
         for cmd in self._commands.values():
             cmd = cmd.specify(self, char)
             try:
@@ -89,9 +98,8 @@ class Entity(metaclass=EntityClass):
     def despawn(self):
         """removes entity from location and frees it for gc"""
         if self.location is not None:
-            for char in self.location.characters:
-                self.remove_cmds(character)
-            self.location.entities.remove(self)
+            self.location.remove_entity(self)
+            mark_dirty(self.location, self)
         self.location = None
 
     # these methods can be overriden
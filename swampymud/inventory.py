@@ -1,9 +1,12 @@
 """this module contains the Inventory, the class for storing all items,
 and ItemStack, a class for efficiently storing items of the same type
 """
-from collections import defaultdict
+from types import MappingProxyType
 from swampymud.util import FindParams
 
+# shared, read-only empty dict used by StackView.data
+_NO_DATA = MappingProxyType({})
+
 def matching_subset(main, sub):
     """check that all the keys in a dictionary are in sub and agree with main
     Example:
@@ -15,18 +18,39 @@ def matching_subset(main, sub):
     sub2 is not a "matching subset" of main since the field "foo" is not in main
     sub3 is not a "matching subset" since sub3["a"] = 0 but main["a"] == 3
     """
-    # check that all keys of sub are in main
-    main_keys = set(main)
-    sub_keys = set(sub)
-    if not sub_keys.issubset(main_keys):
-        return False
-    # check that all values of sub match with main
-    for key in sub_keys:
-        if main[key] != sub[key]:
+    for key, value in sub.items():
+        # check that all keys of sub are in main and that the values
+        # of sub match with main
+        if key not in main or main[key] != value:
             return False
     return True
 
 
+def freeze(data):
+    """return a hashable version of [data], where [data] is composed of
+    dicts, lists, sets, and hashable values (e.g. the data returned by
+    Item.save)
+    freeze(x) == freeze(y) if and only if x == y
+    """
+    if isinstance(data, dict):
+        return (dict, frozenset((key, freeze(value))
+                                for key, value in data.items()))
+    elif isinstance(data, list):
+        return (list, tuple(map(freeze, data)))
+    elif isinstance(data, (set, frozenset)):
+        return (set, frozenset(map(freeze, data)))
+    return data
+
+
+def stack_key(item_type, data):
+    """return a hashable key identifying stacks of [item_type] with
+    [data]"""
+    # None and {} both indicate that there is no data
+    if not data:
+        return (item_type, None)
+    return (item_type, freeze(data))
+
+
 class ItemStack:
     def __init__(self, item_type, amount, data=None):
         """create a new ItemStack with Item class [item_type], integer [amount]
@@ -39,6 +63,15 @@ class ItemStack:
         self._type = item_type
         self._amount = amount
         self._data = data
+        # str() of the items in this stack, computed when needed
+        self._name = None
+
+    @property
+    def name(self):
+        """returns the name of the items in this stack, i.e. str(item)"""
+        if self._name is None:
+            self._name = str(self.copy())
+        return self._name
 
     @property
     def amount(self):
@@ -87,8 +120,8 @@ class ItemStack:
 
         # check the optional fields
         if optional is not None and self._data is not None:
-            for key in set(self._data) & set(optional):
-                if self._data[key] != optional[key]:
+            for key, value in optional.items():
+                if key in self._data and self._data[key] != value:
                     return False
 
         # must_have is *slightly* different from exact, because
@@ -109,7 +142,9 @@ class ItemStack:
     @staticmethod
     def from_item(item, amount=1):
         """create an ItemStack from an existing item"""
-        return ItemStack(type(item), amount, item.save())
+        stack = ItemStack(type(item), amount, item.save())
+        stack._name = str(item)
+        return stack
 
     # serialization-related methods
     @classmethod
@@ -147,6 +182,46 @@ class ItemStack:
         pass
 
 
+class StackView:
+    """read-only view of an ItemStack
+    Views provide the name, type, amount, and data of a stack without
+    creating an Item. Call .item() to get an actual Item.
+    """
+    __slots__ = ("_stack",)
+
+    def __init__(self, stack):
+        self._stack = stack
+
+    @property
+    def name(self):
+        """name of the items in the stack"""
+        return self._stack.name
+
+    @property
+    def type(self):
+        """Item class of the items in the stack"""
+        return self._stack._type
+
+    @property
+    def amount(self):
+        """number of items in the stack"""
+        return self._stack._amount
+
+    @property
+    def data(self):
+        """read-only mapping of the data shared by the items"""
+        if self._stack._data is None:
+            return _NO_DATA
+        return MappingProxyType(self._stack._data)
+
+    def item(self):
+        """returns a new Item from the stack"""
+        return self._stack.copy()
+
+    def __repr__(self):
+        return f"StackView({self._stack!r})"
+
+
 # make the common case fast
 # this structure is optimized for name-based lookups
 class Inventory:
@@ -154,7 +229,18 @@ class Inventory:
     often accessed using a name"""
 
     def __init__(self, *items):
-        self._items = defaultdict(list)
+        # maps each name to a bucket, and each bucket maps stack keys
+        # (see stack_key) to ItemStacks
+        self._items = {}
+        # running totals, updated by add_item and remove_item
+        # (so stacks should not be modified directly)
+        self._stack_count = 0
+        self._item_count = 0
+        # map each name / exact item type to [stacks, items]
+        self._name_totals = {}
+        self._type_totals = {}
+        # incremented whenever the inventory changes
+        self._version = 0
         for (item, amt) in items:
             self.add_item(item, amt)
 
@@ -163,9 +249,60 @@ class Inventory:
 
     def __bool__(self):
         """returns True if the inventory contains any items"""
-        for _ in self:
-            return True
-        return False
+        return self._stack_count > 0
+
+    @property
+    def version(self):
+        """a number that changes whenever items are added / removed
+        (useful for caching anything derived from the inventory)"""
+        return self._version
+
+    @property
+    def stack_count(self):
+        """the number of distinct stacks in this inventory"""
+        return self._stack_count
+
+    @property
+    def item_count(self):
+        """the total number of items in this inventory"""
+        return self._item_count
+
+    def count(self, name=None, item_type=None, stacks=False):
+        """return the number of items in this inventory with [name]
+        and / or of exactly [item_type]
+        if [stacks] is True, the number of distinct stacks is returned
+        instead
+        """
+        index = 0 if stacks else 1
+        if name is not None:
+            name = name.lower()
+            if item_type is None:
+                return self._name_totals.get(name, (0, 0))[index]
+            # check the (small) bucket for stacks of the right type
+            total = 0
+            for stack in self._items.get(name, {}).values():
+                if stack._type is item_type:
+                    total += 1 if stacks else stack.amount
+            return total
+        if item_type is not None:
+            return self._type_totals.get(item_type, (0, 0))[index]
+        return self._stack_count if stacks else self._item_count
+
+    def _update_totals(self, name, item_type, stacks, items):
+        """add [stacks] and [items] to the running totals"""
+        self._version += 1
+        self._stack_count += stacks
+        self._item_count += items
+        for totals, key in ((self._name_totals, name),
+                            (self._type_totals, item_type)):
+            try:
+                entry = totals[key]
+            except KeyError:
+                entry = totals[key] = [0, 0]
+            entry[0] += stacks
+            entry[1] += items
+            if entry[0] == 0:
+                del totals[key]
 
     def add_item(self, item, amount=1):
         """add [quantity] of [item] to this inventory
@@ -176,40 +313,43 @@ class Inventory:
         name = str(item).lower()
         item_type = type(item)
         data = item.save()
-        for stack in self._items[name]:
-            if stack.matches(item_type, exact=data):
-                stack.amount += amount
-                break
+        key = stack_key(item_type, data)
+        try:
+            bucket = self._items[name]
+        except KeyError:
+            bucket = self._items[name] = {}
+        stack = bucket.get(key)
+        if stack is not None:
+            stack.amount += amount
+            self._update_totals(name, item_type, 0, amount)
         # otherwise, create a new stack
         else:
-            new_stack = ItemStack(item_type, amount, data)
-            self._items[name].append(new_stack)
+            stack = bucket[key] = ItemStack(item_type, amount, data)
+            stack._name = str(item)
+            self._update_totals(name, item_type, 1, amount)
 
     def remove_item(self, item, amount=1):
         """remove [item] from this dictionary
         raises KeyError if item is not found"""
         name = str(item).lower()
-        item_type = type(item)
-        item_data = item.save()
-        # raise an error if the key is not found
-        # this is to avoid creating an empty list at that key
-        if name not in self._items:
-            raise KeyError("Item not found in inventory: %r" % item)
-        # check all the stacks in the bucket
-        for index, stack in enumerate(self._items[name]):
-            if stack.matches(item_type, item_data):
-                # item found, remove [amount] of items
-                stack.amount -= amount
-                # if the stack is empty, remove it from the bucket
-                if stack.amount == 0:
-                    del self._items[name][index]
-                break
+        key = stack_key(type(item), item.save())
+        try:
+            bucket = self._items[name]
+            stack = bucket[key]
         # if nothing was found, raise an error
-        else:
+        except KeyError:
             raise KeyError("Item not found in inventory: %r" % item)
-        # if the bucket is empty, remove it from the dictionary
-        if not self._items[name]:
-            del self._items[name]
+        # item found, remove [amount] of items
+        stack.amount -= amount
+        removed_stacks = 0
+        # if the stack is empty, remove it from the bucket
+        if stack.amount == 0:
+            removed_stacks = 1
+            del bucket[key]
+            # if the bucket is empty, remove it from the dictionary
+            if not bucket:
+                del self._items[name]
+        self._update_totals(name, stack._type, -removed_stacks, -amount)
 
     def find_child(self, params: FindParams, exact=None, **other_fields):
         """
@@ -230,27 +370,33 @@ class Inventory:
         if params.name is not None:
             for name in params.name:
                 if name in self._items:
-                    for stack in self._items[name]:
+                    for stack in self._items[name].values():
                         if stack.matches(*match_args, **other_fields):
                             yield stack.copy(), stack.amount
         # if not, search through every bucket
         else:
-            for name, bucket in self._items.items():
-                for stack in bucket:
+            for bucket in self._items.values():
+                for stack in bucket.values():
                     if stack.matches(*match_args, **other_fields):
                         yield stack.copy(), stack.amount
 
     def __iter__(self):
         """iterate over each Item, Amount pair in the list"""
         for bucket in self._items.values():
-            for stack in bucket:
+            for stack in bucket.values():
                 yield stack.copy(), stack.amount
 
     def stacks(self):
         """iterate directly over the stacks of this list"""
         for bucket in self._items.values():
-            for stack in bucket:
-                yield stack
+            yield from bucket.values()
+
+    def views(self):
+        """iterate over a read-only StackView of each stack
+        (unlike __iter__, this does not create any Items)"""
+        for bucket in self._items.values():
+            for stack in bucket.values():
+                yield StackView(stack)
 
     # this makes inventories unhashable
     # but this is ok, because inventories are mutable
@@ -264,14 +410,11 @@ class Inventory:
                 other_bucket = other._items[item_name]
                 if len(other_bucket) != len(self_bucket):
                     return False
-                # TODO: make this not quadratic
-                # consider adding hash method to ItemStack
-                for self_stack in self_bucket:
-                    for other_stack in other_bucket:
-                        if self_stack == other_stack:
-                            break
-                    # if no matching stack is found, return False
-                    else:
+                # stacks are indexed by type and data, so we only need
+                # to check the stack with the same key
+                for key, self_stack in self_bucket.items():
+                    other_stack = other_bucket.get(key)
+                    if other_stack is None or self_stack != other_stack:
                         return False
             return True
         except AttributeError:
@@ -281,7 +424,7 @@ class Inventory:
         """returns a string representation of this inventory"""
         # get a tuple list of form (item_name, amount)
         #TODO: call another method other than 'string' to better represent object?
-        items = list(map(lambda x: f"{x[0]}: {x[1]}", self))
+        items = [f"{view.name}: {view.amount}" for view in self.views()]
         # sort by name
         items.sort(key=lambda x: x[0])
         return "\n".join(items)
@@ -13,6 +13,7 @@ including support for character.Command methods.
 '''
 import inspect
 import abc
+import weakref
 from typing import List
 from swampymud.util import camel_to_space
 from swampymud.character import Command, Character
@@ -121,13 +122,32 @@ class Equippable(Item, metaclass=EquippableClass):
     def add_cmds(self, char: Character):
         '''Add all the commands from this item to the char.
         Any conflicting commands are simply shadowed'''
+        tokens = []
         for cmd in self._commands.values():
             if cmd.filter.permits(char):
                 cmd = cmd.specify(self, char)
-                char.cmd_dict[str(cmd)] = cmd
+                tokens.append(char.cmd_dict.push(str(cmd), cmd))
+        # store the tokens, so that remove_cmds can remove the commands
+        # without searching for them
+        # (tokens are only unique within a character's cmd_dict, so
+        # they are keyed by the character itself)
+        if "_cmd_tokens" not in vars(self):
+            self._cmd_tokens = weakref.WeakKeyDictionary()
+        self._cmd_tokens[char] = tokens
 
     def remove_cmds(self, char: Character):
         '''remove all the commands from this item from char'''
+        tokens = vars(self).get("_cmd_tokens", {}).pop(char, None)
+        if tokens is not None:
+            for token in tokens:
+                try:
+                    char.cmd_dict.remove(token)
+                # command was already removed
+                except KeyError:
+                    pass
+            return
+        # the commands were not added with add_cmds, so we have to
+        # search for them
         for cmd in self._commands.values():
             cmd = cmd.specify(self, char)
             try:
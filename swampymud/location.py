@@ -11,6 +11,8 @@ and items.
 
 from typing import Iterable
 from swampymud import character as char, inventory, entity, util, item
+from swampymud.util.dirty import mark_dirty
+from swampymud.util.orderedset import OrderedSet
 
 class Exit:
     """Class representing an in-game Exit.
@@ -102,15 +104,41 @@ class Exit:
 
 class Location:
     """Class representing an in-game Location
-    Maintains a list of players
+    Maintains an (ordered) set of characters and entities
     Contains a list of exits to other locations
     Has a name and description
     """
 
     def __init__(self, name: str, description: str):
-        self.characters = []
-        self.entities = []
+        self.characters = OrderedSet()
+        self.entities = OrderedSet()
         self._exit_list = []
+        # maps lowercase names to the characters, exits, and entities
+        # with that name (exits are indexed under all of their names)
+        # NOTE: the index is updated when an object is added / removed,
+        # so objects should not be renamed while in a Location
+        self._name_index = {}
+        # maps id(obj) to the names that obj is indexed under
+        self._indexed_names = {}
+        # incremented whenever an entity is added or removed, so that
+        # the caches below know to recompute themselves
+        self._entity_version = 0
+        # maps each CharacterClass to a (version, command table) tuple
+        self._cmd_tables = {}
+        # maps entity hook names to a (version, entity list) tuple
+        self._hook_cache = {}
+        # like _entity_version, but for exits
+        self._exit_version = 0
+        # maps each section of view() to a (key, rendered section) tuple
+        self._view_cache = {}
+        # the navigation.ExitGraph containing this location, if any
+        self.graph = None
+        # every ExitGraph containing this location, notified when an
+        # exit is added
+        self._graphs = []
+        # if True, this location is simulated by another process, and
+        # characters cannot enter it (see sharding)
+        self.remote = False
         self.inv = inventory.Inventory()
         self.name = name
         self.description = description
@@ -121,6 +149,12 @@ class Location:
         Optional arguments:
         exclude -- a SET of characters / entities to be excluded
         """
+        if not exclude:
+            for character in self.characters:
+                character.message(msg)
+            for entity in self.entities:
+                entity.on_message(msg)
+            return
         for character in self.characters:
             if character not in exclude:
                 character.message(msg)
@@ -136,24 +170,105 @@ class Location:
         """adds an exit to this Location's list of exits, while checking
          for any ambigious names"""
         for exit_name in exit_to_add.names:
-            for already_added in self.exits:
-                assert exit_name not in already_added.names, \
+            for already_added in self.lookup(exit_name):
+                assert not (isinstance(already_added, Exit)
+                            and exit_name in already_added.names), \
                 f"Location {self} already has exit with name '{exit_name}'"
         self._exit_list.append(exit_to_add)
+        self._index(exit_to_add, exit_to_add.names)
+        self._exit_version += 1
+        for graph in self._graphs:
+            graph.exit_added(self, exit_to_add)
+        mark_dirty(self)
+
+    # methods for the name index
+    def _index(self, obj, names):
+        """add [obj] to the name index under each of [names]"""
+        keys = {name.lower() for name in names}
+        for key in keys:
+            self._name_index.setdefault(key, []).append(obj)
+        self._indexed_names[id(obj)] = keys
+
+    def _unindex(self, obj):
+        """remove [obj] from the name index"""
+        for key in self._indexed_names.pop(id(obj), ()):
+            matches = self._name_index[key]
+            for index, other in enumerate(matches):
+                if other is obj:
+                    del matches[index]
+                    break
+            if not matches:
+                del self._name_index[key]
+
+    # methods for entity commands and triggers
+    def command_table(self, char_class):
+        """return a dict mapping command names to lists of
+        (entity, Command, check_chars) tuples, for the Commands of
+        the entities in this location whose filters permit [char_class]
+        Each list is ordered with the most recently added entity first.
+        If check_chars is True, the Command's filter must be checked
+        for each character. (See CharacterClass.command_table.)
+        The table is cached until an entity is added / removed or a
+        Filter changes.
+        """
+        version = (self._entity_version, char.Filter.generation)
+        cached = self._cmd_tables.get(char_class)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        table = {}
+        for ent in reversed(self.entities):
+            for name, cmd in ent._commands.items():
+                cmd_filter = cmd.filter
+                check_chars = bool(cmd_filter._include_chars or
+                                   cmd_filter._exclude_chars)
+                if check_chars or cmd_filter.permits(char_class):
+                    table.setdefault(name, []).append(
+                        (ent, cmd, check_chars)
+                    )
+        self._cmd_tables[char_class] = (version, table)
+        return table
+
+    def entities_with(self, hook):
+        """return a list of the entities in this location that
+        override method [hook] (e.g. "on_enter")"""
+        cached = self._hook_cache.get(hook)
+        if cached is not None and cached[0] == self._entity_version:
+            return cached[1]
+        default = getattr(entity.Entity, hook)
+        entities = [ent for ent in self.entities
+                    if getattr(type(ent), hook) is not default]
+        self._hook_cache[hook] = (self._entity_version, entities)
+        return entities
+
+    def lookup(self, name):
+        """return a list of the characters, exits, and entities in this
+        location with [name] (ignoring case)"""
+        return self._name_index.get(name.lower(), [])
+
+    def find_exit(self, name):
+        """return the exit in this location with [name], or None if
+        there is no such exit"""
+        for obj in self.lookup(name):
+            if isinstance(obj, Exit) and name in obj.names:
+                return obj
 
     def find(self, query):
-        for char in self.characters:
-            if str(char) == query:
-                return char
-        for loc_exit in self.exits:
-            if str(loc_exit) == query:
-                return loc_exit
-        item_result = self.inv.find(name=query)
-        if item_result:
-            return item_result
-        for entity in self.entities:
-            if str(entity) == query:
-                return entity
+        matches = self.lookup(query)
+        for obj in matches:
+            if isinstance(obj, char.Character) and str(obj) == query:
+                return obj
+        for obj in matches:
+            if isinstance(obj, Exit) and str(obj) == query:
+                return obj
+        # (Inventory has no 'find' method, so we go through util.find)
+        # only search the inventory if it has items with that name
+        if self.inv.count(query):
+            item_result = util.find(self.inv, name=query)
+            # return the item from the first (item, amount) pair
+            return item_result[0][0]
+        for obj in matches:
+            if isinstance(obj, entity.Entity) and str(obj) == query:
+                return obj
 
     # TODO: add indefinite articles, oxford comma, etc.
     def view(self, viewer=None):
@@ -161,34 +276,74 @@ class Location:
         location.
         If [viewer] is supplied, then that character will be filtered
         out.
+        The exits and items sections are cached until an exit is
+        added or the inventory changes. Characters and entities are
+        viewed afresh each time, since their view() may depend on any
+        of their state.
         """
         output = [str(self), self.description]
 
         # remove any exits that character cannot see
-        exit_list = self._exit_list
-        if viewer is not None:
-            exit_list = [ex for ex in self.exits if ex.perceive.permits(char)]
+        exit_list = self._exit_views(viewer)
 
         if exit_list:
             output.append("Exits:")
-            output.extend([ex.view() for ex in exit_list])
+            output.extend(exit_list)
 
         transition = "You see"
 
         if self.characters:
-            output.append(f"""{transition} {', '.join(
-                [char.view() for char in self.characters if char is not viewer]
-            )}""")
+            output.append(f"{transition} {self._char_views(viewer)}")
             transition = "You also see"
         if self.entities:
-            output.append(f"""{transition} {', '.join(
-                [ent.view() for ent in self.entities]
-            )}""")
-        if self.inv:
+            output.append(f"{transition} {self._entity_views()}")
+        if self.inv.item_count:
             output.append("Items available:")
-            output.append(self.inv.readable())
+            output.append(self._cached("items", (self.inv, self.inv.version),
+                                       self.inv.readable))
         return "\n".join(output)
 
+    def _cached(self, section, key, render):
+        """return the cached [section] of view(), calling [render] to
+        update the section if [key] has changed"""
+        cached = self._view_cache.get(section)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        value = render()
+        self._view_cache[section] = (key, value)
+        return value
+
+    def _exit_views(self, viewer):
+        """return a list of views of the exits that [viewer] can see"""
+        if viewer is None:
+            return self._cached("exits", self._exit_version,
+                                lambda: [ex.view() for ex in self._exit_list])
+        # each class may see a different set of exits, and some exits
+        # must be checked for each character
+        def render():
+            entries = []
+            for ex in self._exit_list:
+                perceive = ex.perceive
+                check_chars = bool(perceive._include_chars or
+                                   perceive._exclude_chars)
+                if check_chars or perceive.permits(type(viewer)):
+                    entries.append((ex, ex.view(), check_chars))
+            return entries
+        key = (self._exit_version, char.Filter.generation)
+        entries = self._cached(("exits", type(viewer)), key, render)
+        return [ex_view for ex, ex_view, check_chars in entries
+                if not check_chars or ex.perceive.permits(viewer)]
+
+    def _char_views(self, viewer):
+        """return the views of each character (except [viewer]),
+        joined with commas"""
+        return ", ".join(other.view() for other in self.characters
+                         if other is not viewer)
+
+    def _entity_views(self):
+        """return the views of each entity, joined with commas"""
+        return ", ".join(ent.view() for ent in self.entities)
+
     def __repr__(self):
         return f"Location{repr((self.name, self.description))}"
 
@@ -232,24 +387,73 @@ class Location:
     # these methods are redundant, but necessary for when World Tree
     # is traversed during serialization
     def add_char(self, char):
-        self.characters.append(char)
+        self.characters.add(char)
+        self._index(char, (str(char),))
+        # characters loaded from the World Tree have no location yet
+        char.location = self
+        mark_dirty(self, char)
+
+    def remove_char(self, char):
+        """remove [char] from this location
+        raises KeyError if [char] is not in this location
+        """
+        self.characters.remove(char)
+        self._unindex(char)
+        mark_dirty(self)
 
     def add_entity(self, entity):
-        self.entities.append(entity)
+        self.entities.add(entity)
+        self._index(entity, (str(entity),))
+        self._entity_version += 1
+        entity.location = self
+        mark_dirty(self, entity)
+
+    def remove_entity(self, entity):
+        """remove [entity] from this location
+        raises KeyError if [entity] is not in this location
+        """
+        self.entities.remove(entity)
+        self._unindex(entity)
+        self._entity_version += 1
+        mark_dirty(self)
 
     def add_item(self, item, quantity=1):
         self.inv.add_item(item, quantity)
+        mark_dirty(self)
 
     # helper method for util.find
     def find_child(self, params: util.FindParams, **other_fields):
         # check that maxdepth hasn't been exceeded
         if params.maxdepth < 0:
             return
+        # if we have names, use the name index to skip objects that
+        # cannot possibly match
+        if params.name is not None:
+            matches = []
+            seen = set()
+            for name in params.name:
+                for obj in self._name_index.get(name, ()):
+                    if id(obj) not in seen:
+                        seen.add(id(obj))
+                        matches.append(obj)
+            exit_list = [obj for obj in matches if isinstance(obj, Exit)]
+        else:
+            exit_list = self._exit_list
+        # we only need to visit every character / entity if we are
+        # searching inside them, or if we don't have any names
+        if params.name is not None and params.maxdepth == 0:
+            char_list = [obj for obj in matches
+                         if isinstance(obj, char.Character)]
+            ent_list = [obj for obj in matches
+                        if isinstance(obj, entity.Entity)]
+        else:
+            char_list = self.characters
+            ent_list = self.entities
         # only check exits if Exit type is specified (or no type specified)
         if params.type is None or util.has_subclass(params.type, Exit):
             # exitsare not first class game objects, so we manually
             # sort through them
-            for ex in self._exit_list:
+            for ex in exit_list:
                 # check for any must have other_fields
                 if not util.obj_does_have(ex, other_fields):
                     continue
@@ -258,11 +462,10 @@ class Location:
                 # with this exit
                 if not (params.pov is None or ex.interact.permits(params.pov)):
                     continue
-                # check for any intersecting names
-                if params.name is None or params.name & ex.names:
-                    yield ex
+                # names were already checked via the index
+                yield ex
         if params.type is None or util.has_instance(params.type, char.CharacterClass):
-            for other_char in self.characters:
+            for other_char in char_list:
                 if util.find_check(other_char, params, **other_fields):
                     yield other_char
                 # try to visit the character
@@ -275,8 +478,8 @@ class Location:
             # on a table, etc.
             yield from self.inv.find_child(params, **other_fields)
         if params.type is None or util.has_instance(params.type, entity.EntityClass):
-            for ent in self.entities:
-                if util.find_check(entity, params, **other_fields):
-                    yield entity
+            for ent in ent_list:
+                if util.find_check(ent, params, **other_fields):
+                    yield ent
                 yield from util.find_child(ent, params.decrement(),
                                            **other_fields)
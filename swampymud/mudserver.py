@@ -13,14 +13,69 @@ that would work better with the websockets package. Without Mark's
 original module, this project would have never gotten off the ground.
 Thank you, Mark.
 """
+import itertools
 import logging
 import traceback
 import warnings
-from collections import namedtuple
+from collections import namedtuple, Counter, deque
 # for asynchronous stuff
 import asyncio
 # required for websockets to work
 import websockets
+from websockets.extensions.permessage_deflate import \
+    ServerPerMessageDeflateFactory
+from swampymud.util.msgqueue import MessageQueue
+from swampymud.util.timingwheel import TimingWheel
+from swampymud.util.ratelimit import TokenBucket, FloodAction
+from swampymud.telnet import TelnetSession
+
+
+def _closed(msgs):
+    """returns True if the queue [msgs] has been closed (queues other
+    than MessageQueues are never closed)"""
+    return getattr(msgs, "closed", False)
+
+
+def pack_envelope(msgs):
+    """pack a list of messages into a compact binary envelope:
+    a version byte (1), followed by each message as a varint length and
+    UTF-8 encoded text"""
+    packed = bytearray(b"\x01")
+    for msg in msgs:
+        data = msg.encode("utf-8")
+        length = len(data)
+        # write the length 7 bits at a time, least significant first
+        while length >= 0x80:
+            packed.append((length & 0x7f) | 0x80)
+            length >>= 7
+        packed.append(length)
+        packed += data
+    return bytes(packed)
+
+
+def unpack_envelope(packed):
+    """return the list of messages in an envelope (see pack_envelope)
+    raises a ValueError if the envelope is malformed"""
+    if packed[:1] != b"\x01":
+        raise ValueError("Unknown envelope version")
+    msgs = []
+    index = 1
+    while index < len(packed):
+        length = shift = 0
+        while True:
+            if index >= len(packed):
+                raise ValueError("Truncated envelope")
+            byte = packed[index]
+            index += 1
+            length |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        if index + length > len(packed):
+            raise ValueError("Truncated envelope")
+        msgs.append(packed[index:index + length].decode("utf-8"))
+        index += length
+    return msgs
 
 
 class MudServer:
@@ -39,15 +94,95 @@ class MudServer:
         self.default_location = None
         # dict mapping pid [int] to in-game Characters
         self.players = {}
+        # number of times each OverflowPolicy was applied to a player's
+        # message queue
+        self.overflow_stats = Counter()
 
         self.tcp_port = tcp_port
         self.tcp_server = None
         self._tcp_clients = {}
+        # maps pid to the TelnetSession for each TCP client
+        self._telnet = {}
+        # if True, offer MCCP2 compression to TCP clients
+        self.tcp_compress = True
+        # maximum number of bytes to send to a TCP client in one write
+        # (measured before compression; a single message larger than
+        # this is still sent whole)
+        self.tcp_flush_bytes = 16384
         self.ws_port = ws_port
         self.ws_server = None
-        # TODO: add ._ws_clients
-        # by tracking clients, we can write a 'kick' function and
-        # have a cleaner shutdown in the case of the tcp server
+        # if set, WebSocket output is batched: after a message arrives,
+        # wait up to this many milliseconds and send everything that
+        # was queued in the meantime as one frame
+        self.ws_batch_latency = None
+        # maximum number of characters to pack into one batched frame
+        # (a single message larger than this is still sent whole)
+        self.ws_max_frame = 16384
+        # if True, messages are sent as binary frames using a compact
+        # envelope (see pack_envelope) instead of newline-separated text,
+        # and binary frames from clients are unpacked the same way
+        self.ws_binary = False
+        # settings for the permessage-deflate extension
+        # if ws_compression is False, frames are not compressed
+        # ws_window_bits (8-15) and ws_mem_level (1-9) trade memory for
+        # better compression (None uses the websockets defaults)
+        self.ws_compression = True
+        self.ws_window_bits = None
+        self.ws_mem_level = None
+        # maximum size of an incoming message, in bytes
+        self.ws_max_size = 2 ** 20
+        # maximum number of incoming messages to buffer per client
+        self.ws_max_queue = 32
+        # high-water mark of the outgoing buffer, in bytes
+        self.ws_write_limit = 2 ** 16
+        # dict mapping pid to the WebSocket of each client
+        self._ws_clients = {}
+
+        # number of game ticks per second
+        # each tick, update() is called on every object that is due
+        # (see MudServer.schedule_updates)
+        self.tick_rate = 10
+        self.scheduler = TimingWheel()
+        # number of ticks that took longer than 1 / tick_rate seconds
+        self.tick_overruns = 0
+        # if provided, this world.Autosave is run alongside the server
+        self.autosave = None
+
+        # if True, the network coroutines do not run any game code.
+        # Instead, player messages (and disconnects) are queued in the
+        # inbox, and each tick runs them in the order they arrived.
+        # (Commands may wait up to one tick before running.)
+        self.use_inbox = False
+        self.inbox = deque()
+        # maximum number of inbox events handled per tick (None for no
+        # limit); any others wait for the next tick
+        self.inbox_batch = None
+        # number of commands from each pid waiting in the inbox
+        self._queued = Counter()
+
+        # flood protection
+        # each player may send [input_burst] commands at once, and
+        # [input_rate] commands per second after that (None for no limit)
+        self.input_rate = None
+        self.input_burst = 10
+        # messages longer than this (in characters) are rejected
+        self.max_line_length = 4096
+        # maximum number of commands a player may have waiting (either
+        # delayed by the rate limit or queued in the inbox)
+        self.max_backlog = 32
+        # what to do with commands that break the limits above
+        # (too-long messages and overfull backlogs are dropped if
+        # flood_action is DELAY)
+        self.flood_action = FloodAction.DELAY
+        # number of times each FloodAction was applied
+        self.flood_stats = Counter()
+        # maps pid to the TokenBucket for each player
+        self._buckets = {}
+        # maps pid to a deque of delayed commands
+        self._delayed = {}
+        # pids that have been kicked, but have not disconnected yet
+        # (any further messages from them are ignored)
+        self._kicked = set()
 
         self.next_id = 0
         self._running = False
@@ -71,6 +206,9 @@ class MudServer:
         # Flag the server as running
         self._running = True
 
+        # Schedule the characters / entities already in the world
+        self.schedule_world()
+
         # We create a list of coroutines, since we might be running more
         # than just one if we have a TCP Server AND a WebSocketServer.
         coroutines = []
@@ -85,11 +223,17 @@ class MudServer:
         if self.ws_port is not None:
             # start a WebSocketServer
             self.ws_server = await websockets.serve(self._register_ws,
-                                                    port=self.ws_port)
+                                                    port=self.ws_port,
+                                                    **self.ws_options())
             # use a simple coro so that MudServer doesn't close
             # with WebSocketServer still running
             coroutines.append(self.ws_server.wait_closed())
 
+        # Finally, add the game tick loop (and the autosave, if any).
+        coroutines.append(self._tick_loop())
+        if self.autosave is not None:
+            coroutines.append(self.autosave.run())
+
         # We use asyncio.gather() to execute multiple coroutines.
         await asyncio.gather(*coroutines, return_exceptions=True)
 
@@ -105,8 +249,214 @@ class MudServer:
                 stream_writer.close()
         if self.ws_server is not None:
             self.ws_server.close()
+        if self.autosave is not None:
+            self.autosave.stop()
         self._running = False
 
+    def ws_options(self):
+        """return a dict of the keyword arguments passed to
+        websockets.serve(), based on the ws_* settings"""
+        options = {
+            "max_size": self.ws_max_size,
+            "max_queue": self.ws_max_queue,
+            "write_limit": self.ws_write_limit,
+        }
+        if not self.ws_compression:
+            options["compression"] = None
+        elif self.ws_window_bits is not None or self.ws_mem_level is not None:
+            compress_settings = None
+            if self.ws_mem_level is not None:
+                compress_settings = {"memLevel": self.ws_mem_level}
+            options["compression"] = None
+            options["extensions"] = [ServerPerMessageDeflateFactory(
+                server_max_window_bits=self.ws_window_bits,
+                compress_settings=compress_settings
+            )]
+        return options
+
+    def schedule_updates(self, obj, interval=None):
+        """Schedule [obj].update() to be called every [interval]
+        seconds. If [interval] is not provided, the 'update_interval'
+        of obj's class is used instead. (If that is None, [obj] is not
+        scheduled.)
+        Intervals are rounded to a whole number of ticks.
+        """
+        if interval is None:
+            interval = getattr(obj, "update_interval", None)
+            if interval is None:
+                return
+        ticks = max(1, round(interval * self.tick_rate))
+        self.scheduler.schedule(obj, ticks)
+
+    def schedule_world(self):
+        """Schedule updates for each character and entity in the world
+        that has an 'update_interval' (see schedule_updates). This is
+        called when the server starts, so that NPCs loaded from the
+        world file are updated."""
+        if self.world is None:
+            return
+        for location in self.world.locations.values():
+            for obj in itertools.chain(location.characters,
+                                       location.entities):
+                self.schedule_updates(obj)
+
+    def tick(self):
+        """Advance the game by one tick, handling any events in the
+        inbox and then calling update() on each scheduled object that is
+        due.
+        """
+        self._release_delayed()
+        self.drain_inbox()
+        for obj in self.scheduler.advance():
+            # as with on_player_msg, we log any errors and keep going
+            try:
+                obj.update()
+            except Exception:
+                logging.error(traceback.format_exc())
+
+    def drain_inbox(self):
+        """Handle the events waiting in the inbox (up to inbox_batch),
+        in the order that they arrived."""
+        count = len(self.inbox)
+        if self.inbox_batch is not None:
+            count = min(count, self.inbox_batch)
+        for _ in range(count):
+            kind, pid, msg = self.inbox.popleft()
+            if kind == "msg":
+                self._queued[pid] -= 1
+                if not self._queued[pid]:
+                    del self._queued[pid]
+                # on_player_msg logs its own errors
+                self.on_player_msg(pid, msg)
+            else:
+                try:
+                    self.on_player_quit(pid)
+                except Exception:
+                    logging.error(traceback.format_exc())
+
+    def _receive(self, pid, msg):
+        """Called by the network coroutines when player [pid] sends
+        [msg] (or None, if the message was too long to read).
+        The message is checked against the flood protection limits.
+        Then, if use_inbox is set, [msg] is queued for the next tick.
+        Otherwise, on_player_msg is called immediately."""
+        if pid in self._kicked:
+            return
+        if msg is None or len(msg) > self.max_line_length:
+            self._reject(pid, "Your message was too long.")
+            return
+        if self.input_rate is not None:
+            bucket = self._buckets.get(pid)
+            if bucket is None:
+                bucket = TokenBucket(self.input_rate, self.input_burst)
+                self._buckets[pid] = bucket
+            # if commands are already delayed, this one must wait its
+            # turn (so that commands are run in order)
+            if pid in self._delayed or not bucket.take():
+                if self.flood_action is FloodAction.DELAY:
+                    self._delay(pid, msg)
+                else:
+                    self._reject(pid, "You are sending commands too "
+                                 "quickly.")
+                return
+        if self.use_inbox and self._queued[pid] >= self.max_backlog:
+            self._reject(pid, "You have too many commands waiting.")
+            return
+        self._deliver(pid, msg)
+
+    def _deliver(self, pid, msg):
+        if self.use_inbox:
+            self.inbox.append(("msg", pid, msg))
+            self._queued[pid] += 1
+        else:
+            self.on_player_msg(pid, msg)
+
+    def _delay(self, pid, msg):
+        """hold [msg] until player [pid] has a token (see tick)"""
+        delayed = self._delayed.setdefault(pid, deque())
+        if len(delayed) >= self.max_backlog:
+            self._reject(pid, "You have too many commands waiting.")
+            return
+        delayed.append(msg)
+        self.flood_stats[FloodAction.DELAY] += 1
+
+    def _release_delayed(self):
+        """deliver any delayed commands whose players now have tokens"""
+        for pid, delayed in list(self._delayed.items()):
+            bucket = self._buckets[pid]
+            while delayed and bucket.take():
+                self._deliver(pid, delayed.popleft())
+            if not delayed:
+                del self._delayed[pid]
+
+    def _reject(self, pid, reason):
+        """apply the flood_action to player [pid], who sent a message
+        that broke a limit for [reason]"""
+        if self.flood_action is FloodAction.KICK:
+            if pid not in self._kicked:
+                self.flood_stats[FloodAction.KICK] += 1
+                logging.warning("Kicking %s (%s)", pid, reason)
+                self.kick(pid)
+            return
+        self.flood_stats[FloodAction.DROP] += 1
+        player = self.players.get(pid)
+        if player is not None:
+            player.message(reason)
+
+    def kick(self, pid):
+        """Disconnect player [pid]. (The usual disconnect handling,
+        such as on_player_quit, happens once the connection closes.)
+        Any messages that the player sends in the meantime are
+        ignored."""
+        self._kicked.add(pid)
+        self._delayed.pop(pid, None)
+        # discard any of the player's commands waiting in the inbox
+        if self._queued.pop(pid, 0):
+            self.inbox = deque(event for event in self.inbox
+                               if event[0] != "msg" or event[1] != pid)
+        writer = self._tcp_clients.get(pid)
+        if writer is not None:
+            writer.close()
+        websocket = self._ws_clients.get(pid)
+        if websocket is not None:
+            asyncio.ensure_future(websocket.close())
+
+    def _disconnected(self, pid):
+        """Called by the network coroutines when player [pid]
+        disconnects (see _receive)"""
+        # any delayed commands are discarded
+        self._buckets.pop(pid, None)
+        self._delayed.pop(pid, None)
+        self._kicked.discard(pid)
+        if self.use_inbox:
+            self.inbox.append(("quit", pid, None))
+        else:
+            self.on_player_quit(pid)
+
+    async def _tick_loop(self):
+        """Call self.tick() [self.tick_rate] times a second until the
+        server is shut down.
+        """
+        loop = asyncio.get_event_loop()
+        next_tick = loop.time()
+        while self._running:
+            budget = 1 / self.tick_rate
+            start = loop.time()
+            self.tick()
+            elapsed = loop.time() - start
+            if elapsed > budget:
+                self.tick_overruns += 1
+                logging.warning("Tick %d overran its budget "
+                                "(%.1f ms > %.1f ms)", self.scheduler.ticks,
+                                elapsed * 1000, budget * 1000)
+            next_tick += budget
+            delay = next_tick - loop.time()
+            # if we have fallen behind, don't try to catch up
+            if delay < 0:
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
     # Callback methods for the TCP Server.
     # This method is executed whenever a new client connects to the
     # TCP server.
@@ -124,6 +474,13 @@ class MudServer:
         # down later if necessary.
         self._tcp_clients[pid] = writer
 
+        # Start negotiating telnet options (window size, compression,
+        # etc.) with the client.
+        session = TelnetSession(compress=self.tcp_compress,
+                                max_line=self.max_line_length)
+        self._telnet[pid] = session
+        writer.write(session.start())
+
         # This method will create a new Character and assign it to the
         # player.
         # This method can be overriden for custom behavior.
@@ -147,39 +504,63 @@ class MudServer:
         # been detected and this player has disconnected.
         # Close the StreamWriter.
         writer.close()
+        del self._tcp_clients[pid]
+        del self._telnet[pid]
 
         # Finally, call server.on_player_quit().
         # By default, this will delete the player's Character and send a
         # message to the other players, letting them know that this
         # player left.
         # This method can be overriden for custom behavior.
-        self.on_player_quit(pid)
+        # (If use_inbox is set, the call is deferred to the next tick.)
+        self._disconnected(pid)
 
     async def _incoming_tcp(self, pid, reader):
         """Handle incoming messages from a Tcp Client."""
+        session = self._telnet[pid]
+        writer = self._tcp_clients[pid]
 
         # When the user disconnects, asyncio will call it "EOF" (end of
-        # file). Until then, we simply try to read a line from the
+        # file). Until then, we simply try to read some data from the
         # user.
-        while not reader.at_eof():
-            # reader.readline() is an asynchronous method
+        # We also stop reading if the player is kicked.
+        while not reader.at_eof() and pid not in self._kicked:
+            # reader.read() is an asynchronous method
             # This means that it won't actually execute on its own
             # unless we 'await' it.
             # Under the hood, using this 'await' actually switches to
             # execute some other code until this player sends us
             # a message.
-            msg = await reader.readline()
-
-            # The player just sent us a message!
-            # Remove any whitespace and convert from bytes to str
-            msg = msg.strip().decode(encoding="latin1")
-
-            if msg:
-                # Pass the message to server.on_player_msg().
-                # The method there will send the message to the
-                # Character that the player controls.
-                # This function can be overriden for custom behavior.
-                self.on_player_msg(pid, msg)
+            data = await reader.read(4096)
+
+            # The player just sent us some data!
+            # The TelnetSession strips out any telnet commands and
+            # returns the complete lines, converted from bytes to str.
+            lines = session.feed(data)
+
+            # Send any replies to the player's telnet commands.
+            reply = session.data_to_send()
+            if reply:
+                writer.write(reply)
+
+            for msg in lines:
+                # the line was too long, so the session discarded it
+                if msg is None:
+                    self._receive(pid, None)
+                    continue
+                # Remove any whitespace
+                msg = msg.strip()
+                if msg:
+                    # Pass the message to server.on_player_msg().
+                    # The method there will send the message to the
+                    # Character that the player controls.
+                    # This function can be overriden for custom behavior.
+                    # (If use_inbox is set, the message is queued for
+                    # the next tick instead.)
+                    self._receive(pid, msg)
+                # ignore the rest of the data if the player was kicked
+                if pid in self._kicked:
+                    break
 
         logging.debug("_incoming_tcp closed for %s", pid)
 
@@ -188,19 +569,56 @@ class MudServer:
         that must be forwarded to a Player.
         """
         character = self.players[pid]
+        session = self._telnet.get(pid)
+        if session is None:
+            # no telnet options have been negotiated
+            session = TelnetSession(compress=False)
+
+        # Messages that didn't fit into the previous write are carried
+        # over to the next one.
+        carry = None
 
         # This coroutine just loops forever, and will eventually be
-        # broken once the client disconnects.
-        while True:
+        # broken once the client disconnects (or the player's queue
+        # overflows and is closed).
+        while not _closed(character.msgs):
             # Try to get a message from the Character's queue.
             # This will block until the character receives a message.
-            msg = await character.msgs.get()
-
-            # TODO: try to get more messages to buffer writes?
-
-            # Add a newline character and convert the message into bytes
-            msg = (msg + "\n\r").encode('latin-1')
-            writer.write(msg)
+            if carry is None:
+                msg = await character.msgs.get()
+                # the player's queue overflowed, so we disconnect them
+                if _closed(character.msgs):
+                    break
+                # Add a newline character and convert the message into
+                # bytes
+                carry = session.encode(msg + "\n\r")
+            chunks = [carry]
+            size = len(carry)
+            carry = None
+
+            # Now grab any other messages that are already waiting, so
+            # that we write them all at once rather than one at a time.
+            while size < self.tcp_flush_bytes:
+                try:
+                    msg = character.msgs.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                # the queue overflowed and was closed, so this is the
+                # empty close message (see the outer loop)
+                if _closed(character.msgs):
+                    break
+                chunk = session.encode(msg + "\n\r")
+                # if this message would put us over the cap, save it
+                # for the next write
+                if size + len(chunk) > self.tcp_flush_bytes:
+                    carry = chunk
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+
+            # (the data is compressed here if MCCP2 is enabled)
+            session.send(b"".join(chunks))
+            writer.write(session.data_to_send())
 
             # Once we've written to a StreamWriter, we have to call
             # writer.drain(), which blocks.
@@ -211,6 +629,8 @@ class MudServer:
             except ConnectionResetError:
                 break
 
+        if _closed(character.msgs):
+            logging.warning("%s disconnected (message queue overflowed)", pid)
         logging.debug("_outgoing_tcp closed for %s", pid)
 
     # Callback methods for new WebSocket connections.
@@ -223,6 +643,7 @@ class MudServer:
         # First, grab a new unique identifier.
         pid = self.next_id
         self.next_id += 1
+        self._ws_clients[pid] = websocket
 
         # Call the server's custom handler. (By default, this will
         # create a new Character and assign it to the player.)
@@ -240,10 +661,26 @@ class MudServer:
         # If this code is reached, then the WebSocket has disconnected.
         # This should already be closed, but just in case.
         await websocket.close()
+        del self._ws_clients[pid]
 
         # Call the server's event handler. (By default, this will simply
         # notify the other players.)
-        self.on_player_quit(pid)
+        self._disconnected(pid)
+
+    def _unpack_frame(self, pid, frame):
+        """return a list of the messages in a WebSocket [frame] from
+        player [pid]"""
+        if isinstance(frame, str):
+            return [frame]
+        if not self.ws_binary:
+            # binary frames contain UTF-8 encoded text
+            return [frame.decode("utf-8", errors="replace")]
+        try:
+            return unpack_envelope(frame)
+        except ValueError as error:
+            logging.warning("Dropped malformed frame from %s (%s)",
+                            pid, error)
+            return []
 
     async def _incoming_ws(self, pid, websocket):
         """Handle incoming messages from a Tcp Client."""
@@ -256,13 +693,18 @@ class MudServer:
         # If the WebSocket is disconnected unexpectedly, the for loop
         # will produce an exception.
         try:
-            async for msg in websocket:
-                # Trim whitespace
-                msg = msg.strip()
-                # Make sure the message isn't an empty string
-                if msg:
-                    # Pass the message onto the server's handler.
-                    self.on_player_msg(pid, msg)
+            async for frame in websocket:
+                for msg in self._unpack_frame(pid, frame):
+                    # Trim whitespace
+                    msg = msg.strip()
+                    # Make sure the message isn't an empty string
+                    if msg:
+                        # Pass the message onto the server's handler.
+                        self._receive(pid, msg)
+                    if pid in self._kicked:
+                        break
+                if pid in self._kicked:
+                    break
         # If we get this error, then player probably just logged off.
         except websockets.exceptions.ConnectionClosed:
             pass
@@ -275,15 +717,51 @@ class MudServer:
         """
         character = self.players[pid]
 
-        while not websocket.closed:
-            msg = await character.msgs.get()
-
-            # TODO: try to get more messages and buffer writes?
+        # Messages that didn't fit into the previous frame are carried
+        # over to the next one.
+        carry = None
+
+        while not (websocket.closed or _closed(character.msgs)):
+            if carry is None:
+                carry = await character.msgs.get()
+                # the player's queue overflowed, so we disconnect them
+                if _closed(character.msgs):
+                    break
+            frame = [carry]
+            # sizes include the newline added to each message
+            size = len(carry) + 2
+            carry = None
+
+            if self.ws_batch_latency is not None:
+                # Hold the frame open for the flush window, so that any
+                # messages sent in the meantime go out with this one.
+                await asyncio.sleep(self.ws_batch_latency / 1000)
+                while size < self.ws_max_frame:
+                    try:
+                        msg = character.msgs.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if _closed(character.msgs):
+                        break
+                    # if this message would put us over the cap, save
+                    # it for the next frame
+                    if size + len(msg) + 2 > self.ws_max_frame:
+                        carry = msg
+                        break
+                    frame.append(msg)
+                    size += len(msg) + 2
+
+            if self.ws_binary:
+                frame = pack_envelope(frame)
+            else:
+                frame = "".join(msg + "\n\r" for msg in frame)
             try:
-                await websocket.send(msg + "\n\r")
+                await websocket.send(frame)
             except websockets.exceptions.ConnectionClosed:
                 break
 
+        if _closed(character.msgs):
+            logging.warning("%s disconnected (message queue overflowed)", pid)
         logging.debug("_outgoing_ws closed for %s", pid)
 
     # handlers for each event
@@ -308,29 +786,44 @@ class MudServer:
         # initialize the Character and add it to the server
         character = PlayerCls()
         self.players[pid] = character
+        # record any queue overflows in the server-wide stats
+        if isinstance(character.msgs, MessageQueue):
+            character.msgs.stats = self.overflow_stats
 
         # now prepare a location for the player
+        start_loc = self.starting_location(pid, PlayerCls)
+        if start_loc is None:
+            return
+
+        # put the character in "greet" mode
+        character.spawn(start_loc)
+
+        # start calling the character's update method
+        self.schedule_updates(character)
+
+    def starting_location(self, pid, PlayerCls):
+        """return the Location where player [pid], a new character of
+        class [PlayerCls], should spawn (or None if there is nowhere
+        to spawn)
+        """
         # as with default_class, a server-wide default_location takes
         # precedence
         if self.default_location is not None:
-            start_loc = self.default_location
-        elif PlayerCls.starting_location is not None:
-            start_loc = PlayerCls.starting_location
+            return self.default_location
+        if PlayerCls.starting_location is not None:
+            return PlayerCls.starting_location
         # if no default location has been defined for CharacterClass or
         # server, resort to picking the first location in locations
-        else:
-            try:
-                start_loc = next(iter(self.world.locations.values()))
-            except StopIteration:
-                logging.critical("Could not spawn %d, "
-                                 "world has no locations", pid)
-                return
-            logging.warning("%s has no default location, "
-                            "so %d will be spawned in %s",
-                            PlayerCls, pid, start_loc)
-
-        # put the character in "greet" mode
-        character.spawn(start_loc)
+        try:
+            start_loc = next(iter(self.world.locations.values()))
+        except StopIteration:
+            logging.critical("Could not spawn %d, "
+                             "world has no locations", pid)
+            return None
+        logging.warning("%s has no default location, "
+                        "so %d will be spawned in %s",
+                        PlayerCls, pid, start_loc)
+        return start_loc
 
     def on_player_msg(self, pid: int, msg: str):
         """This method is executed whenever a string of data [msg]
@@ -369,6 +862,9 @@ class MudServer:
             # player did not exist
             return
 
+        # stop updating the character
+        self.scheduler.cancel(character)
+
         # only send a message if character had provided a name
         if str(character) != "[nameless character]":
             self.message_all(f"{character} quit the game.")
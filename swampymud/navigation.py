@@ -0,0 +1,219 @@
+"""Module defining the ExitGraph class, an index of Locations and Exits
+used to find paths through the in-game world.
+
+Each Location in an ExitGraph is assigned a number, and the Exits
+leading into each Location are stored in adjacency lists. Paths are
+found with a breadth-first search that runs backwards from the goal,
+producing the next Exit to take from *every* Location that can reach
+the goal. These search trees are cached per (goal, CharacterClass), so
+any number of characters can walk toward a common goal for the price of
+a single search.
+
+For example:
+
+graph = ExitGraph(world.locations.values())
+graph.path(tavern, castle) # returns a list of Exits (or None)
+graph.distance(tavern, castle) # returns the number of Exits to take
+graph.next_exit(tavern, castle, Wizard) # first Exit a Wizard can take
+
+When an Exit is added to a Location in the graph, only that Exit (and
+any newly reachable Locations) is added, and only that graph's search
+trees are discarded. All search
+trees are discarded when a Filter changes.
+"""
+from array import array
+from collections import OrderedDict
+from swampymud.character import Filter, Character
+
+
+class ExitGraph:
+    """class representing a directed graph of Locations (vertices) and
+    Exits (edges)
+    """
+
+    def __init__(self, locations=(), max_trees=64):
+        """Create a new ExitGraph containing [locations] and any
+        Locations reachable from them.
+        [max_trees]: the maximum number of search trees to cache
+        """
+        self._seeds = list(locations)
+        self.max_trees = max_trees
+        # maps (goal number, traveler) to a (generation, tree) tuple,
+        # with the most recently used tree last
+        self._trees = OrderedDict()
+        # maps id(location) to the location's number
+        self._ids = {}
+        self._locations = []
+        # every Exit, indexed by number
+        self._exits = []
+        # for each location, a list of (source number, exit number)
+        # pairs, one for each exit leading into the location
+        self._incoming = []
+        # maps lowercase names to lists of locations
+        self._names = {}
+        # True if any interact filter names specific characters
+        # (recomputed whenever a Filter changes)
+        self._check_chars = None
+        self._check_gen = None
+        for loc in self._seeds:
+            self._number(loc)
+        self._expand(0)
+
+    def _link(self, source, ex):
+        """add [ex], leading out of location number [source]"""
+        dest = self._number(ex.destination)
+        self._incoming[dest].append((source, len(self._exits)))
+        self._exits.append(ex)
+
+    def _expand(self, index):
+        """add the Exits of every location numbered [index] or higher,
+        numbering any locations reachable from them as we go"""
+        while index < len(self._locations):
+            for ex in self._locations[index].exits:
+                self._link(index, ex)
+            index += 1
+
+    def exit_added(self, loc, ex):
+        """update the graph after [ex] is added to [loc]
+        (called by Location.add_exit)"""
+        start = len(self._locations)
+        self._link(self._ids[id(loc)], ex)
+        self._expand(start)
+        self._trees.clear()
+        self._check_gen = None
+
+    def _filters_chars(self):
+        """returns True if any Exit's interact filter includes /
+        excludes specific characters"""
+        if self._check_gen != Filter.generation:
+            self._check_chars = any(
+                ex.interact._include_chars or ex.interact._exclude_chars
+                for ex in self._exits
+            )
+            self._check_gen = Filter.generation
+        return self._check_chars
+
+    def _number(self, loc):
+        """return the number of [loc], adding it to the graph if
+        necessary"""
+        try:
+            return self._ids[id(loc)]
+        except KeyError:
+            pass
+        number = len(self._locations)
+        self._ids[id(loc)] = number
+        self._locations.append(loc)
+        self._incoming.append([])
+        self._names.setdefault(str(loc).lower(), []).append(loc)
+        loc.graph = self
+        loc._graphs.append(self)
+        return number
+
+    def add_location(self, loc):
+        """add [loc] (and any Locations reachable from it) to the graph"""
+        self._seeds.append(loc)
+        if id(loc) not in self._ids:
+            start = len(self._locations)
+            self._number(loc)
+            self._expand(start)
+
+    def _tree(self, goal, traveler):
+        """return a tuple of arrays (hops, distances), where hops[n] is
+        the number of the Exit to take from location n to get closer to
+        [goal], and distances[n] is the number of Exits between n and
+        [goal] (-1 if [goal] cannot be reached)
+        If [traveler] is None, Exit filters are ignored.
+        """
+        # specific characters can only share trees with their class if
+        # no Exits filter specific characters
+        if isinstance(traveler, Character) and not self._filters_chars():
+            traveler = type(traveler)
+        shared = not isinstance(traveler, Character)
+        key = (goal, traveler)
+        if shared:
+            cached = self._trees.get(key)
+            if cached is not None and cached[0] == Filter.generation:
+                self._trees.move_to_end(key)
+                return cached[1]
+        size = len(self._locations)
+        hops = array("i", [-1]) * size
+        distances = array("i", [-1]) * size
+        distances[goal] = 0
+        # breadth-first search, following the Exits backwards
+        frontier = [goal]
+        depth = 0
+        while frontier:
+            depth += 1
+            next_frontier = []
+            for dest in frontier:
+                for source, ex_num in self._incoming[dest]:
+                    if distances[source] != -1:
+                        continue
+                    if traveler is not None:
+                        interact = self._exits[ex_num].interact
+                        if not interact.permits(traveler):
+                            continue
+                    distances[source] = depth
+                    hops[source] = ex_num
+                    next_frontier.append(source)
+            frontier = next_frontier
+        tree = (hops, distances)
+        if shared:
+            self._trees[key] = (Filter.generation, tree)
+            if len(self._trees) > self.max_trees:
+                self._trees.popitem(last=False)
+        return tree
+
+    def _search(self, start, goal, traveler):
+        """return (start number, hops, distances) for the given
+        locations (see _tree)"""
+        for loc in (start, goal):
+            if id(loc) not in self._ids:
+                self.add_location(loc)
+        hops, distances = self._tree(self._ids[id(goal)], traveler)
+        return self._ids[id(start)], hops, distances
+
+    def path(self, start, goal, traveler=None):
+        """return a list of Exits forming a shortest path from [start]
+        to [goal], or None if there is no such path
+        [traveler]: if a Character or CharacterClass is provided, only
+            Exits that permit [traveler] to interact are used
+        """
+        number, hops, distances = self._search(start, goal, traveler)
+        if distances[number] == -1:
+            return None
+        route = []
+        while distances[number] > 0:
+            ex = self._exits[hops[number]]
+            route.append(ex)
+            number = self._ids[id(ex.destination)]
+        return route
+
+    def distance(self, start, goal, traveler=None):
+        """return the number of Exits between [start] and [goal], or
+        None if there is no path (see path)"""
+        number, _, distances = self._search(start, goal, traveler)
+        if distances[number] == -1:
+            return None
+        return distances[number]
+
+    def next_exit(self, start, goal, traveler=None):
+        """return the first Exit on a shortest path from [start] to
+        [goal], or None if [start] is [goal] or there is no path
+        (see path)"""
+        number, hops, _ = self._search(start, goal, traveler)
+        if hops[number] == -1:
+            return None
+        return self._exits[hops[number]]
+
+    def locations_named(self, name):
+        """return a list of the Locations named [name] (ignoring case)"""
+        return list(self._names.get(name.lower(), ()))
+
+    def __contains__(self, loc):
+        """returns True if [loc] is in the graph"""
+        return id(loc) in self._ids
+
+    def __len__(self):
+        """returns the number of Locations in the graph"""
+        return len(self._locations)
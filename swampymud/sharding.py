@@ -0,0 +1,431 @@
+"""Module for running a MUD across several processes.
+
+The Locations of a World are partitioned into zones (see partition),
+and each zone is simulated by a ShardWorker in its own process. Every
+worker loads its own copy of the World from the same world file, but
+only runs the characters of players whose Location is in its zone.
+
+A ShardedMudServer runs in the front-end process. It accepts TCP and
+WebSocket connections like a normal MudServer, but each player is
+represented by a RemotePlayer, and the player's commands are forwarded
+to the worker that owns the player's Location. Each worker marks the
+Locations outside its zone as remote, so a character that tries to
+enter one raises a Handoff before anything in the Location is touched.
+The worker then hands the character off: the character is saved (along
+with its inventory) and removed, and the front-end passes the saved
+data on to the worker for the new zone, where the character enters the
+Location. (A 'travel' command stops at the first remote Location.)
+
+For example:
+
+server = ShardedMudServer("my_world.yaml", shards=4, tcp_port=4000)
+asyncio.get_event_loop().run_until_complete(server.run())
+
+Since each worker has its own copy of the World, players can only see
+and interact with the players in the same zone. Equipped items are
+returned to the inventory during a hand-off, and any state that is not
+included in Character.save() is lost.
+
+Workers and the front-end communicate through pipes, using tuples:
+    front-end -> worker
+        ("join", pid, class name, location symbol)
+        ("enter", pid, location symbol, saved state)
+        ("msg", pid, message)
+        ("quit", pid)
+        ("stop",)
+    worker -> front-end
+        ("out", [(pid, message), ...])
+        ("handoff", pid, location symbol, saved state)
+        ("bounce", request) - the request's player is not in the zone
+        ("broadcast", message)
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from swampymud.mudserver import MudServer
+from swampymud.world import World
+from swampymud.character import Handoff
+from swampymud.inventory import ItemStack
+from swampymud.util.msgqueue import MessageQueue
+from swampymud.util.timingwheel import TimingWheel
+
+
+def partition(world, count):
+    """return a dict mapping the symbol of each of [world]'s locations
+    to a zone number in range([count])
+    Zones are built from a breadth-first traversal (treating exits as
+    two-way), so neighboring Locations tend to share a zone.
+    """
+    symbols = {id(loc): symbol for symbol, loc in world.locations.items()}
+    neighbors = {symbol: [] for symbol in world.locations}
+    for symbol, loc in world.locations.items():
+        for ex in loc.exits:
+            dest = symbols.get(id(ex.destination))
+            if dest is not None:
+                neighbors[symbol].append(dest)
+                neighbors[dest].append(symbol)
+    order = []
+    seen = set()
+    for symbol in world.locations:
+        if symbol in seen:
+            continue
+        seen.add(symbol)
+        queue = deque([symbol])
+        while queue:
+            current = queue.popleft()
+            order.append(current)
+            for other in neighbors[current]:
+                if other not in seen:
+                    seen.add(other)
+                    queue.append(other)
+    size = max(1, math.ceil(len(order) / count))
+    return {symbol: index // size for index, symbol in enumerate(order)}
+
+
+class _Outbox:
+    """stand-in for a Character's MessageQueue in a ShardWorker, which
+    collects messages to be sent to the front-end"""
+    __slots__ = ("pid", "output")
+
+    def __init__(self, pid, output):
+        self.pid = pid
+        self.output = output
+
+    def put_nowait(self, msg):
+        self.output.append((self.pid, msg))
+
+
+class ShardWorker:
+    """class that simulates the players in one zone of a World"""
+
+    def __init__(self, world, zones, zone, tick_rate=10):
+        """Create a new ShardWorker.
+        [world]: this worker's copy of the World
+        [zones]: dict mapping location symbols to zone numbers
+        [zone]: the zone simulated by this worker
+        """
+        self.world = world
+        self.zones = zones
+        self.zone = zone
+        self.tick_rate = tick_rate
+        self.scheduler = TimingWheel()
+        # dict mapping pid to Characters in this zone
+        self.players = {}
+        # maps id(location) to the location's symbol
+        self._symbols = {id(loc): symbol
+                         for symbol, loc in world.locations.items()}
+        # characters cannot enter locations in other zones
+        for symbol, loc in world.locations.items():
+            loc.remote = zones.get(symbol, zone) != zone
+        # (pid, message) pairs to send to the front-end
+        self._output = []
+        # other replies to send to the front-end
+        self._replies = []
+
+    def handle(self, request):
+        """handle a request from the front-end (see module docstring)"""
+        kind, pid = request[0], request[1]
+        if kind == "join":
+            self._join(pid, *request[2:])
+            return
+        if kind == "enter":
+            self._enter(pid, *request[2:])
+            return
+        if pid not in self.players:
+            # the player was handed off to another zone
+            self._replies.append(("bounce", request))
+            return
+        if kind == "msg":
+            try:
+                self.players[pid].command(request[2])
+            except Handoff as handoff:
+                self._handoff(pid, handoff.location)
+            except Exception:
+                logging.error(traceback.format_exc())
+        elif kind == "quit":
+            self._quit(pid)
+
+    def _add_player(self, pid, character):
+        character.msgs = _Outbox(pid, self._output)
+        self.players[pid] = character
+        interval = character.update_interval
+        if interval is not None:
+            self.scheduler.schedule(
+                character, max(1, round(interval * self.tick_rate))
+            )
+
+    def _join(self, pid, class_name, symbol):
+        character = self.world.char_classes[class_name]()
+        self._add_player(pid, character)
+        character.spawn(self.world.locations[symbol])
+
+    def _enter(self, pid, symbol, state):
+        character = self.load_state(state)
+        self._add_player(pid, character)
+        location = self.world.locations[symbol]
+        location.message(f"{character} entered.")
+        character.set_location(location)
+
+    def _quit(self, pid):
+        character = self.players.pop(pid)
+        self.scheduler.cancel(character)
+        if character.location is not None:
+            try:
+                character.location.remove_char(character)
+            except KeyError:
+                # character has not chosen a name yet
+                pass
+        if str(character) != "[nameless character]":
+            self._replies.append(("broadcast",
+                                  f"{character} quit the game."))
+
+    def _handoff(self, pid, destination):
+        """hand off player [pid], who tried to enter the remote location
+        [destination]"""
+        character = self.players.pop(pid)
+        self.scheduler.cancel(character)
+        state = self.save_state(character)
+        location = character.location
+        location.remove_char(character)
+        for entity in location.entities_with("on_exit"):
+            entity.on_exit(character)
+        location.message(f"{character} left.")
+        character.location = None
+        symbol = self._symbols[id(destination)]
+        self._replies.append(("handoff", pid, symbol, state))
+
+    def save_state(self, character):
+        """return a picklable representation of [character]"""
+        # equipped items are returned to the inventory first
+        for target, equipped in list(character.equip_dict.items()):
+            if equipped is not None:
+                character.unequip(target)
+        data = character.save()
+        data.pop("_type", None)
+        items = [(view.type.__name__, view.amount,
+                  dict(view.data) if view.data else None)
+                 for view in character.inv.views()]
+        return {"class": type(character).__name__, "data": data,
+                "items": items}
+
+    def load_state(self, state):
+        """return a Character created from [state] (see save_state)"""
+        cls = self.world.char_classes[state["class"]]
+        character = cls.load(state["data"])
+        character.post_load(state["data"])
+        for type_name, amount, data in state["items"]:
+            stack = ItemStack(self.world.item_classes[type_name], amount,
+                              data)
+            character.inv.add_item(stack.copy(), amount)
+        return character
+
+    def tick(self):
+        """advance the game by one tick (see MudServer.tick)"""
+        for obj in self.scheduler.advance():
+            try:
+                obj.update()
+            except Exception:
+                logging.error(traceback.format_exc())
+
+    def drain(self):
+        """return (and clear) the list of messages for the front-end"""
+        replies = []
+        if self._output:
+            replies.append(("out", list(self._output)))
+            self._output.clear()
+        replies.extend(self._replies)
+        self._replies.clear()
+        return replies
+
+    def serve(self, conn):
+        """handle requests from [conn] and advance the game
+        [self.tick_rate] times a second, until a "stop" request"""
+        budget = 1 / self.tick_rate
+        next_tick = time.monotonic() + budget
+        while True:
+            timeout = max(0, next_tick - time.monotonic())
+            # handle every request that is waiting before replying, so
+            # that replies are batched
+            while conn.poll(timeout):
+                request = conn.recv()
+                if request[0] == "stop":
+                    return
+                self.handle(request)
+                timeout = 0
+            if time.monotonic() >= next_tick:
+                self.tick()
+                next_tick += budget
+                # if we have fallen behind, don't try to catch up
+                if next_tick < time.monotonic():
+                    next_tick = time.monotonic() + budget
+            for reply in self.drain():
+                conn.send(reply)
+
+
+def run_worker(world_file, zones, zone, conn, tick_rate=10):
+    """load a World from [world_file] and serve zone [zone] over [conn]
+    (used as the target of each worker process)"""
+    world = World.from_file(world_file)
+    ShardWorker(world, zones, zone, tick_rate).serve(conn)
+
+
+class RemotePlayer:
+    """stand-in for a Character that is simulated by a ShardWorker"""
+
+    def __init__(self, zone, msgs):
+        self.zone = zone
+        self.msgs = msgs
+
+    def message(self, msg):
+        """send a message to the player"""
+        self.msgs.put_nowait(msg)
+
+
+class ShardedMudServer(MudServer):
+    """a MudServer that runs each zone of the world in a separate
+    process (see module docstring)
+    """
+
+    def __init__(self, world_file, shards=2, ws_port=None, tcp_port=None,
+                 zones=None):
+        """Create a new ShardedMudServer.
+        [world_file]: world file loaded by the front-end and workers
+        [shards]: number of worker processes
+        [zones]: optional dict mapping location symbols to zone numbers
+            (by default, the world is partitioned automatically)
+        """
+        super().__init__(World.from_file(world_file), ws_port, tcp_port)
+        self.world_file = world_file
+        self.shards = shards
+        if zones is None:
+            zones = partition(self.world, shards)
+        self.zones = zones
+        self._symbols = {id(loc): symbol
+                         for symbol, loc in self.world.locations.items()}
+        self._conns = []
+        self._processes = []
+        # requests waiting to be sent to each worker
+        # (sending can block, so this is done by a thread per worker)
+        self._outboxes = []
+
+    def start_shards(self):
+        """start the worker processes (called by run)"""
+        loop = asyncio.get_event_loop()
+        context = multiprocessing.get_context("spawn")
+        for zone in range(self.shards):
+            conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=run_worker,
+                args=(self.world_file, self.zones, zone, child_conn,
+                      self.tick_rate),
+                daemon=True
+            )
+            process.start()
+            self._conns.append(conn)
+            self._processes.append(process)
+            outbox = queue.SimpleQueue()
+            self._outboxes.append(outbox)
+            # read replies in a background thread, handing them to the
+            # event loop
+            threading.Thread(target=self._read_shard,
+                             args=(zone, conn, loop), daemon=True).start()
+            threading.Thread(target=self._write_shard,
+                             args=(conn, outbox), daemon=True).start()
+
+    def _read_shard(self, zone, conn, loop):
+        while True:
+            try:
+                reply = conn.recv()
+            except (EOFError, OSError):
+                break
+            loop.call_soon_threadsafe(self.on_shard_reply, zone, reply)
+
+    @staticmethod
+    def _write_shard(conn, outbox):
+        # None signals that the worker has been stopped
+        for request in iter(outbox.get, None):
+            try:
+                conn.send(request)
+            except OSError:
+                break
+
+    def _send(self, zone, request):
+        """queue [request] to be sent to the worker for [zone]"""
+        self._outboxes[zone].put(request)
+
+    async def run(self):
+        """start the worker processes, then run the server (see
+        MudServer.run)"""
+        self.start_shards()
+        await super().run()
+
+    def shutdown(self):
+        """shut down this server and stop the worker processes"""
+        super().shutdown()
+        for outbox in self._outboxes:
+            outbox.put(("stop",))
+            outbox.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+
+    def on_shard_reply(self, zone, reply):
+        """handle a reply from the worker for [zone] (see module
+        docstring)"""
+        kind = reply[0]
+        if kind == "out":
+            for pid, msg in reply[1]:
+                player = self.players.get(pid)
+                if player is not None:
+                    player.message(msg)
+        elif kind == "handoff":
+            _, pid, symbol, state = reply
+            player = self.players.get(pid)
+            # if the player quit in the meantime, the character is gone
+            if player is not None:
+                player.zone = self.zones[symbol]
+                self._send(player.zone, ("enter", pid, symbol, state))
+        elif kind == "bounce":
+            request = reply[1]
+            player = self.players.get(request[1])
+            if player is not None and player.zone != zone:
+                self._send(player.zone, request)
+        elif kind == "broadcast":
+            self.message_all(reply[1])
+
+    def on_player_join(self, pid):
+        """assign player [pid] a class and starting location, and ask
+        the worker that owns the location to spawn the character"""
+        logging.info("%s joined.", pid)
+        if self.default_class is not None:
+            PlayerCls = self.default_class
+        else:
+            PlayerCls = self.world.random_cls()
+        start_loc = self.starting_location(pid, PlayerCls)
+        if start_loc is None:
+            return
+        symbol = self._symbols[id(start_loc)]
+        msgs = MessageQueue(PlayerCls.msg_limit, PlayerCls.msg_byte_limit,
+                            PlayerCls.overflow_policy)
+        msgs.stats = self.overflow_stats
+        player = RemotePlayer(self.zones[symbol], msgs)
+        self.players[pid] = player
+        self._send(player.zone, ("join", pid, PlayerCls.__name__, symbol))
+
+    def on_player_msg(self, pid, msg):
+        """forward [msg] to the worker simulating player [pid]"""
+        logging.info("%s says: [%s]", pid, msg)
+        player = self.players[pid]
+        self._send(player.zone, ("msg", pid, msg))
+
+    def on_player_quit(self, pid):
+        """remove player [pid] from the worker simulating them"""
+        logging.info("%s quit.", pid)
+        player = self.players.pop(pid, None)
+        if player is not None:
+            self._send(player.zone, ("quit", pid))
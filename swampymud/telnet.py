@@ -0,0 +1,332 @@
+"""Module implementing the telnet protocol for TCP clients.
+
+A TelnetSession does no I/O of its own. Bytes received from the client
+are passed to feed(), which strips out telnet commands and returns any
+complete lines of text. Outgoing text is passed to send_text(), and
+data_to_send() returns the bytes that should be written to the client
+(including any replies to the client's telnet commands).
+
+The following options are supported:
+    NAWS (31) - the client reports its window size
+    TTYPE (24) - the client reports its terminal type
+    CHARSET (42) - the client may switch the session to UTF-8
+    MCCP2 (86) - everything sent to the client is compressed with zlib
+
+For example:
+
+session = TelnetSession()
+writer.write(session.start()) # offer / request options
+lines = session.feed(await reader.read(4096))
+session.send_text("Hello!\\r\\n")
+writer.write(session.data_to_send())
+"""
+import zlib
+
+# telnet commands
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+GA = 249
+NOP = 241
+SE = 240
+
+# telnet options
+ECHO = 1
+SGA = 3
+TTYPE = 24
+NAWS = 31
+CHARSET = 42
+MCCP2 = 86
+
+# subnegotiation codes for TTYPE
+TTYPE_IS = 0
+TTYPE_SEND = 1
+
+# subnegotiation codes for CHARSET
+CHARSET_REQUEST = 1
+CHARSET_ACCEPTED = 2
+CHARSET_REJECTED = 3
+
+# options that we will enable on our end / ask the client to enable
+LOCAL_OPTIONS = frozenset((CHARSET, MCCP2))
+REMOTE_OPTIONS = frozenset((NAWS, TTYPE))
+
+# maximum length of a subnegotiation (longer ones are discarded)
+MAX_SUBNEG = 1024
+
+# states of the parser
+_DATA, _IAC, _OPTION, _SB, _SB_IAC = range(5)
+
+
+def escape(data):
+    """return [data] with each IAC byte doubled"""
+    return data.replace(b"\xff", b"\xff\xff")
+
+
+class TelnetSession:
+    """class representing the telnet state of one TCP connection"""
+
+    def __init__(self, compress=True, max_line=None):
+        """Create a new TelnetSession.
+        [compress]: if True, offer MCCP2 compression to the client
+        [max_line]: lines longer than this many bytes are discarded
+            (see feed)
+        """
+        self.compress = compress
+        self.max_line = max_line
+        # the client's window size (None until reported)
+        self.width = None
+        self.height = None
+        # the client's terminal type (None until reported)
+        self.terminal_type = None
+        # encoding used for incoming and outgoing text
+        self.encoding = "latin-1"
+        # options currently enabled on our end / on the client's end
+        self.local = set()
+        self.remote = set()
+        # options that we offered / requested, awaiting a reply
+        self._pending_local = set()
+        self._pending_remote = set()
+        # zlib compressor, used once MCCP2 is enabled
+        self._compressor = None
+        # parser state
+        self._state = _DATA
+        self._command = None
+        self._subneg = bytearray()
+        # the current subnegotiation has exceeded MAX_SUBNEG
+        self._subneg_overflow = False
+        self._line = bytearray()
+        # the last data byte was a carriage return
+        self._saw_cr = False
+        # the current line has exceeded max_line
+        self._overflow = False
+        # output waiting for data_to_send()
+        self._out = []
+
+    @property
+    def compressing(self):
+        """True if output is currently compressed with MCCP2"""
+        return self._compressor is not None
+
+    def start(self):
+        """return the bytes to send when the client connects, offering
+        our options and requesting the client's options"""
+        if self.compress:
+            self._offer(MCCP2)
+        self._offer(CHARSET)
+        for option in (NAWS, TTYPE):
+            self._pending_remote.add(option)
+            self._send_command(DO, option)
+        return self.data_to_send()
+
+    def _offer(self, option):
+        """offer to enable [option] on our end"""
+        self._pending_local.add(option)
+        self._send_command(WILL, option)
+
+    # methods for output
+    def send(self, data):
+        """queue raw bytes to be sent to the client (compressed, if
+        MCCP2 is enabled)
+        Data should already be escaped (see escape)."""
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        if data:
+            self._out.append(data)
+
+    def encode(self, text):
+        """return [text] as escaped bytes in the session's encoding"""
+        return escape(text.encode(self.encoding, errors="replace"))
+
+    def send_text(self, text):
+        """queue [text] to be sent to the client"""
+        self.send(self.encode(text))
+
+    def data_to_send(self):
+        """return (and clear) all of the queued output"""
+        if self._compressor is not None:
+            # flush, so that the client can decompress everything sent
+            # so far without waiting for more data
+            self._out.append(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+        data = b"".join(self._out)
+        self._out.clear()
+        return data
+
+    def _send_command(self, command, option):
+        self.send(bytes((IAC, command, option)))
+
+    def _send_subneg(self, option, payload):
+        self.send(bytes((IAC, SB, option)) + escape(payload) +
+                  bytes((IAC, SE)))
+
+    # methods for input
+    def feed(self, data):
+        """parse bytes received from the client, returning a list of the
+        complete lines of text (without line endings)
+        If a line was longer than max_line, None is returned in its
+        place."""
+        lines = []
+        state = self._state
+        line = self._line
+        for byte in data:
+            if state == _DATA:
+                if byte == IAC:
+                    state = _IAC
+                    continue
+                # CR LF, CR NUL, and bare LF all end a line
+                if byte == 10 and self._saw_cr:
+                    self._saw_cr = False
+                    continue
+                if byte == 0 and self._saw_cr:
+                    self._saw_cr = False
+                    continue
+                self._saw_cr = byte == 13
+                if byte in (10, 13):
+                    if self._overflow:
+                        lines.append(None)
+                        self._overflow = False
+                    else:
+                        lines.append(self._decode(line))
+                    line.clear()
+                else:
+                    self._append(byte)
+            elif state == _IAC:
+                if byte == IAC:
+                    # escaped 255 data byte
+                    self._append(byte)
+                    state = _DATA
+                elif byte in (DO, DONT, WILL, WONT):
+                    self._command = byte
+                    state = _OPTION
+                elif byte == SB:
+                    self._subneg.clear()
+                    self._subneg_overflow = False
+                    state = _SB
+                else:
+                    # NOP, GA, etc. are ignored
+                    state = _DATA
+            elif state == _OPTION:
+                self._negotiate(self._command, byte)
+                state = _DATA
+            elif state == _SB:
+                if byte == IAC:
+                    state = _SB_IAC
+                else:
+                    self._append_subneg(byte)
+            elif state == _SB_IAC:
+                if byte == SE:
+                    if not self._subneg_overflow:
+                        self._subnegotiate(bytes(self._subneg))
+                    self._subneg.clear()
+                    state = _DATA
+                else:
+                    # IAC IAC is an escaped 255 (anything else is an
+                    # error, which we treat the same way)
+                    self._append_subneg(byte)
+                    state = _SB
+        self._state = state
+        return lines
+
+    def _append(self, byte):
+        """add [byte] to the current line, unless it is too long"""
+        if self.max_line is not None and len(self._line) >= self.max_line:
+            # discard the line, but remember to report it
+            self._line.clear()
+            self._overflow = True
+        if not self._overflow:
+            self._line.append(byte)
+
+    def _append_subneg(self, byte):
+        """add [byte] to the current subnegotiation, discarding the
+        subnegotiation if it is too long"""
+        if len(self._subneg) >= MAX_SUBNEG:
+            self._subneg.clear()
+            self._subneg_overflow = True
+        if not self._subneg_overflow:
+            self._subneg.append(byte)
+
+    def _decode(self, line):
+        return line.decode(self.encoding, errors="replace")
+
+    def _negotiate(self, command, option):
+        """respond to IAC [command] [option]"""
+        if command == DO:
+            if option in self.local:
+                return
+            if option in LOCAL_OPTIONS and (option != MCCP2 or self.compress):
+                if option not in self._pending_local:
+                    self._send_command(WILL, option)
+                self._pending_local.discard(option)
+                self.local.add(option)
+                self._enable_local(option)
+            else:
+                self._send_command(WONT, option)
+        elif command == DONT:
+            self._pending_local.discard(option)
+            if option in self.local:
+                self.local.remove(option)
+                self._send_command(WONT, option)
+                if option == MCCP2:
+                    self._stop_compression()
+        elif command == WILL:
+            if option in self.remote:
+                return
+            if option in REMOTE_OPTIONS:
+                if option not in self._pending_remote:
+                    self._send_command(DO, option)
+                self._pending_remote.discard(option)
+                self.remote.add(option)
+                if option == TTYPE:
+                    self._send_subneg(TTYPE, bytes((TTYPE_SEND,)))
+            else:
+                self._send_command(DONT, option)
+        elif command == WONT:
+            self._pending_remote.discard(option)
+            if option in self.remote:
+                self.remote.remove(option)
+                self._send_command(DONT, option)
+
+    def _enable_local(self, option):
+        if option == MCCP2:
+            # everything after this subnegotiation is compressed
+            self._send_subneg(MCCP2, b"")
+            self._compressor = zlib.compressobj()
+        elif option == CHARSET:
+            self._send_subneg(CHARSET, bytes((CHARSET_REQUEST,)) + b";UTF-8")
+
+    def _stop_compression(self):
+        if self._compressor is not None:
+            self._out.append(self._compressor.flush(zlib.Z_FINISH))
+            self._compressor = None
+
+    def _subnegotiate(self, data):
+        """handle the subnegotiation IAC SB [data] IAC SE"""
+        if not data:
+            return
+        option, payload = data[0], data[1:]
+        if option == NAWS and len(payload) == 4:
+            self.width = int.from_bytes(payload[:2], "big")
+            self.height = int.from_bytes(payload[2:], "big")
+        elif option == TTYPE and payload[:1] == bytes((TTYPE_IS,)):
+            self.terminal_type = payload[1:].decode("ascii",
+                                                    errors="replace")
+        elif option == CHARSET and payload:
+            code, rest = payload[0], payload[1:]
+            if code == CHARSET_ACCEPTED:
+                if rest.decode("ascii", errors="replace").upper() == "UTF-8":
+                    self.encoding = "utf-8"
+            elif code == CHARSET_REQUEST:
+                # the client is asking us to pick from a list of
+                # charsets, separated by the first byte
+                names = rest[1:].split(rest[:1]) if rest else []
+                names = [name.decode("ascii", errors="replace").upper()
+                         for name in names]
+                if "UTF-8" in names:
+                    self.encoding = "utf-8"
+                    self._send_subneg(CHARSET,
+                                      bytes((CHARSET_ACCEPTED,)) + b"UTF-8")
+                else:
+                    self._send_subneg(CHARSET, bytes((CHARSET_REJECTED,)))
@@ -0,0 +1,73 @@
+'''Module for tracking which in-game objects have changed since they
+were last saved.
+
+Whenever the saved state of a game object changes (for instance, a
+Character moves to a new Location), the object is passed to
+mark_dirty(). Each DirtySet that is currently tracking records the
+object, so that an autosave only needs to serialize the objects that
+actually changed.
+
+For example:
+
+ds = DirtySet()
+ds.start()
+mark_dirty(grug)
+ds.drain() # returns [grug]
+ds.drain() # returns []
+ds.stop()
+
+The engine marks objects when characters, entities, items, and exits
+are added to / removed from Locations. If your own code changes the
+saved state of an object (e.g. renaming a Character), you should call
+mark_dirty() yourself.
+'''
+
+# DirtySets that are currently tracking
+_TRACKING = []
+
+
+def mark_dirty(*objs):
+    '''flag each of [objs] as changed'''
+    for dirty_set in _TRACKING:
+        for obj in objs:
+            dirty_set.add(obj)
+
+
+class DirtySet:
+    '''class representing an ordered set of changed objects
+    Objects are stored by identity, so unhashable objects may be
+    tracked as well.
+    '''
+
+    def __init__(self):
+        '''Create a new (inactive) DirtySet.'''
+        self._objs = {}
+
+    def start(self):
+        '''begin recording objects passed to mark_dirty()'''
+        if self not in _TRACKING:
+            _TRACKING.append(self)
+
+    def stop(self):
+        '''stop recording objects passed to mark_dirty()'''
+        if self in _TRACKING:
+            _TRACKING.remove(self)
+
+    def add(self, obj):
+        '''flag [obj] as changed'''
+        self._objs[id(obj)] = obj
+
+    def drain(self):
+        '''return a list of the changed objects (in the order they were
+        first marked) and clear this DirtySet'''
+        objs = list(self._objs.values())
+        self._objs.clear()
+        return objs
+
+    def __contains__(self, obj):
+        '''returns True if [obj] has been marked'''
+        return id(obj) in self._objs
+
+    def __len__(self):
+        '''returns the number of changed objects'''
+        return len(self._objs)
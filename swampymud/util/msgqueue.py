@@ -0,0 +1,149 @@
+'''Module defining the MessageQueue class, a bounded asyncio.Queue that
+stores the messages waiting to be sent to a player.
+
+Unlike a normal asyncio.Queue, a MessageQueue never blocks or raises an
+exception when it is full. Instead, it applies an OverflowPolicy:
+    DROP_OLDEST - discard the oldest queued messages to make room
+    DROP_NEWEST - discard the incoming message
+    COALESCE - merge all the queued messages into one message (if the
+        merged message would be too large, the oldest messages are
+        dropped first)
+    DISCONNECT - discard everything and close the queue, signaling
+        that the client should be disconnected
+
+For example:
+
+mq = MessageQueue(max_msgs=2, policy=OverflowPolicy.DROP_OLDEST)
+mq.put_nowait("a")
+mq.put_nowait("b")
+mq.put_nowait("c") # "a" is dropped
+mq.get_nowait() # returns "b"
+'''
+import asyncio
+import enum
+from collections import Counter, deque
+
+# separator used when messages are merged by the COALESCE policy
+SEPARATOR = "\n\r"
+
+
+def encoded_size(msg):
+    '''return the length of [msg] in bytes, once encoded as UTF-8'''
+    return len(msg.encode("utf-8", errors="replace"))
+
+
+class OverflowPolicy(enum.Enum):
+    '''Enum representing what a MessageQueue does when it is full'''
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    COALESCE = "coalesce"
+    DISCONNECT = "disconnect"
+
+
+class MessageQueue(asyncio.Queue):
+    '''class representing a queue of outgoing messages, bounded by the
+    number of messages and the total size of the messages
+    '''
+
+    def __init__(self, max_msgs=None, max_bytes=None,
+                 policy=OverflowPolicy.DROP_OLDEST):
+        '''Create a new MessageQueue.
+        [max_msgs]: maximum number of messages (None for no limit)
+        [max_bytes]: maximum total size of the messages (None for no
+            limit). Sizes are measured in bytes of UTF-8.
+        [policy]: the OverflowPolicy applied when a limit is exceeded
+        '''
+        super().__init__()
+        self.max_msgs = max_msgs
+        self.max_bytes = max_bytes
+        self.policy = OverflowPolicy(policy)
+        # set to True once the DISCONNECT policy is triggered
+        self.closed = False
+        # the number of times each policy has been applied
+        # (a server may replace this with a shared Counter)
+        self.stats = Counter()
+
+    # these methods are hooks used by asyncio.Queue
+    def _init(self, maxsize):
+        self._queue = deque()
+        # the size of each message in _queue
+        self._sizes = deque()
+        self.nbytes = 0
+        # the size of the message being put (see put_nowait)
+        self._put_size = None
+
+    def _put(self, msg):
+        size = self._put_size
+        if size is None:
+            size = encoded_size(msg)
+        self._put_size = None
+        self._queue.append(msg)
+        self._sizes.append(size)
+        self.nbytes += size
+
+    def _get(self):
+        self.nbytes -= self._sizes.popleft()
+        return self._queue.popleft()
+
+    def _clear(self):
+        self._queue.clear()
+        self._sizes.clear()
+        self.nbytes = 0
+
+    def _overflows(self, size):
+        '''returns True if adding a message of [size] bytes would exceed
+        a limit'''
+        if self.max_msgs is not None and len(self._queue) >= self.max_msgs:
+            return True
+        if self.max_bytes is not None:
+            return self.nbytes + size > self.max_bytes
+        return False
+
+    def _merged_size(self):
+        '''returns the size of the queued messages once merged'''
+        if not self._queue:
+            return 0
+        return self.nbytes + len(SEPARATOR) * (len(self._queue) - 1)
+
+    def _coalesce(self, size):
+        '''merge the queued messages into one message, first dropping
+        the oldest messages until the merged message and a new message
+        of [size] bytes fit within max_bytes'''
+        if self.max_bytes is not None:
+            while (self._queue and
+                   self._merged_size() + size > self.max_bytes):
+                self._get()
+        if self._queue:
+            merged_size = self._merged_size()
+            merged = SEPARATOR.join(self._queue)
+            self._clear()
+            self._put_size = merged_size
+            self._put(merged)
+
+    def put_nowait(self, msg):
+        '''Put [msg] into the queue, applying the overflow policy if
+        the queue is full. Messages put into a closed queue are
+        silently discarded.'''
+        if self.closed:
+            return
+        size = encoded_size(msg)
+        if self._overflows(size):
+            self.stats[self.policy] += 1
+            if self.policy is OverflowPolicy.DROP_NEWEST:
+                return
+            if self.policy is OverflowPolicy.DISCONNECT:
+                self._clear()
+                self.closed = True
+                # put an empty message to wake up the consumer, who
+                # should then check the 'closed' flag
+                super().put_nowait("")
+                return
+            if self.policy is OverflowPolicy.COALESCE:
+                self._coalesce(size)
+            # drop the oldest messages until the new message fits
+            # (a lone message that exceeds max_bytes is still accepted)
+            while self._queue and self._overflows(size):
+                self._get()
+        # passed to _put, so that the message is only encoded once
+        self._put_size = size
+        super().put_nowait(msg)
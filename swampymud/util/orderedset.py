@@ -0,0 +1,63 @@
+'''Module defining the OrderedSet class, a set that remembers the order
+in which its members were added.
+
+OrderedSets are used to store the occupants of a Location, since
+occupants need to be listed in a consistent order (e.g. in
+Location.view), but are frequently added and removed.
+
+Adding, removing, and checking membership all take O(1) time.
+
+For example:
+
+os = OrderedSet(["grug", "abra"])
+os.add("bill")
+os.remove("grug")
+list(os) # returns ["abra", "bill"]
+"bill" in os # returns True
+'''
+
+
+class OrderedSet:
+    '''class representing an insertion-ordered set'''
+
+    def __init__(self, members=()):
+        '''Create a new OrderedSet with [members].'''
+        # dicts preserve insertion order, so we only use the keys
+        self._members = dict.fromkeys(members)
+
+    def add(self, member):
+        '''add [member] to the set (if [member] is already in the set,
+        its position is unchanged)'''
+        self._members[member] = None
+
+    def remove(self, member):
+        '''remove [member] from the set
+        raises KeyError if [member] is not in the set'''
+        del self._members[member]
+
+    def discard(self, member):
+        '''remove [member] from the set, if it is present'''
+        self._members.pop(member, None)
+
+    def __contains__(self, member):
+        return member in self._members
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def __reversed__(self):
+        # (dicts are only reversible in Python 3.8+)
+        return reversed(list(self._members))
+
+    def __len__(self):
+        return len(self._members)
+
+    def __eq__(self, other):
+        '''two OrderedSets are equal iff they have the same members in
+        the same order'''
+        if not isinstance(other, OrderedSet):
+            return NotImplemented
+        return list(self._members) == list(other._members)
+
+    def __repr__(self):
+        return f"OrderedSet({list(self._members)!r})"
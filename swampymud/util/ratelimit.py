@@ -0,0 +1,70 @@
+'''Module defining the TokenBucket class, used to limit how quickly
+players can send commands, and the FloodAction enum, which determines
+what the server does with commands that exceed the limit:
+    DROP - discard the command (and tell the player)
+    DELAY - hold the command until the bucket refills
+    KICK - disconnect the player
+
+A TokenBucket holds up to [burst] tokens, and refills at [rate] tokens
+per second. Each command takes one token, so a player can send a quick
+burst of commands, but cannot keep sending faster than [rate].
+
+For example:
+
+bucket = TokenBucket(rate=2, burst=3)
+bucket.take() # returns True
+bucket.take() # returns True
+bucket.take() # returns True
+bucket.take() # returns False
+bucket.wait_time() # returns 0.5 (seconds until the next token)
+'''
+import enum
+import time
+
+
+class FloodAction(enum.Enum):
+    '''Enum representing what the server does when a player sends
+    commands too quickly'''
+    DROP = "drop"
+    DELAY = "delay"
+    KICK = "kick"
+
+
+class TokenBucket:
+    '''class representing a token bucket rate limiter'''
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        '''Create a new (full) TokenBucket.
+        [rate]: number of tokens added per second
+        [burst]: maximum number of tokens in the bucket
+        [clock]: function returning the current time in seconds
+        '''
+        if rate <= 0 or burst < 1:
+            raise ValueError("Expected rate > 0 and burst >= 1, received "
+                             f"rate={rate}, burst={burst}")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._last = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def take(self, count=1):
+        '''Remove [count] tokens from the bucket and return True, or
+        return False (and remove nothing) if there are not enough.'''
+        self._refill()
+        if self._tokens < count:
+            return False
+        self._tokens -= count
+        return True
+
+    def wait_time(self, count=1):
+        '''return the number of seconds until [count] tokens will be
+        available (0 if they are available now)'''
+        self._refill()
+        return max(0, (count - self._tokens) / self.rate)
@@ -19,48 +19,141 @@ sd["wizard"] # returns "gandalf"
 This data structure is used to store character Commands, thus allowing
 CharacterClass Commands to temporarily be shadowed by Equippable or
 Entity Commands.
+
+A ShadowDict can also be given a [base] mapping, which acts as the
+bottom of every stack. The base is never modified, so many ShadowDicts
+can share one base. (Deleting a base value simply hides it.)
+
+sd = ShadowDict(base={"wizard": "gandalf"})
+sd["wizard"] = "dumbledore"
+del sd["wizard"]
+sd["wizard"] # returns "gandalf"
+del sd["wizard"]
+"wizard" in sd # returns False
+
+Values can also be added with 'push', which returns a token. Passing
+the token to 'remove' removes that value, even if it is shadowed:
+
+sd = ShadowDict()
+sd["wizard"] = "gandalf"
+token = sd.push("wizard", "saruman")
+sd["wizard"] = "dumbledore"
+sd.remove(token)
+sd.layers("wizard") # returns ["gandalf", "dumbledore"]
 '''
+import itertools
 
 class ShadowDict:
     '''class representing a ShadowDict, in which multiple values can be
     stored under one key. Only the most recent value will be visible.
     '''
 
-    def __init__(self, start_dict=None):
+    def __init__(self, start_dict=None, base=None):
         '''Create a new ShadowDict. Provide [start_dict] (optional) to
-        to fill the ShadowDict with something.'''
+        to fill the ShadowDict with something. Provide [base] (optional)
+        to use a mapping as the bottom layer of the ShadowDict.'''
+        # each key maps to a dict of {serial number: value}, where the
+        # most recent value is last
         self._dict = {}
+        self._base = base
+        # keys in the base that have been deleted
+        self._hidden = set()
+        self._serials = itertools.count()
+        # incremented whenever a value is added / removed
+        self._version = 0
         if start_dict:
             for key, value in start_dict.items():
-                self._dict[key] = [value]
+                self.push(key, value)
+
+    @property
+    def version(self):
+        '''a number that changes whenever a value is added / removed
+        (changes to the base mapping are not counted)'''
+        return self._version
+
+    @property
+    def modified(self):
+        '''True if any values have been added or base keys hidden'''
+        return bool(self._dict or self._hidden)
+
+    def _in_base(self, key):
+        '''returns True if [key] is visible in the base mapping'''
+        return (self._base is not None and key not in self._hidden
+                and key in self._base)
 
     def __getitem__(self, key):
         '''Get the object corresponding to [key].
         Raises a KeyError if key is not present.'''
-        lst = self._dict[key]
-        return lst[-1]
+        try:
+            # (dict views are only reversible in Python 3.8+)
+            return list(self._dict[key].values())[-1]
+        except KeyError:
+            if self._base is None or key in self._hidden:
+                raise
+            return self._base[key]
+
+    def get(self, key, default=None):
+        '''return the object corresponding to [key], or [default] if
+        key is not present (the base is only checked once)'''
+        try:
+            return self[key]
+        except KeyError:
+            return default
 
     def __setitem__(self, key, value):
         '''Map 'key' to 'value'.
         If key is already in use, the previous value gets shadowed.'''
-        if key in self._dict:
-            self._dict[key].append(value)
-        else:
-            self._dict[key] = [value]
+        self.push(key, value)
+
+    def push(self, key, value):
+        '''Map 'key' to 'value', like __setitem__, and return a token
+        that can be passed to 'remove' to remove this value later.'''
+        serial = next(self._serials)
+        self._version += 1
+        try:
+            self._dict[key][serial] = value
+        except KeyError:
+            self._dict[key] = {serial: value}
+        return (key, serial)
+
+    def remove(self, token):
+        '''remove the value corresponding to [token] (returned by
+        'push'), even if the value is shadowed
+        raises a KeyError if the value was already removed'''
+        key, serial = token
+        layers = self._dict[key]
+        del layers[serial]
+        self._version += 1
+        # remove the key if it has no more values
+        if not layers:
+            del self._dict[key]
+
+    def layers(self, key):
+        '''return a list of all the values stored under [key], with
+        the most recent (visible) value last'''
+        layers = list(self._dict.get(key, {}).values())
+        if self._in_base(key):
+            layers.insert(0, self._base[key])
+        return layers
 
     def __delitem__(self, key):
         '''delete 'key'
         If a value was shadowed, the key is reverted to the previous value
         raises KeyError if key is not in use'''
-        lst = self._dict[key]
-        lst.pop()
-        # if lst is now empty, remove the key altogether
-        if not lst:
+        if key not in self._dict and self._in_base(key):
+            self._hidden.add(key)
+            self._version += 1
+            return
+        layers = self._dict[key]
+        layers.popitem()
+        self._version += 1
+        # if there are no more values, remove the key altogether
+        if not layers:
             del self._dict[key]
 
     def __contains__(self, key):
         '''returns true if 'key' is in ShadowDict'''
-        return key in self._dict
+        return key in self._dict or self._in_base(key)
 
     def __repr__(self):
         '''return a representation of the ShadowDict'''
@@ -71,28 +164,56 @@ class ShadowDict:
 
     def __iter__(self):
         '''iterate over the keys of the dict'''
-        for k in self._dict.keys():
-            yield k
+        # keys from the base come first
+        if self._base is not None:
+            for k in self._base:
+                if k not in self._hidden:
+                    yield k
+            for k in self._dict.keys():
+                if not self._in_base(k):
+                    yield k
+        else:
+            yield from self._dict.keys()
 
     def copy(self):
         '''return a shallow copy of this ShadowDict'''
-        return ShadowDict(start_dict=self)
+        if self._base is None:
+            return ShadowDict(start_dict=self)
+        copied = ShadowDict(base=self._base)
+        copied._hidden = set(self._hidden)
+        for key in self._dict:
+            copied.push(key, self[key])
+        return copied
 
     def items(self):
         '''iterate over the current key, value pairs'''
-        for k in self._dict:
+        for k in self:
             yield (k, self[k])
 
     def remove_value(self, key, value):
         '''remove a value stored under key, even if value is shadowed
         raises a KeyError if the key is not in the ShadowDict
-        raises a ValueError if the value is not stored under the key'''
-        lst = self._dict[key]
-        lst.remove(value)
-        # remove lst if it is empty
-        if not lst:
-            del self._dict[key]
+        raises a ValueError if the value is not stored under the key
+        (Note that this requires a linear search. If you will need to
+        remove a value later, consider using 'push' and 'remove'.)'''
+        layers = self._dict.get(key)
+        if layers is not None:
+            for serial, other in layers.items():
+                if other == value:
+                    self.remove((key, serial))
+                    return
+        if self._in_base(key):
+            if self._base[key] != value:
+                raise ValueError(f"{value!r} not stored under {key!r}")
+            self._hidden.add(key)
+            self._version += 1
+        elif layers is None:
+            raise KeyError(key)
+        else:
+            raise ValueError(f"{value!r} not stored under {key!r}")
 
     def __len__(self):
         '''returns the number of keys in ShadowDict'''
-        return len(self._dict)
+        if self._base is None:
+            return len(self._dict)
+        return sum(1 for _ in self)
@@ -0,0 +1,78 @@
+'''Module defining the TimingWheel class, used to schedule periodic
+updates in terms of game ticks.
+
+A TimingWheel is a ring of slots. Each tick, the wheel advances to the
+next slot, and only the objects in that slot are examined. An object
+that is due in more ticks than there are slots simply waits for the
+wheel to come around again (tracked by a count of remaining rounds).
+Thus, advancing the wheel costs time proportional to the number of
+objects in one slot, not the number of objects scheduled.
+
+For example:
+
+tw = TimingWheel()
+tw.schedule("goblin", 2)
+tw.advance() # returns []
+tw.advance() # returns ["goblin"]
+tw.advance() # returns []
+tw.advance() # returns ["goblin"]
+'''
+
+
+class TimingWheel:
+    '''class representing a timing wheel of periodic objects'''
+
+    def __init__(self, size=512):
+        '''Create a new TimingWheel with [size] slots.'''
+        if size < 1:
+            raise ValueError(f"Expected size > 0, received {size}")
+        # each slot maps an object to (remaining rounds, interval)
+        self._slots = [{} for _ in range(size)]
+        # maps each object to the index of its slot
+        self._where = {}
+        # number of ticks elapsed
+        self.ticks = 0
+
+    def schedule(self, obj, interval):
+        '''Schedule [obj] to be due every [interval] ticks, starting
+        [interval] ticks from now. If [obj] was already scheduled, its
+        previous schedule is replaced.'''
+        if not isinstance(interval, int) or interval < 1:
+            raise ValueError("Expected integer interval > 0, received %r"
+                             % interval)
+        self.cancel(obj)
+        size = len(self._slots)
+        index = (self.ticks + interval) % size
+        self._slots[index][obj] = ((interval - 1) // size, interval)
+        self._where[obj] = index
+
+    def cancel(self, obj):
+        '''Remove [obj] from the wheel. Does nothing if [obj] is not
+        scheduled.'''
+        index = self._where.pop(obj, None)
+        if index is not None:
+            del self._slots[index][obj]
+
+    def advance(self):
+        '''Advance the wheel by one tick, returning a list of the objects
+        that are now due. Each due object is rescheduled for its next
+        interval.'''
+        self.ticks += 1
+        slot = self._slots[self.ticks % len(self._slots)]
+        due = []
+        # copy the slot, since objects may be rescheduled into it
+        for obj, (rounds, interval) in list(slot.items()):
+            if rounds:
+                slot[obj] = (rounds - 1, interval)
+            else:
+                due.append(obj)
+                self.schedule(obj, interval)
+        return due
+
+    def __contains__(self, obj):
+        '''returns True if [obj] is scheduled'''
+        return obj in self._where
+
+    def __len__(self):
+        '''returns the number of scheduled objects'''
+        return len(self._where)
@@ -1,27 +1,71 @@
 """This module provides methods for serializing / deserializing game data,
-and also defines the World class"""
+and also defines the World class and the Autosave class"""
+import os
+import gzip
+import pickle
+import hashlib
+import asyncio
+import logging
+import traceback
 import importlib
 import warnings
+import textwrap
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from random import choices
 import yaml
+# use libyaml's much faster C loader, if it's available
+try:
+    from yaml import CSafeLoader as SafeLoader, CDumper as Dumper
+except ImportError:
+    from yaml import SafeLoader, Dumper
 from swampymud.location import Location
+from swampymud.navigation import ExitGraph
 from swampymud.character import CharacterClass, Character
 from swampymud.item import ItemClass, Item
 from swampymud.entity import EntityClass, Entity
 from swampymud.inventory import ItemStack
 from swampymud.mudscript import LocationExport
+from swampymud.util.dirty import DirtySet
 
 # TODO: change these to sets?
 _GAME_OBJS = (Character, Item, Entity, Location)
 _GAME_CLASSES = (CharacterClass, ItemClass, EntityClass)
 
-def read_worldfile(save_name):
-    """return a parsed world file"""
-    #TODO: add a 'gzip' layer to this
-    with open(save_name) as save_file:
-        save_data = save_file.read()
-    save_data = yaml.safe_load(save_data)
+# the first two bytes of any gzip file
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _open_worldfile(save_name, mode="r", compress=None):
+    """open world file [save_name] in text [mode], using gzip if
+    appropriate
+    When reading, gzip is detected from the file's contents. When
+    writing, the file is compressed if [compress] is True, or if
+    [compress] is None and [save_name] ends with '.gz'.
+    """
+    if mode == "r":
+        with open(save_name, "rb") as save_file:
+            compress = save_file.read(2) == _GZIP_MAGIC
+    elif compress is None:
+        compress = save_name.endswith(".gz")
+    if compress:
+        return gzip.open(save_name, mode + "t")
+    return open(save_name, mode)
+
+
+def read_worldfile(save_name, use_cache=False):
+    """return a parsed world file
+
+    If [use_cache] is True, the parsed data is also stored in a binary
+    cache file next to the world file. As long as the world file does
+    not change, later reads will use the cache instead of parsing the
+    YAML again.
+    """
+    if use_cache:
+        save_data = _read_cached(save_name)
+    else:
+        with _open_worldfile(save_name) as save_file:
+            save_data = yaml.load(save_file, Loader=SafeLoader)
     # TODO: maybe add a link to the documentation for this one?
     if not isinstance(save_data, dict):
         raise TypeError(f"Received '{type(save_data)}' instead a dict "
@@ -45,12 +89,91 @@ def read_worldfile(save_name):
     return save_data
 
 
-def write_worldfile(save_name, save_data):
-    """write [save_data] to file [save_name] in YAML format"""
-    #TODO add a gzip layer to this
-    save_data = yaml.dump(save_data, default_flow_style=False)
-    with open(save_name, 'w') as save_file:
-        save_file.write(save_data)
+def _read_cached(save_name):
+    """return the parsed data of world file [save_name], using the
+    cache file if it is still valid and updating it otherwise
+
+    The cache is keyed on the modification time, size, and SHA-256
+    hash of the world file. Since the cache is a pickle, only use it
+    in directories that you trust.
+    """
+    cache_name = f"{save_name}.cache"
+    stat = os.stat(save_name)
+    try:
+        with open(cache_name, "rb") as cache_file:
+            (mtime, size, digest), save_data = pickle.load(cache_file)
+    # if the cache is missing or corrupted, simply ignore it
+    except Exception:
+        mtime = size = digest = None
+    # world file has not been touched, so the cache is up to date
+    if mtime == stat.st_mtime_ns and size == stat.st_size:
+        return save_data
+    with open(save_name, "rb") as save_file:
+        raw_data = save_file.read()
+    new_digest = hashlib.sha256(raw_data).hexdigest()
+    # only parse the file if the contents actually changed
+    if new_digest != digest:
+        if raw_data.startswith(_GZIP_MAGIC):
+            raw_data = gzip.decompress(raw_data)
+        save_data = yaml.load(raw_data, Loader=SafeLoader)
+    try:
+        with open(cache_name, "wb") as cache_file:
+            key = (stat.st_mtime_ns, stat.st_size, new_digest)
+            pickle.dump((key, save_data), cache_file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+    # if we cannot write the cache (e.g. a read-only directory), we
+    # just skip it
+    except OSError:
+        pass
+    return save_data
+
+
+def write_worldfile(save_name, save_data, compress=None):
+    """write [save_data] to file [save_name] in YAML format
+    (See _open_worldfile for the meaning of [compress].)
+    """
+    with _open_worldfile(save_name, "w", compress) as save_file:
+        yaml.dump(save_data, save_file, Dumper=Dumper,
+                  default_flow_style=False)
+
+
+def stream_worldfile(save_name, world, compress=None):
+    """write [world] to file [save_name] in YAML format, one object at
+    a time
+    Unlike write_worldfile(save_name, world.save()), the personae are
+    never held in memory all at once. Each object is written as soon
+    as build_tree reaches it, and the tree is written at the end.
+    Returns a list of the symbols of all the objects written.
+    (See _open_worldfile for the meaning of [compress].)
+    The data is written to a temporary file first, so that an error
+    (or crash) cannot leave us with a half-written world file.
+    """
+    if compress is None:
+        compress = save_name.endswith(".gz")
+    symbols = []
+    temp_name = f"{save_name}.tmp"
+    try:
+        with _open_worldfile(temp_name, "w", compress) as save_file:
+            yaml.dump({"prelude": world.prelude}, save_file, Dumper=Dumper,
+                      default_flow_style=False)
+            save_file.write("personae:\n")
+
+            def write_persona(symbol, data):
+                entry = yaml.dump({symbol: data}, Dumper=Dumper,
+                                  default_flow_style=False)
+                # indent the entry so that it falls under "personae"
+                save_file.write(textwrap.indent(entry, "  "))
+                symbols.append(symbol)
+
+            _, tree = build_tree(world, defaultdict(int), defaultdict(int),
+                                 write_persona)
+            yaml.dump({"tree": tree["world"]}, save_file, Dumper=Dumper,
+                      default_flow_style=False)
+    except BaseException:
+        os.remove(temp_name)
+        raise
+    os.replace(temp_name, save_name)
+    return symbols
 
 
 def load_prelude(prelude_data):
@@ -136,6 +259,20 @@ def load_object(obj_data, type_names):
     return ObjType.load(obj_data)
 
 
+class _SymbolNames:
+    """mapping that resolves each name in [names] back to its own
+    symbol (used to check symbols without replacing them)"""
+
+    def __init__(self, prefix, names):
+        self.prefix = prefix
+        self.names = names
+
+    def __getitem__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        return self.prefix + name
+
+
 def check_symbols(data, obj_names, type_names):
     """Return a deep copy of data with each symbol checked. Warn if a
     symbol is used in data but cannot be found in obj_names or
@@ -144,47 +281,19 @@ def check_symbols(data, obj_names, type_names):
     If a symbol cannot be found, then the item is omitted (in the case
     of a list) or the key, value pair is omitted (in the case of a
     dict).
+    (This is resolve_symbols without the replacement.)
     """
-    with warnings.catch_warnings(record=True) as warn_list:
-        checked = _check_symbols(data, obj_names, type_names)
-    # collect the warnings, resend them, and provide number of skipped
-    for warn in warn_list:
-        warnings.warn(warn.message)
-    if warn_list:
-        warnings.warn(f"Omitted {len(warn_list)} field(s). (Bad symbol.)")
+    errors = []
+    checked = resolve_symbols(data, _SymbolNames("$", obj_names),
+                              _SymbolNames("^", type_names), errors)
+    for _, symbol in errors:
+        kind = "object" if symbol.startswith("$") else "type"
+        warnings.warn(f"Unknown {kind} symbol '{symbol}'.")
+    if errors:
+        warnings.warn(f"Omitted {len(errors)} field(s). (Bad symbol.)")
     return checked
 
 
-def _check_symbols(data, obj_names, type_names):
-    """Helper function for check_symbols"""
-    if isinstance(data, str):
-        if data.startswith("$") and data[1:] not in obj_names:
-            warnings.warn(f"Unknown object symbol '{data}'.")
-            return
-        if data.startswith("^") and data[1:] not in type_names:
-            warnings.warn(f"Unknown type symbol '{data}'.")
-            return
-    elif isinstance(data, list):
-        checked = [_check_symbols(i, obj_names, type_names) for i in data]
-        # remove any items that failed the check
-        return [
-            after for before, after in zip(data, checked)
-            if after is not None or before is None
-        ]
-    elif isinstance(data, dict):
-        checked = {
-            key: _check_symbols(value, obj_names, type_names)
-            for key, value in data.items()
-        }
-        # remove any values that failed the check
-        return {
-            k: checked[k] for k in checked
-            if checked[k] is not None or data[k] is None
-        }
-    # data has passed the check, return it
-    return data
-
-
 def update_symbols(data, obj_names, type_names):
     """Return a deep copy of [data] with all symbols replaced with their
     corresponding in-game values.
@@ -192,34 +301,92 @@ def update_symbols(data, obj_names, type_names):
     Object symbols (prefixed with '$') are updated by [obj_names].
     Type symbols (prefixed with '^') are updated by [type_names].
 
-    Raises KeyError if a symbol cannot be found. (Consider checking data
-    with check_symbols before using this function.)
+    Raises KeyError if a symbol cannot be found. (Consider using
+    resolve_symbols instead, which omits bad symbols.)
+    """
+    errors = []
+    updated = resolve_symbols(data, obj_names, type_names, errors)
+    if errors:
+        _, symbol = errors[0]
+        raise KeyError(symbol[1:])
+    return updated
+
+
+# marks a value that failed resolve_symbols
+_BAD_SYMBOL = object()
+
+
+def resolve_symbols(data, obj_names, type_names, errors):
+    """Return a deep copy of [data] with all symbols replaced with their
+    corresponding in-game values, checking each symbol along the way.
+
+    This does the work of check_symbols and update_symbols in a single
+    pass. If a symbol cannot be found in [obj_names] or [type_names],
+    the item is omitted (in the case of a list) or the key, value pair
+    is omitted (in the case of a dict), and a tuple (path, symbol) is
+    appended to [errors], where path is a list of the keys / indices
+    leading to the bad symbol.
     """
     # base case 1--data is a string
     if isinstance(data, str):
-        # if object is a symbol, return the appropriate object / type
         if data.startswith("$"):
-            return obj_names[data[1:]]
+            try:
+                return obj_names[data[1:]]
+            except KeyError:
+                errors.append(([], data))
+                return _BAD_SYMBOL
         if data.startswith("^"):
-            return type_names[data[1:]]
-        # otherwise, return the original string
+            try:
+                return type_names[data[1:]]
+            except KeyError:
+                errors.append(([], data))
+                return _BAD_SYMBOL
         return data
     # recursive case 1--data is a list
     elif isinstance(data, list):
-        # run the function on every member of the list
-        return [update_symbols(x, obj_names, type_names) for x in data]
-    # recurive case 2--data is a dict
+        resolved = []
+        for index, item in enumerate(data):
+            start = len(errors)
+            value = resolve_symbols(item, obj_names, type_names, errors)
+            # record where any errors occurred
+            for path, _ in errors[start:]:
+                path.insert(0, index)
+            if value is not _BAD_SYMBOL:
+                resolved.append(value)
+        return resolved
+    # recursive case 2--data is a dict
     elif isinstance(data, dict):
-        # run the function on every value in the dictionary
-        return {
-            key: update_symbols(value, obj_names, type_names)
-            for (key, value) in data.items()
-        }
+        resolved = {}
+        for key, item in data.items():
+            start = len(errors)
+            value = resolve_symbols(item, obj_names, type_names, errors)
+            for path, _ in errors[start:]:
+                path.insert(0, key)
+            if value is not _BAD_SYMBOL:
+                resolved[key] = value
+        return resolved
     # base case 2--data is some other type and we won't touch it
     else:
         return data
 
 
+def warn_bad_symbols(errors):
+    """produce a warning for each error recorded by resolve_symbols"""
+    for path, symbol in errors:
+        kind = "object" if symbol.startswith("$") else "type"
+        location = ""
+        for key in path:
+            if isinstance(key, int):
+                location += f"[{key}]"
+            elif location:
+                location += f".{key}"
+            else:
+                location = str(key)
+        warnings.warn(f"Unknown {kind} symbol '{symbol}' at '{location}'.")
+    if errors:
+        warnings.warn(f"Omitted {len(errors)} field(s). (Bad symbol.)")
+
+
 def load_personae(personae_data, type_names, obj_names=None):
     """Returns a dict mapping symbols to game objects loaded from
     personae_data.
@@ -244,11 +411,11 @@ def load_personae(personae_data, type_names, obj_names=None):
             skipped += 1
     if skipped:
         warnings.warn(f"{skipped} object(s) failed to load.")
-    # check fields with malformed symbols
-    personae_data = check_symbols(personae_data, obj_names, type_names)
-    # update all the symbols as appropriate
-    # TODO: take into account symbols that failed above?
-    updated_data = update_symbols(personae_data, obj_names, type_names)
+    # check and update all the symbols in one pass
+    errors = []
+    updated_data = resolve_symbols(personae_data, obj_names, type_names,
+                                   errors)
+    warn_bad_symbols(errors)
     # now call all the 'post_load' methods
     for obj_id, obj in obj_names.items():
         obj_data = updated_data[obj_id]
@@ -270,7 +437,9 @@ def walk_tree(tree, obj_names, cls_names):
         if "_type" in tree:
             try:
                 obj = load_object(tree, cls_names)
-                tree = update_symbols(tree, obj_names, cls_names)
+                errors = []
+                tree = resolve_symbols(tree, obj_names, cls_names, errors)
+                warn_bad_symbols(errors)
                 obj.post_load(tree)
                 yield obj
             except Exception as ex:
@@ -344,7 +513,7 @@ def symbol_replace(data, sym_counts):
         return data
 
 
-def build_tree(obj, personae_counts, tree_counts):
+def build_tree(obj, personae_counts, tree_counts, on_persona=None):
     """Returns a tuple (subtree, personae_chunk) containing a subtree of
     the World Tree and a chunk of personae data
 
@@ -356,6 +525,10 @@ def build_tree(obj, personae_counts, tree_counts):
 
     personae_counts and tree_counts will be updated to reflect the
     number of times this obj and its children are used.
+
+    If [on_persona] is provided, each object's personae data is passed
+    to on_persona(symbol, data) as soon as it is serialized, rather
+    than being collected into the personae chunk (which will be empty).
     """
     personae = {}
     subtrees = []
@@ -368,31 +541,133 @@ def build_tree(obj, personae_counts, tree_counts):
 
         # replace the child's data symbols and add to personae
         child_data = symbol_replace(child.save(), personae_counts)
-        personae[child.symbol] = child_data
+        if on_persona is None:
+            personae[child.symbol] = child_data
+        else:
+            on_persona(child.symbol, child_data)
 
-        chunk, subtree = build_tree(child, personae_counts, tree_counts)
+        chunk, subtree = build_tree(child, personae_counts, tree_counts,
+                                    on_persona)
         # update personae with the personae_chunk
         # this is valid since each symbol should be unique
         personae.update(chunk)
         subtrees.append(subtree)
+    return personae, make_subtree(obj.symbol, subtrees)
+
+
+def make_subtree(symbol, subtrees):
+    """Return the subtree of the World Tree with [symbol] as its root
+    and [subtrees] as its children.
+    """
     # run through a series of cases to build the tree
     # refer to the World Specification document for discussion of cases
     if len(subtrees) == 0:
         # if there are no subtrees, then we can use obj's symbol as tree
-        tree = obj.symbol
+        return symbol
     elif len(subtrees) == 1:
-        tree = { obj.symbol : subtrees[0] }
+        return { symbol : subtrees[0] }
     elif all(map(lambda x: isinstance(x, dict), subtrees)):
         # list is unecessary, we can join the dicts together
         # this is valid because symbols can be used only once
         combined_dict = {}
         for subdict in subtrees:
             combined_dict.update(subdict)
-        tree = {obj.symbol: combined_dict}
+        return {symbol: combined_dict}
     else:
         # worst case, simply map the list
-        tree = {obj.symbol: subtrees}
-    return personae, tree
+        return {symbol: subtrees}
+
+
+# functions for incremental saves
+def journal_names(save_name):
+    """return the names of the journal files used with [save_name]
+    The first is a journal that is being merged into the world file,
+    the second is the journal currently being appended to."""
+    return [f"{save_name}.journal.1", f"{save_name}.journal"]
+
+
+def flatten_tree(tree, parent="world", links=None):
+    """Return a dict mapping each symbol in [tree] to a list of the
+    symbols of its children. (The top of the tree is stored under
+    [parent].)
+
+    This function assumes that [tree] contains only symbols (no
+    anonymous objects), as is the case for trees produced by
+    build_tree.
+    """
+    if links is None:
+        links = {}
+    links.setdefault(parent, [])
+    if isinstance(tree, str):
+        links[parent].append(tree)
+        links.setdefault(tree, [])
+    elif isinstance(tree, dict):
+        for symbol, subtree in tree.items():
+            links[parent].append(symbol)
+            flatten_tree(subtree, symbol, links)
+    elif isinstance(tree, list):
+        for subtree in tree:
+            flatten_tree(subtree, parent, links)
+    return links
+
+
+def nest_tree(symbol, links):
+    """inverse of flatten_tree, return the subtree with [symbol] at
+    its root"""
+    subtrees = [nest_tree(child, links) for child in links.get(symbol, ())]
+    return make_subtree(symbol, subtrees)
+
+
+def apply_journal(save_data, entries):
+    """Return a copy of [save_data] (a parsed world file) with each
+    journal entry in [entries] applied in order.
+
+    Any objects that are no longer reachable from the World Tree are
+    dropped, just as they would be with a full save.
+    """
+    personae = dict(save_data["personae"])
+    links = flatten_tree(save_data["tree"])
+    for entry in entries:
+        personae.update(entry.get("personae") or {})
+        links.update(entry.get("tree") or {})
+    # find every symbol still in the tree
+    reachable = set()
+    stack = ["world"]
+    while stack:
+        symbol = stack.pop()
+        if symbol not in reachable:
+            reachable.add(symbol)
+            stack.extend(links.get(symbol, ()))
+    tree = nest_tree("world", links)
+    return {
+        "prelude": save_data["prelude"],
+        "personae": {sym: data for sym, data in personae.items()
+                     if sym in reachable},
+        "tree": tree["world"] if isinstance(tree, dict) else {}
+    }
+
+
+def compact_journal(save_name, journals):
+    """Merge each journal file in [journals] into the world file
+    [save_name], then delete the journals.
+    Missing journals are ignored.
+    """
+    entries = []
+    for journal in journals:
+        if os.path.exists(journal):
+            with open(journal) as journal_file:
+                entries.extend(e for e in yaml.safe_load_all(journal_file)
+                               if e)
+    if entries:
+        save_data = apply_journal(read_worldfile(save_name), entries)
+        # write to a temporary file first, so that a crash cannot
+        # leave us with a half-written world file
+        write_worldfile(f"{save_name}.tmp", save_data,
+                        compress=save_name.endswith(".gz"))
+        os.replace(f"{save_name}.tmp", save_name)
+    for journal in journals:
+        if os.path.exists(journal):
+            os.remove(journal)
 
 
 class World:
@@ -434,6 +709,8 @@ class World:
                 self.item_classes[cls.__name__] = cls
             elif isinstance(cls, EntityClass):
                 self.entity_classes[cls.__name__] = cls
+        # index the exits between locations for pathfinding
+        self.graph = ExitGraph(self.locations.values())
 
     def children(self):
         """iterate over the locations in this world"""
@@ -451,14 +728,25 @@ class World:
             "tree": tree["world"]
         }
 
-    def to_file(self, filename):
-        """write this world's save data to [filename]"""
-        write_worldfile(filename, self.save())
+    def to_file(self, filename, compress=None):
+        """write this world's save data to [filename]
+        The file is gzipped if [compress] is True, or if [compress] is
+        None and [filename] ends with '.gz'.
+        """
+        stream_worldfile(filename, self, compress)
 
     @staticmethod
-    def from_file(filename):
-        """returns a World loaded from a file"""
-        world_data = read_worldfile(filename)
+    def from_file(filename, use_cache=False):
+        """returns a World loaded from a file
+        If an Autosave left any journals behind, they are merged into
+        the file first.
+        If [use_cache] is True, a binary cache of the parsed file is
+        used to speed up later loads. (See read_worldfile.)
+        """
+        journals = journal_names(filename)
+        if any(map(os.path.exists, journals)):
+            compact_journal(filename, journals)
+        world_data = read_worldfile(filename, use_cache)
         return World(**world_data)
 
     def random_cls(self):
@@ -482,3 +770,171 @@ class World:
         }}
         tree = "tavern"
         return World(prelude, personae, tree)
+
+
+class Autosave:
+    """class that incrementally saves a World to a world file
+
+    The first checkpoint writes the whole World to [save_name]. After
+    that, each checkpoint appends only the objects that changed (see
+    swampymud.util.dirty) to an append-only journal. Every
+    [compact_every] checkpoints, the journal is merged back into the
+    world file.
+
+    Objects are serialized by checkpoint() itself, but the files are
+    written by a background thread, in the order that they were
+    requested (use flush() to wait for them).
+    """
+
+    def __init__(self, world, save_name, interval=60, compact_every=10):
+        """Create a new Autosave for [world].
+        [save_name]: the world file to save to
+        [interval]: seconds between checkpoints (used by run())
+        [compact_every]: number of checkpoints between compactions
+        """
+        self.world = world
+        self.save_name = save_name
+        self.interval = interval
+        self.compact_every = compact_every
+        self._dirty = DirtySet()
+        # symbols already written to the world file / journal
+        # (None until the first checkpoint)
+        self._known = None
+        # number of checkpoints since the last compaction
+        self._pending = 0
+        self._compaction = None
+        self._running = False
+        # thread that writes the files (created when first needed)
+        self._writer = None
+        # the most recently submitted write
+        self._last_write = None
+
+    def _write(self, func, *args):
+        """call func(*args) in the writer thread, logging any errors
+        Returns a concurrent.futures.Future for the call."""
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1)
+        future = self._writer.submit(func, *args)
+        future.add_done_callback(_log_errors)
+        self._last_write = future
+        return future
+
+    def flush(self):
+        """Wait until all the files from previous checkpoints have been
+        written."""
+        if self._last_write is not None:
+            # errors have already been logged
+            try:
+                self._last_write.result()
+            except Exception:
+                pass
+
+    def checkpoint(self):
+        """Save any changes made since the last checkpoint.
+        Returns the number of objects saved.
+        """
+        # the first checkpoint is a full save
+        if self._known is None:
+            self._dirty.start()
+            self._dirty.drain()
+            save_data = self.world.save()
+            self._write(_write_full_save, self.save_name, save_data)
+            self._known = set(save_data["personae"])
+            return len(self._known)
+        changed = self._dirty.drain()
+        if not changed:
+            return 0
+        entry = {"personae": {}, "tree": {}}
+        counts = defaultdict(int)
+        for obj in changed:
+            self._record(obj, entry, counts)
+        self._write(_append_journal, self.save_name, entry)
+        self._pending += 1
+        return len(entry["personae"])
+
+    def _record(self, obj, entry, counts):
+        """add [obj] to journal [entry], along with any children that
+        have never been saved"""
+        symbol = obj.symbol
+        if symbol in entry["tree"]:
+            return
+        children = [child for child in obj.children() if child is not None]
+        entry["tree"][symbol] = [child.symbol for child in children]
+        if isinstance(obj, _GAME_OBJS):
+            entry["personae"][symbol] = symbol_replace(obj.save(), counts)
+        self._known.add(symbol)
+        for child in children:
+            if child.symbol not in self._known:
+                self._record(child, entry, counts)
+
+    def compact(self):
+        """Merge the journal into the world file in the writer thread.
+        Returns an asyncio Future for the compaction, or None if a
+        compaction is already running.
+        """
+        if self._compaction is not None and not self._compaction.done():
+            return None
+        self._pending = 0
+        self._compaction = asyncio.wrap_future(
+            self._write(_compact_current, self.save_name)
+        )
+        return self._compaction
+
+    async def run(self):
+        """Take a checkpoint every [self.interval] seconds until stop()
+        is called."""
+        self._running = True
+        self.checkpoint()
+        while self._running:
+            await asyncio.sleep(self.interval)
+            if not self._running:
+                break
+            # log any errors, so that the game keeps running
+            try:
+                self.checkpoint()
+                if self._pending >= self.compact_every:
+                    self.compact()
+            except Exception:
+                logging.error(traceback.format_exc())
+
+    def stop(self):
+        """Stop the autosave, taking one final checkpoint."""
+        self._running = False
+        if self._known is not None:
+            self.checkpoint()
+        self._dirty.stop()
+        self.flush()
+
+
+# these functions are run in Autosave's writer thread
+def _log_errors(future):
+    if not future.cancelled() and future.exception() is not None:
+        error = future.exception()
+        logging.error("".join(traceback.format_exception(
+            type(error), error, error.__traceback__)))
+
+
+def _write_full_save(save_name, save_data):
+    """write [save_data] to [save_name], discarding any journals"""
+    write_worldfile(save_name, save_data)
+    # any journals from before are now obsolete
+    for name in journal_names(save_name):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def _append_journal(save_name, entry):
+    """append [entry] to the journal for [save_name]"""
+    journal = journal_names(save_name)[1]
+    with open(journal, "a") as journal_file:
+        journal_file.write(yaml.dump(entry, default_flow_style=False,
+                                     explicit_start=True))
+
+
+def _compact_current(save_name):
+    """merge the current journal into the world file"""
+    old_journal, journal = journal_names(save_name)
+    # if an old journal is still around, we merge that as well
+    if not os.path.exists(old_journal) and os.path.exists(journal):
+        os.replace(journal, old_journal)
+    compact_journal(save_name, [old_journal])
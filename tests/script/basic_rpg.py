@@ -10,6 +10,7 @@ class Humanoid(Character):
     '''Testing class that provides some basic traits'''
     max_health = 100
     heal_rate = 500
+    update_interval = 1
 
     equip_slots = ["Head", "Right Hand", "Left Hand"]
 
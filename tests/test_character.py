@@ -1,10 +1,12 @@
 """module testing the Character class"""
+import gc
 import unittest
 from swampymud import item
 import swampymud.character as char
 from swampymud.character import Command
 import swampymud.location as loc
 import swampymud.inventory as inv
+import swampymud.entity as entity
 
 
 def qlist(q):
@@ -17,8 +19,8 @@ def qlist(q):
         l.append(q.get_nowait())
 
     # now put the messages back (since we popped them out)
-    for i in l[::-1]:
-        q.put_nowait(item)
+    for msg in l:
+        q.put_nowait(msg)
 
     return l
 
@@ -380,6 +382,28 @@ class TestFilter(unittest.TestCase):
         self.assertEqual(set(blacklist._include_chars), {self.vloobuk})
         self.assertEqual(set(blacklist._exclude_chars), {self.bloog})
 
+    def test_class_cache(self):
+        """class-level results should be cached until the classes change"""
+        whitelist = char.Filter(mode="whitelist", classes=[Soldier])
+        self.assertTrue(whitelist.permits(Commander))
+        self.assertFalse(whitelist.permits(Bureaucrat))
+        self.assertEqual(whitelist._class_cache,
+                         {Commander: True, Bureaucrat: False})
+        # characters use the cached class result
+        self.assertTrue(whitelist.permits(self.dwight))
+        self.assertFalse(whitelist.permits(self.bill))
+        # excluding a character should not affect the cache
+        whitelist.exclude(self.dwight)
+        self.assertFalse(whitelist.permits(self.dwight))
+        self.assertTrue(whitelist.permits(Commander))
+        # changing the classes should clear the cache
+        whitelist.include(Bureaucrat)
+        self.assertEqual(whitelist._class_cache, {})
+        self.assertTrue(whitelist.permits(self.bill))
+        whitelist.exclude(Soldier)
+        self.assertTrue(whitelist.permits(Commander))
+        self.assertFalse(whitelist.permits(self.chad))
+
 
 # some test locations
 TEST_ROOM = loc.Location("Room", "This is just a room for testing.")
@@ -710,6 +734,37 @@ class TestCommandInheritance(unittest.TestCase):
         self.assertEqual(self.scout.cmd_dict["call"].help_entry(),
                          "call [from Soldier Abilities]:\ncall to a friend")
 
+    def test_cmd_table(self):
+        """test that command tables are shared by each class, and that
+        changes to Filters apply to existing characters"""
+        self.assertIs(Soldier.command_table(), Soldier.command_table())
+        # class commands are bound when they are looked up
+        self.assertEqual(self.soldier.cmd_dict["call"],
+                         Soldier.call.specify(self.soldier))
+        self.assertEqual(self.soldier.call, self.soldier.cmd_dict["call"])
+
+        class Medic(Human):
+            @Command.with_traits(filter=char.Filter("whitelist"))
+            def heal(self, args):
+                """heal an ally"""
+                self.message("You heal an ally")
+        medic = Medic("jim")
+        other_medic = Medic("bob")
+        self.assertFalse("heal" in medic.cmd_dict)
+        # include a specific character
+        Medic.heal.filter.include(medic)
+        self.assertTrue("heal" in medic.cmd_dict)
+        self.assertFalse("heal" in other_medic.cmd_dict)
+        self.assertEqual(list(medic.cmd_dict)[-1], "heal")
+        medic.command("heal")
+        self.assertEqual(medic.msgs.pop(), "You heal an ally")
+        # include the whole class
+        Medic.heal.filter.include(Medic)
+        self.assertTrue("heal" in other_medic.cmd_dict)
+        Medic.heal.filter.exclude(medic)
+        self.assertFalse("heal" in medic.cmd_dict)
+        self.assertTrue("heal" in other_medic.cmd_dict)
+
 
 class TestDefaultCommands(unittest.TestCase):
     """test that all the default Character commands work properly"""
@@ -736,7 +791,7 @@ class TestDefaultCommands(unittest.TestCase):
         self.phil.command("help")
         self.assertEqual(self.phil.msgs.get_nowait(),
                          "---Default Commands---\n"
-                         "help look say go equip unequip pickup drop inv use")
+                         "help look say go travel equip unequip pickup drop inv use")
 
         # using help with other commands should produce their docstring
         self.phil.command("help help")
@@ -759,6 +814,64 @@ class TestDefaultCommands(unittest.TestCase):
         help_msg = self.phil.msgs.get_nowait()
         self.assertEqual(help_msg, "Command 'invalid_cmd' not recognized.")
 
+    def test_help_cache(self):
+        """test that help menus are cached and updated properly"""
+        class Lantern(item.Equippable):
+            target = inv.EquipTarget("Right Hand")
+
+            @Command
+            def shine(self, char, args):
+                """Shine the lantern."""
+
+        class Shopkeeper(entity.Entity):
+            @Command
+            def buy(self, char, args):
+                """Buy something."""
+
+        default_menu = ("---Default Commands---\n"
+                        "help look say go travel equip unequip pickup drop inv use")
+        # characters of the same class share a menu
+        gil = char.Character("Gil")
+        gil.set_location(TEST_ROOM)
+        self.assertEqual(self.phil.help_menu(), default_menu)
+        self.assertIs(self.phil.help_menu(), gil.help_menu())
+        # entity commands appear for everyone in the location
+        shopkeeper = Shopkeeper()
+        shopkeeper.set_location(TEST_ROOM)
+        self.assertEqual(self.phil.help_menu(),
+                         "---Equipped---\nbuy\n" + default_menu)
+        self.assertIs(self.phil.help_menu(), gil.help_menu())
+        self.assertEqual(self.dana.help_menu(), default_menu)
+        shopkeeper.despawn()
+        self.assertEqual(self.phil.help_menu(), default_menu)
+        # equipped items only affect one character
+        self.phil.equip_dict = inv.EquipTarget.make_dict("Right Hand")
+        self.phil.equip(Lantern(), from_inv=False)
+        self.assertEqual(self.phil.help_menu(),
+                         "---Equipped---\nshine\n" + default_menu)
+        self.assertEqual(gil.help_menu(), default_menu)
+        self.phil.unequip(inv.EquipTarget("Right Hand"))
+        self.assertEqual(self.phil.help_menu(), default_menu)
+        # moving changes the menu
+        self.phil.set_location(TEST_OUT)
+        shopkeeper.set_location(TEST_OUT)
+        self.assertEqual(self.phil.help_menu(),
+                         "---Equipped---\nbuy\n" + default_menu)
+        self.assertEqual(gil.help_menu(), default_menu)
+        shopkeeper.despawn()
+        # the shared menus do not keep locations alive
+        closet = loc.Location("Closet", "A tiny closet.")
+        gil.set_location(closet)
+        gil.help_menu()
+        self.assertIn(closet, char.Character._help_menus)
+        gil.set_location(TEST_ROOM)
+        del closet
+        gc.collect()
+        self.assertEqual(len([location for location
+                              in char.Character._help_menus
+                              if location.name == "Closet"]), 0)
+        gil.despawn()
+
     def test_say(self):
         """test that the say command works properly"""
         # test with a simple message
@@ -1109,7 +1222,7 @@ class TestSpawn(unittest.TestCase):
         self.new_player.spawn(TEST_ROOM)
         # new player should not be moved yet
         self.assertEqual(self.new_player.location, TEST_ROOM)
-        self.assertEqual(TEST_ROOM.characters, [self.bill])
+        self.assertEqual(list(TEST_ROOM.characters), [self.bill])
         self.assertEqual(self.new_player.msgs, [
             "Welcome to our SwampyMud! You are a Human",
             "What should we call you?"
@@ -1133,7 +1246,8 @@ class TestSpawn(unittest.TestCase):
         self.assertEqual(self.new_player.msgs, [])
 
         # player should be added to location
-        self.assertEqual(TEST_ROOM.characters, [self.bill, self.new_player])
+        self.assertEqual(list(TEST_ROOM.characters),
+                         [self.bill, self.new_player])
 
         self.assertEqual(self.bill.msgs, [])
         self.assertEqual(self.new_player.msgs, [])
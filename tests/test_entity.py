@@ -128,6 +128,60 @@ class TestEntityMeta(unittest.TestCase):
              "greet" : self.BrokenRobot.broken_greet},
         ])
 
+    def test_entity_cmds(self):
+        """test that characters can use the commands of entities in
+        their location"""
+        self.assertFalse("greet" in self.dave.cmd_dict)
+        self.dave.set_location(self.bmo_room)
+        self.assertTrue("greet" in self.dave.cmd_dict)
+        self.assertEqual(self.dave.cmd_dict["greet"],
+                         self.NiceRobot.greet.specify(self.bmo, self.dave))
+        self.assertEqual(list(self.dave.cmd_dict)[-2:], ["greet", "smile"])
+        # commands are shared by all characters of the same class
+        self.assertIs(self.bmo_room.command_table(self.DefaultCharacter),
+                      self.bmo_room.command_table(self.DefaultCharacter))
+        # a more recent entity shadows the older one
+        broken = self.BrokenRobot()
+        broken.set_location(self.bmo_room)
+        self.assertEqual(self.dave.cmd_dict["greet"],
+                         self.BrokenRobot.broken_greet.specify(broken,
+                                                               self.dave))
+        self.assertEqual(self.dave.cmd_dict["smile"],
+                         self.NiceRobot.smile.specify(broken, self.dave))
+        broken.despawn()
+        self.assertEqual(self.dave.cmd_dict["greet"],
+                         self.NiceRobot.greet.specify(self.bmo, self.dave))
+        # entity leaves the room
+        self.bmo.set_location(self.ship)
+        self.assertFalse("greet" in self.dave.cmd_dict)
+        # character leaves the room
+        self.bmo.set_location(self.bmo_room)
+        self.assertTrue("greet" in self.dave.cmd_dict)
+        self.dave.set_location(self.room)
+        self.assertFalse("greet" in self.dave.cmd_dict)
+
+    def test_cmd_precedence(self):
+        """test that commands pushed onto a cmd_dict (e.g. by equipped
+        items) shadow entity commands, even newer ones"""
+        self.dave.set_location(self.bmo_room)
+        equipped = self.BrokenRobot.broken_greet.specify(self.bmo, self.dave)
+        self.dave.cmd_dict.push("greet", equipped)
+        self.assertEqual(self.dave.cmd_dict["greet"], equipped)
+        broken = self.BrokenRobot()
+        broken.set_location(self.bmo_room)
+        self.assertEqual(self.dave.cmd_dict["greet"], equipped)
+        broken.despawn()
+
+    def test_deprecated_cmds(self):
+        """test that add_cmds / remove_cmds still work, with a warning"""
+        with self.assertWarns(DeprecationWarning):
+            self.bmo.add_cmds(self.dave)
+        self.assertEqual(self.dave.cmd_dict["greet"],
+                         self.NiceRobot.greet.specify(self.bmo, self.dave))
+        with self.assertWarns(DeprecationWarning):
+            self.bmo.remove_cmds(self.dave)
+        self.assertFalse("greet" in self.dave.cmd_dict)
+
     def test_on_enter(self):
         """test the Entity.on_enter trigger"""
         self.dave.set_location(self.bmo_room)
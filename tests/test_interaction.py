@@ -163,3 +163,9 @@ class TestInteraction(unittest.TestCase):
                          f"You hit {seller} with a fireball.")
         self.assertEqual(seller.msgs.get_nowait(),
                          f"{wizard} hit you with a fireball.")
+        # unequipping should remove the commands again
+        brute.command("unequip fire staff")
+        wizard.command("unequip fire staff")
+        self.assertTrue("hit" not in brute.cmd_dict)
+        self.assertTrue("fireball" not in wizard.cmd_dict)
+        self.assertEqual(brute.inv, inv_with_staff)
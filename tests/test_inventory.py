@@ -89,6 +89,26 @@ class TestItemStack(unittest.TestCase):
         self.rare_stack = inv.ItemStack.from_item(self.rare_sword, 1)
         self.sword_stack = inv.ItemStack.from_item(self.iron_sword, 3)
 
+    def test_stack_key(self):
+        """test that stack keys agree with data equality"""
+        self.assertEqual(inv.stack_key(Sword, {"dmg": 15, "mat": "steel"}),
+                         inv.stack_key(Sword, {"mat": "steel", "dmg": 15}))
+        self.assertNotEqual(inv.stack_key(Sword, {"dmg": 15}),
+                            inv.stack_key(Sword, {"dmg": 16}))
+        self.assertNotEqual(inv.stack_key(Sword, {"dmg": 15}),
+                            inv.stack_key(HealthPotion, {"dmg": 15}))
+        # None and {} are equivalent
+        self.assertEqual(inv.stack_key(SilverCoin, None),
+                         inv.stack_key(SilverCoin, {}))
+        # nested data should be supported
+        data = {"runes": ["fire", "ice"], "stats": {"str": 1}}
+        self.assertEqual(hash(inv.stack_key(Sword, data)),
+                         hash(inv.stack_key(Sword, {
+                             "stats": {"str": 1}, "runes": ["fire", "ice"]
+                         })))
+        self.assertNotEqual(inv.stack_key(Sword, {"runes": ["fire", "ice"]}),
+                            inv.stack_key(Sword, {"runes": ["ice", "fire"]}))
+
     def test_matching_subset(self):
         """test the the matching_subset function works correctly"""
         main = {"a": 3, "b": 4, "c": 10}
@@ -381,10 +401,11 @@ class TestInventory(unittest.TestCase):
         # check that the 'Health Potion' bucket is correct
         bucket = coin_inv._items["health potion"]
         self.assertEqual(len(bucket), 4)
-        self.assertTrue(inv.ItemStack(HealthPotion, 7, {"hp":3}) in bucket)
-        self.assertTrue(inv.ItemStack(HealthPotion, 5, {"hp":10}) in bucket)
-        self.assertTrue(inv.ItemStack(HealthPotion, 3, {"hp":50}) in bucket)
-        self.assertTrue(inv.ItemStack(HealthPotion, 2, {"hp":100}) in bucket)
+        stacks = list(bucket.values())
+        self.assertTrue(inv.ItemStack(HealthPotion, 7, {"hp":3}) in stacks)
+        self.assertTrue(inv.ItemStack(HealthPotion, 5, {"hp":10}) in stacks)
+        self.assertTrue(inv.ItemStack(HealthPotion, 3, {"hp":50}) in stacks)
+        self.assertTrue(inv.ItemStack(HealthPotion, 2, {"hp":100}) in stacks)
         #TODO: add some tests with the sword
 
     def test_remove_item(self):
@@ -464,6 +485,70 @@ this function is inefficient and fragile, do not use outside simple testing"""
         cloned_inv = inv.Inventory(*inv_items)
         self.assertEqual(self.rich, cloned_inv)
 
+    def test_counts(self):
+        """test the running totals of stacks and items"""
+        self.assertFalse(self.empty)
+        self.assertEqual((self.empty.stack_count, self.empty.item_count),
+                         (0, 0))
+        self.assertEqual(self.empty.count("silver coin"), 0)
+        self.assertTrue(self.potion_seller)
+        self.assertEqual(self.potion_seller.stack_count, 5)
+        self.assertEqual(self.potion_seller.item_count, 37)
+        self.assertEqual(self.potion_seller.count("Health Potion"), 17)
+        self.assertEqual(self.potion_seller.count("health potion",
+                                                  stacks=True), 4)
+        self.assertEqual(self.potion_seller.count(item_type=SilverCoin), 20)
+        self.assertEqual(self.potion_seller.count("health potion",
+                                                  item_type=SilverCoin), 0)
+        self.assertEqual(self.potion_seller.count("health potion",
+                                                  HealthPotion, True), 4)
+        # totals should follow additions / removals
+        self.potion_seller.add_item(HealthPotion(3), 3)
+        self.potion_seller.add_item(HealthPotion(1))
+        self.assertEqual(self.potion_seller.count(item_type=HealthPotion),
+                         21)
+        self.assertEqual(self.potion_seller.stack_count, 6)
+        self.potion_seller.remove_item(SilverCoin(), 20)
+        self.assertEqual(self.potion_seller.count(item_type=SilverCoin), 0)
+        self.assertEqual(self.potion_seller.stack_count, 5)
+        self.assertEqual(self.potion_seller.item_count, 21)
+        # failed removals should not change anything
+        with self.assertRaises(ValueError):
+            self.potion_seller.remove_item(HealthPotion(1), 2)
+        self.assertEqual(self.potion_seller.item_count, 21)
+        self.assertEqual(self.potion_seller._type_totals,
+                         {HealthPotion: [5, 21]})
+
+    def test_views(self):
+        """test that views provide stack info without creating items"""
+        self.assertEqual(list(self.empty.views()), [])
+        view, = self.coins.views()
+        self.assertEqual((view.name, view.type, view.amount),
+                         ("Silver Coin", SilverCoin, 10))
+        self.assertEqual(dict(view.data), {})
+        self.assertTrue(isinstance(view.item(), SilverCoin))
+        loads = []
+        class CountedPotion(HealthPotion):
+            @classmethod
+            def load(cls, data):
+                loads.append(data)
+                return super().load(data)
+        potions = inv.Inventory((CountedPotion(10), 3), (CountedPotion(5), 1))
+        views = sorted(potions.views(), key=lambda v: v.amount)
+        self.assertEqual([(v.name, v.amount, dict(v.data)) for v in views],
+                         [("Counted Potion", 1, {"hp": 5}),
+                          ("Counted Potion", 3, {"hp": 10})])
+        # data should not be modifiable through the view
+        with self.assertRaises(TypeError):
+            views[0].data["hp"] = 1000
+        self.assertTrue(potions)
+        self.assertEqual(potions.readable(),
+                         "Counted Potion: 3\nCounted Potion: 1")
+        # none of the above should have created any items
+        self.assertEqual(loads, [])
+        self.assertEqual(views[1].item().hp, 10)
+        self.assertEqual(loads, [{"hp": 10}])
+
     def test_stack_iter(self):
         self.assertEqual(list(self.coins.stacks()),
                          [inv.ItemStack(SilverCoin, 10)])
@@ -1,4 +1,5 @@
 """testcases for testing the item module"""
+import gc
 import unittest
 import swampymud.item as item
 import swampymud.inventory as inv
@@ -206,3 +207,26 @@ class TestEquippableItem(unittest.TestCase):
         # make sure we're dealing with a different swing
         self.assertNotEqual(Mace._commands["swing"],
                             Sword._commands["swing"])
+
+    def test_cmd_tokens(self):
+        """test that the commands added by an Equippable are tracked
+        per character, and do not outlive the character"""
+        class Sword(item.Equippable):
+            target = inv.EquipTarget("right")
+
+            @char.Command
+            def swing(self, char, args):
+                pass
+
+        sword = Sword()
+        bill, bob = char.Character("Bill"), char.Character("Bob")
+        sword.add_cmds(bill)
+        sword.add_cmds(bob)
+        self.assertIn("swing", bill.cmd_dict)
+        sword.remove_cmds(bill)
+        self.assertNotIn("swing", bill.cmd_dict)
+        self.assertIn("swing", bob.cmd_dict)
+        # the tokens for a character are discarded along with it
+        del bob
+        gc.collect()
+        self.assertEqual(len(sword._cmd_tokens), 0)
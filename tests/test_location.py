@@ -49,4 +49,95 @@ class TestLocationExits(unittest.TestCase):
     def test_add_redundant(self):
         self.normal_world.add_exit(self.magic_portal)
         with self.assertRaisesRegex(AssertionError, ".*already has exit with name 'portal'"):
-            self.normal_world.add_exit(self.redundant_portal)
\ No newline at end of file
+            self.normal_world.add_exit(self.redundant_portal)
+
+class TestLocationIndex(unittest.TestCase):
+
+    def setUp(self):
+        from swampymud.character import Character
+        self.room = loc.Location("Hub", "A busy hub.")
+        self.portal = loc.Exit(self.room, "portal",
+                               other_names=["Magic Portal"])
+        self.room.add_exit(self.portal)
+        self.bill = Character("Bill")
+        self.Bill = Character("bill")
+        self.room.add_char(self.bill)
+        self.room.add_char(self.Bill)
+
+    def test_lookup(self):
+        self.assertEqual(self.room.lookup("BILL"), [self.bill, self.Bill])
+        self.assertEqual(self.room.lookup("magic portal"), [self.portal])
+        self.assertEqual(self.room.lookup("nobody"), [])
+
+    def test_find(self):
+        self.assertIs(self.room.find("bill"), self.Bill)
+        self.assertIs(self.room.find("Bill"), self.bill)
+        self.assertIs(self.room.find("portal"), self.portal)
+        self.assertIsNone(self.room.find("BILL"))
+        self.assertIs(self.room.find_exit("Magic Portal"), self.portal)
+        self.assertIsNone(self.room.find_exit("magic portal"))
+
+    def test_remove(self):
+        self.room.remove_char(self.bill)
+        self.assertEqual(list(self.room.characters), [self.Bill])
+        self.assertEqual(self.room.lookup("bill"), [self.Bill])
+        self.room.remove_char(self.Bill)
+        self.assertEqual(self.room.lookup("bill"), [])
+        with self.assertRaises(KeyError):
+            self.room.remove_char(self.Bill)
+
+
+class TestLocationView(unittest.TestCase):
+
+    def setUp(self):
+        from swampymud.character import Character, Filter
+        from swampymud.entity import Entity
+        from swampymud.item import Item
+        self.Character = Character
+        self.Filter = Filter
+        self.Entity = Entity
+        self.Item = Item
+        self.room = loc.Location("Hub", "A busy hub.")
+        self.bill = Character("Bill")
+        self.room.add_char(self.bill)
+
+    def test_view(self):
+        self.assertEqual(self.room.view(), "Hub\nA busy hub.\nYou see Bill the Default Character")
+        self.assertEqual(self.room.view(self.bill), "Hub\nA busy hub.\nYou see ")
+        self.room.add_exit(loc.Exit(self.room, "loop"))
+        self.room.add_entity(self.Entity())
+        self.room.inv.add_item(self.Item())
+        self.assertEqual(self.room.view(self.bill),
+                         "Hub\nA busy hub.\nExits:\nloop -> Hub\n"
+                         "You see \nYou also see Entity\n"
+                         "Items available:\nItem: 1")
+
+    def test_invalidate(self):
+        view = self.room.view()
+        # characters are viewed afresh each time
+        self.bill._name = "William"
+        self.assertIn("William the Default Character", self.room.view())
+        self.bill._name = "Bill"
+        bob = self.Character("Bob")
+        self.room.add_char(bob)
+        self.assertIn("Bob the Default Character", self.room.view())
+        self.assertEqual(self.room.view(bob),
+                         "Hub\nA busy hub.\nYou see Bill the Default Character")
+        self.room.remove_char(bob)
+        self.assertEqual(self.room.view(), view)
+        item = self.Item()
+        self.room.inv.add_item(item)
+        self.assertIn("Items available", self.room.view())
+        self.room.inv.remove_item(item)
+        self.assertEqual(self.room.view(), view)
+
+    def test_exit_perceive(self):
+        hidden = loc.Exit(self.room, "secret",
+                          perceive=self.Filter("whitelist"))
+        self.room.add_exit(hidden)
+        self.assertNotIn("secret", self.room.view(self.bill))
+        self.assertIn("secret", self.room.view())
+        hidden.perceive.include(self.bill)
+        self.assertIn("secret", self.room.view(self.bill))
+        bob = self.Character("Bob")
+        self.assertNotIn("secret", self.room.view(bob))
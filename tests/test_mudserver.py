@@ -0,0 +1,486 @@
+"""testcases for the MudServer class"""
+import asyncio
+import time
+import unittest
+import zlib
+from types import SimpleNamespace
+from websockets.exceptions import ConnectionClosed
+from swampymud import telnet
+from swampymud.mudserver import MudServer, pack_envelope, unpack_envelope
+from swampymud.telnet import TelnetSession
+from swampymud.character import Character
+from swampymud.location import Location
+from swampymud.util.msgqueue import MessageQueue, OverflowPolicy
+from swampymud.util.ratelimit import TokenBucket, FloodAction
+
+
+class FakeWriter:
+    """stand-in for an asyncio.StreamWriter that records writes
+    [max_writes]: after this many writes, drain() reports a disconnect
+    """
+    def __init__(self, max_writes=1):
+        self.writes = []
+        self.max_writes = max_writes
+        self.closed = False
+
+    def write(self, data):
+        self.writes.append(data)
+
+    async def drain(self):
+        if len(self.writes) >= self.max_writes:
+            raise ConnectionResetError()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeReader:
+    """stand-in for an asyncio.StreamReader that returns [chunks]"""
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def at_eof(self):
+        return not self.chunks
+
+    async def read(self, n):
+        return self.chunks.pop(0)
+
+
+class FakeWebSocket:
+    """stand-in for a WebSocket connection that records frames
+    [max_frames]: once this many frames are sent, report a disconnect
+    """
+    def __init__(self, max_frames=1):
+        self.frames = []
+        self.max_frames = max_frames
+        self.closed = False
+
+    async def send(self, frame):
+        self.frames.append(frame)
+        if len(self.frames) >= self.max_frames:
+            raise ConnectionClosed(None, None)
+
+
+class FakeIncomingWebSocket:
+    """stand-in for a WebSocket connection that receives [frames]"""
+    def __init__(self, frames):
+        self.frames = frames
+
+    async def __aiter__(self):
+        for frame in self.frames:
+            yield frame
+
+
+class TestOutgoingTcp(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MudServer(None, tcp_port=17718)
+        self.char = Character("bill")
+        self.server.players[0] = self.char
+
+    def test_coalesce(self):
+        """test that all queued messages are sent in one write"""
+        for msg in ("one", "two", "three"):
+            self.char.message(msg)
+        writer = FakeWriter()
+        asyncio.run(self.server._outgoing_tcp(0, writer))
+        self.assertEqual(writer.writes, [b"one\n\rtwo\n\rthree\n\r"])
+        self.assertTrue(self.char.msgs.empty())
+
+    def test_flush_cap(self):
+        """test that writes are split to respect tcp_flush_bytes"""
+        self.server.tcp_flush_bytes = 10
+        for msg in ("one", "two", "three", "a message that is too long"):
+            self.char.message(msg)
+        writer = FakeWriter(max_writes=3)
+        asyncio.run(self.server._outgoing_tcp(0, writer))
+        self.assertEqual(writer.writes, [
+            b"one\n\rtwo\n\r",
+            b"three\n\r",
+            b"a message that is too long\n\r"
+        ])
+
+    def test_plain_queue(self):
+        """test that characters may use a plain asyncio.Queue"""
+        self.char.msgs = asyncio.Queue()
+        for msg in ("one", "two"):
+            self.char.message(msg)
+        writer = FakeWriter()
+        asyncio.run(self.server._outgoing_tcp(0, writer))
+        self.assertEqual(writer.writes, [b"one\n\rtwo\n\r"])
+
+    def test_closed_mid_batch(self):
+        """test that batching stops if the queue is closed"""
+        msgs = self.char.msgs
+        msgs.put_nowait("one")
+        get_nowait = msgs.get_nowait
+
+        def overflow_and_get():
+            # the queue overflows after the first message is taken,
+            # while the write is being batched
+            if msgs.empty():
+                msgs.policy = OverflowPolicy.DISCONNECT
+                msgs.max_msgs = 0
+                msgs.put_nowait("two")
+            return get_nowait()
+        msgs.get_nowait = overflow_and_get
+        writer = FakeWriter(max_writes=2)
+        asyncio.run(self.server._outgoing_tcp(0, writer))
+        self.assertEqual(writer.writes, [b"one\n\r"])
+
+    def test_compressed(self):
+        """test that output is compressed once MCCP2 is negotiated"""
+        session = TelnetSession()
+        session.start()
+        session.feed(bytes((telnet.IAC, telnet.DO, telnet.MCCP2)))
+        start = session.data_to_send()
+        self.server._telnet[0] = session
+        for msg in ("one", "two"):
+            self.char.message(msg)
+        writer = FakeWriter()
+        asyncio.run(self.server._outgoing_tcp(0, writer))
+        self.assertEqual(zlib.decompressobj().decompress(start[5:] +
+                                                         writer.writes[0]),
+                         b"one\n\rtwo\n\r")
+
+
+class TestOutgoingWs(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MudServer(None, ws_port=17719)
+        self.char = Character("bill")
+        self.server.players[0] = self.char
+
+    def test_unbatched(self):
+        """test that each message gets its own frame by default"""
+        for msg in ("one", "two"):
+            self.char.message(msg)
+        websocket = FakeWebSocket(max_frames=2)
+        asyncio.run(self.server._outgoing_ws(0, websocket))
+        self.assertEqual(websocket.frames, ["one\n\r", "two\n\r"])
+
+    def test_plain_queue(self):
+        """test that characters may use a plain asyncio.Queue"""
+        self.char.msgs = asyncio.Queue()
+        self.char.message("one")
+        websocket = FakeWebSocket(max_frames=1)
+        asyncio.run(self.server._outgoing_ws(0, websocket))
+        self.assertEqual(websocket.frames, ["one\n\r"])
+
+    def test_batched(self):
+        """test that messages sent within the flush window are packed
+        into one frame, up to ws_max_frame"""
+        self.server.ws_batch_latency = 5
+        self.server.ws_max_frame = 10
+        websocket = FakeWebSocket(max_frames=2)
+
+        async def run():
+            self.char.message("one")
+            task = asyncio.ensure_future(
+                self.server._outgoing_ws(0, websocket)
+            )
+            # these messages arrive during the flush window
+            await asyncio.sleep(0)
+            self.char.message("two")
+            self.char.message("three")
+            await task
+        asyncio.run(run())
+        self.assertEqual(websocket.frames, ["one\n\rtwo\n\r", "three\n\r"])
+
+    def test_overflow_disconnect(self):
+        """test that the client is dropped when its queue is closed"""
+        self.char.msgs = MessageQueue(max_msgs=2,
+                                      policy=OverflowPolicy.DISCONNECT)
+        for msg in ("one", "two", "three"):
+            self.char.message(msg)
+        websocket = FakeWebSocket(max_frames=100)
+        asyncio.run(self.server._outgoing_ws(0, websocket))
+        self.assertEqual(websocket.frames, [])
+        self.assertEqual(self.char.msgs.stats[OverflowPolicy.DISCONNECT], 1)
+
+    def test_binary(self):
+        """test that binary mode packs messages into an envelope"""
+        self.server.ws_binary = True
+        self.server.ws_batch_latency = 5
+        for msg in ("one", "twö"):
+            self.char.message(msg)
+        websocket = FakeWebSocket(max_frames=1)
+        asyncio.run(self.server._outgoing_ws(0, websocket))
+        self.assertEqual(websocket.frames, [b"\x01\x03one\x04tw\xc3\xb6"])
+
+    def test_incoming_binary(self):
+        """test that binary frames are unpacked in binary mode"""
+        server = RecordingServer(None, ws_port=17725)
+        # by default, binary frames are plain UTF-8
+        websocket = FakeIncomingWebSocket(["look", "sáy hi".encode()])
+        asyncio.run(server._incoming_ws(0, websocket))
+        self.assertEqual(server.events, [(0, "look"), (0, "sáy hi")])
+        server.events.clear()
+        server.ws_binary = True
+        websocket = FakeIncomingWebSocket([
+            pack_envelope(["go north", " ", "inv"]), b"\x02malformed",
+            "look",
+        ])
+        asyncio.run(server._incoming_ws(0, websocket))
+        self.assertEqual(server.events, [(0, "go north"), (0, "inv"),
+                                         (0, "look")])
+
+    def test_envelope(self):
+        """test that envelopes can be packed and unpacked"""
+        msgs = ["", "short", "x" * 300, "snow \u2603"]
+        packed = pack_envelope(msgs)
+        self.assertEqual(packed[8:10], b"\xac\x02")
+        self.assertEqual(unpack_envelope(packed), msgs)
+        with self.assertRaises(ValueError):
+            unpack_envelope(packed[:-1])
+        with self.assertRaises(ValueError):
+            unpack_envelope(b"\x02")
+
+    def test_options(self):
+        """test the keyword arguments for websockets.serve"""
+        options = self.server.ws_options()
+        self.assertEqual(options, {"max_size": 2 ** 20, "max_queue": 32,
+                                   "write_limit": 2 ** 16})
+        self.server.ws_window_bits = 10
+        self.server.ws_mem_level = 4
+        options = self.server.ws_options()
+        self.assertIsNone(options["compression"])
+        factory, = options["extensions"]
+        self.assertEqual(factory.server_max_window_bits, 10)
+        self.assertEqual(factory.compress_settings, {"memLevel": 4})
+        self.server.ws_compression = False
+        self.assertNotIn("extensions", self.server.ws_options())
+
+
+class Ticker(Character):
+    """character that counts its updates"""
+    update_interval = 0.2
+
+    def __init__(self, name=None):
+        super().__init__(name)
+        self.updates = 0
+
+    def update(self):
+        self.updates += 1
+
+
+class TestTick(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MudServer(None, tcp_port=17720)
+
+    def test_schedule_updates(self):
+        ticker = Ticker("tim")
+        idle = Character("ida")
+        self.server.schedule_updates(ticker)
+        # Characters with no update_interval are not scheduled
+        self.server.schedule_updates(idle)
+        self.assertFalse(idle in self.server.scheduler)
+        # at 10 ticks per second, ticker is updated every 2 ticks
+        for _ in range(6):
+            self.server.tick()
+        self.assertEqual(ticker.updates, 3)
+        self.server.scheduler.cancel(ticker)
+        self.server.tick()
+        self.server.tick()
+        self.assertEqual(ticker.updates, 3)
+
+    def test_schedule_world(self):
+        """test that characters already in the world are scheduled"""
+        room = Location("Room", "An empty room.")
+        ticker = Ticker("tim")
+        idle = Character("ida")
+        ticker.set_location(room)
+        idle.set_location(room)
+        self.server.world = SimpleNamespace(locations={"room": room})
+        self.server.schedule_world()
+        self.assertIn(ticker, self.server.scheduler)
+        self.assertNotIn(idle, self.server.scheduler)
+        for _ in range(4):
+            self.server.tick()
+        self.assertEqual(ticker.updates, 2)
+
+
+class SlowServer(MudServer):
+    """MudServer whose first [slow] ticks take 3 times their budget,
+    and which stops after [count] ticks"""
+    def __init__(self, *args, slow=2, count=6, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slow = slow
+        self.count = count
+        self.times = []
+
+    def tick(self):
+        self.times.append(time.monotonic())
+        super().tick()
+        if len(self.times) <= self.slow:
+            time.sleep(3 / self.tick_rate)
+        if len(self.times) >= self.count:
+            self._running = False
+
+
+class TestTickLoop(unittest.TestCase):
+
+    def test_overruns(self):
+        """test that slow ticks are counted, and that the loop returns
+        to its usual rate afterwards, without bursting to catch up"""
+        server = SlowServer(None, tcp_port=17724)
+        server.tick_rate = 50
+        server._running = True
+        asyncio.run(server._tick_loop())
+        self.assertEqual(server.tick_overruns, 2)
+        self.assertEqual(server.scheduler.ticks, 6)
+        gaps = [b - a for a, b in zip(server.times, server.times[1:])]
+        budget = 1 / server.tick_rate
+        # the slow ticks delay the ticks after them
+        for gap in gaps[:2]:
+            self.assertGreaterEqual(gap, 3 * budget)
+        # but the later ticks are spaced out as usual
+        for gap in gaps[2:]:
+            self.assertGreaterEqual(gap, budget / 2)
+
+
+class RecordingServer(MudServer):
+    """MudServer that records the player events it handles"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.events = []
+
+    def on_player_msg(self, pid, msg):
+        self.events.append((pid, msg))
+
+    def on_player_quit(self, pid):
+        self.events.append((pid, "[quit]"))
+
+
+class TestInbox(unittest.TestCase):
+
+    def setUp(self):
+        self.server = RecordingServer(None, tcp_port=17722)
+
+    def test_immediate(self):
+        """test that events are handled immediately by default"""
+        self.server._receive(0, "look")
+        self.server._disconnected(0)
+        self.assertEqual(self.server.events, [(0, "look"), (0, "[quit]")])
+
+    def test_inbox(self):
+        """test that queued events are handled in order each tick"""
+        self.server.use_inbox = True
+        self.server.inbox_batch = 3
+        self.server._receive(0, "look")
+        self.server._receive(1, "say hi")
+        self.server._receive(0, "go north")
+        self.server._disconnected(0)
+        self.assertEqual(self.server.events, [])
+        self.server.tick()
+        self.assertEqual(self.server.events,
+                         [(0, "look"), (1, "say hi"), (0, "go north")])
+        self.server.tick()
+        self.assertEqual(self.server.events[3:], [(0, "[quit]")])
+        self.assertEqual(len(self.server.inbox), 0)
+
+
+class TestFlood(unittest.TestCase):
+
+    def setUp(self):
+        self.server = RecordingServer(None, tcp_port=17723)
+        self.server.input_rate = 1
+        self.server.input_burst = 2
+        self.server.players[0] = Character("Bill")
+        # stop the clock, so that no tokens are added
+        self.now = 0
+        self.server._buckets[0] = TokenBucket(1, 2, clock=lambda: self.now)
+
+    def send(self, *msgs):
+        for msg in msgs:
+            self.server._receive(0, msg)
+
+    def test_drop(self):
+        self.server.flood_action = FloodAction.DROP
+        self.send("look", "say hi", "go north")
+        self.assertEqual(self.server.events, [(0, "look"), (0, "say hi")])
+        self.assertEqual(self.server.players[0].msgs.get_nowait(),
+                         "You are sending commands too quickly.")
+        self.assertEqual(self.server.flood_stats[FloodAction.DROP], 1)
+
+    def test_delay(self):
+        self.server.max_backlog = 2
+        self.send("look", "say hi", "go north", "go south", "go east")
+        self.assertEqual(self.server.events, [(0, "look"), (0, "say hi")])
+        # the backlog is full, so the last command is dropped
+        self.assertEqual(self.server.players[0].msgs.get_nowait(),
+                         "You have too many commands waiting.")
+        self.assertEqual(self.server.flood_stats[FloodAction.DELAY], 2)
+        self.server.tick()
+        self.assertEqual(len(self.server.events), 2)
+        # delayed commands are released in order as tokens are added
+        self.now = 1
+        self.server.tick()
+        self.assertEqual(self.server.events[2:], [(0, "go north")])
+        # new commands wait behind the delayed ones
+        self.now = 3
+        self.send("inv")
+        self.assertEqual(self.server.events[3:], [])
+        self.server.tick()
+        self.assertEqual(self.server.events[3:],
+                         [(0, "go south"), (0, "inv")])
+        self.assertEqual(self.server._delayed, {})
+
+    def test_kick(self):
+        self.server.flood_action = FloodAction.KICK
+        writer = FakeWriter()
+        self.server._tcp_clients[0] = writer
+        self.send("look", "say hi")
+        self.assertFalse(writer.closed)
+        self.send("go north")
+        self.assertTrue(writer.closed)
+        self.assertEqual(self.server.flood_stats[FloodAction.KICK], 1)
+
+    def test_kick_once(self):
+        """test that a kicked player is only kicked once, and that no
+        more of their commands are handled"""
+        self.server.flood_action = FloodAction.KICK
+        writer = FakeWriter()
+        self.server._tcp_clients[0] = writer
+        self.server._telnet[0] = TelnetSession(compress=False)
+        reader = FakeReader([b"look\nsay hi\ngo north\ninv\nlook\n",
+                             b"say hi again\n"])
+        asyncio.run(self.server._incoming_tcp(0, reader))
+        self.assertTrue(writer.closed)
+        self.assertEqual(self.server.events, [(0, "look"), (0, "say hi")])
+        self.assertEqual(self.server.flood_stats[FloodAction.KICK], 1)
+        # the rest of the data is never read
+        self.assertEqual(reader.chunks, [b"say hi again\n"])
+        self.server._receive(0, "look")
+        self.assertEqual(len(self.server.events), 2)
+
+    def test_kick_inbox(self):
+        """test that kicking a player discards their queued commands"""
+        self.server.flood_action = FloodAction.KICK
+        self.server.use_inbox = True
+        self.server._tcp_clients[0] = FakeWriter()
+        self.send("look", "say hi")
+        self.server._receive(1, "look")
+        self.send("go north")
+        self.server._disconnected(0)
+        self.server.tick()
+        self.assertEqual(self.server.events, [(1, "look"), (0, "[quit]")])
+        self.assertEqual(len(self.server._queued), 0)
+
+    def test_line_length(self):
+        self.server.max_line_length = 8
+        self.send("say hello", None, "look")
+        self.assertEqual(self.server.events, [(0, "look")])
+        self.assertEqual(self.server.flood_stats[FloodAction.DROP], 2)
+
+    def test_inbox_backlog(self):
+        self.server.input_rate = None
+        self.server.use_inbox = True
+        self.server.max_backlog = 2
+        self.send("look", "say hi", "go north")
+        self.server.tick()
+        self.assertEqual(self.server.events, [(0, "look"), (0, "say hi")])
+        self.send("go north")
+        self.server.tick()
+        self.assertEqual(self.server.events[2:], [(0, "go north")])
@@ -0,0 +1,118 @@
+"""module testing the ExitGraph class"""
+import unittest
+import swampymud.character as char
+import swampymud.location as loc
+from swampymud.navigation import ExitGraph
+
+
+class Wizard(char.Character):
+    """a character that can use magic exits"""
+
+
+class TestExitGraph(unittest.TestCase):
+
+    def setUp(self):
+        # hall <-> library -> tower, with a magic shortcut hall -> tower
+        self.hall = loc.Location("Hall", "A long hall.")
+        self.library = loc.Location("Library", "Lots of books.")
+        self.tower = loc.Location("Tower", "A tall tower.")
+        self.cellar = loc.Location("Cellar", "Nobody comes here.")
+        self.to_library = loc.Exit(self.library, "library")
+        self.to_hall = loc.Exit(self.hall, "hall")
+        self.stairs = loc.Exit(self.tower, "stairs")
+        self.portal = loc.Exit(self.tower, "portal",
+                               interact=char.Filter("whitelist", [Wizard]))
+        self.hall.add_exit(self.to_library)
+        self.hall.add_exit(self.portal)
+        self.library.add_exit(self.to_hall)
+        self.library.add_exit(self.stairs)
+        self.graph = ExitGraph([self.hall])
+
+    def test_build(self):
+        # reachable locations are added automatically
+        self.assertEqual(len(self.graph), 3)
+        self.assertIn(self.tower, self.graph)
+        self.assertNotIn(self.cellar, self.graph)
+        self.assertIs(self.tower.graph, self.graph)
+        self.assertEqual(self.graph.locations_named("TOWER"), [self.tower])
+
+    def test_path(self):
+        self.assertEqual(self.graph.path(self.hall, self.tower),
+                         [self.portal])
+        self.assertEqual(self.graph.path(self.hall, self.tower,
+                                         char.Character),
+                         [self.to_library, self.stairs])
+        self.assertEqual(self.graph.path(self.hall, self.tower, Wizard),
+                         [self.portal])
+        self.assertEqual(self.graph.path(self.tower, self.tower), [])
+        self.assertIsNone(self.graph.path(self.tower, self.hall))
+        # unknown locations are added, but cannot be reached
+        self.assertIsNone(self.graph.path(self.hall, self.cellar))
+        self.assertIn(self.cellar, self.graph)
+
+    def test_distance(self):
+        bill = char.Character("Bill")
+        self.assertEqual(self.graph.distance(self.hall, self.tower), 1)
+        self.assertEqual(self.graph.distance(self.hall, self.tower, bill), 2)
+        self.assertIsNone(self.graph.distance(self.tower, self.library))
+        self.assertIs(self.graph.next_exit(self.library, self.hall),
+                      self.to_hall)
+        self.assertIsNone(self.graph.next_exit(self.hall, self.hall))
+
+    def test_invalidate(self):
+        bill = char.Character("Bill")
+        self.assertEqual(self.graph.distance(self.hall, self.tower, bill), 2)
+        # changing a filter discards the cached trees
+        self.portal.interact.include(bill)
+        self.assertEqual(self.graph.distance(self.hall, self.tower, bill), 1)
+        self.assertEqual(self.graph.distance(self.hall, self.tower,
+                                             char.Character("Phil")), 2)
+        # adding an exit rebuilds the graph
+        self.tower.add_exit(loc.Exit(self.cellar, "trapdoor"))
+        self.assertEqual(self.graph.path(self.hall, self.cellar, bill),
+                         [self.portal, self.tower.find_exit("trapdoor")])
+
+    def test_separate_graphs(self):
+        attic = loc.Location("Attic", "Dusty.")
+        shed = loc.Location("Shed", "Full of tools.")
+        other = ExitGraph([shed])
+        self.assertEqual(other.distance(shed, shed), 0)
+        self.assertEqual(self.graph.distance(self.hall, self.tower), 1)
+        # adding an exit elsewhere leaves this graph's trees alone
+        shed.add_exit(loc.Exit(attic, "ladder"))
+        self.assertEqual(len(self.graph._trees), 1)
+        self.assertEqual(len(other._trees), 0)
+        self.assertIn(attic, other)
+        self.assertNotIn(attic, self.graph)
+        # only the new edge is added
+        exits = list(self.graph._exits)
+        self.tower.add_exit(loc.Exit(attic, "hatch"))
+        self.assertEqual(self.graph._exits[:-1], exits)
+        self.assertEqual(len(self.graph._trees), 0)
+        self.assertEqual(self.graph.distance(self.hall, attic), 2)
+        self.assertEqual(other.distance(shed, attic), 1)
+
+
+class TestTravel(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = TestExitGraph("test_path")
+        self.graph.setUp()
+        self.bill = char.Character("Bill")
+        self.bill.set_location(self.graph.hall)
+
+    def tearDown(self):
+        self.bill.despawn()
+
+    def test_travel(self):
+        self.bill.command("travel Tower")
+        self.assertIs(self.bill.location, self.graph.tower)
+        self.bill.command("travel tower")
+        self.assertEqual(self.bill.msgs.get_nowait(),
+                         "You are already in Tower.")
+        self.bill.command("travel hall")
+        self.assertEqual(self.bill.msgs.get_nowait(),
+                         "Could not find a route to 'hall'.")
+        self.bill.command("travel")
+        self.assertEqual(self.bill.msgs.get_nowait(),
+                         "Provide a location to travel to.")
@@ -0,0 +1,154 @@
+"""testcases for the sharding module"""
+import queue
+import unittest
+import warnings
+from swampymud.world import World
+from swampymud.entity import Entity
+from swampymud.sharding import partition, ShardWorker, ShardedMudServer
+
+TAVERN = "tests/saves/tavern.yaml"
+
+
+def load_tavern():
+    """load the tavern world, ignoring its (intentional) warnings"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return World.from_file(TAVERN)
+
+
+class TestPartition(unittest.TestCase):
+
+    def test_partition(self):
+        world = load_tavern()
+        zones = partition(world, 2)
+        self.assertEqual(set(zones), set(world.locations))
+        self.assertEqual(sorted(zones.values()), [0, 0, 1, 1])
+        # the tavern is in the middle, so it shares a zone with a
+        # neighbor
+        self.assertEqual(zones["tavern"], 0)
+        self.assertEqual(partition(world, 1),
+                         dict.fromkeys(world.locations, 0))
+
+
+class Doorman(Entity):
+    """entity that records every character entering / leaving"""
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def on_enter(self, char):
+        self.events.append(("enter", str(char)))
+
+    def on_exit(self, char):
+        self.events.append(("exit", str(char)))
+
+    def on_message(self, msg):
+        pass
+
+
+class TestShardWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.zones = {"tavern": 0, "upstairs": 0,
+                      "exterior": 1, "basement": 1}
+        self.inside = ShardWorker(load_tavern(), self.zones, 0)
+        self.outside = ShardWorker(load_tavern(), self.zones, 1)
+
+    def test_handoff(self):
+        worker = self.inside
+        worker.handle(("join", 7, "Wizard", "tavern"))
+        worker.handle(("msg", 7, "Gandalf"))
+        (kind, output), = worker.drain()
+        self.assertEqual(kind, "out")
+        self.assertEqual(output[0],
+                         (7, "Welcome to our SwampyMud! You are a Wizard"))
+        wizard = worker.players[7]
+        wizard.inv.add_item(self.inside.world.item_classes["Gold"](), 3)
+        # moving within the zone does not cause a handoff
+        worker.handle(("msg", 7, "go upstairs"))
+        worker.handle(("msg", 7, "go downstairs"))
+        self.assertEqual([kind for kind, *_ in worker.drain()], [])
+        # going outside crosses into zone 1
+        worker.handle(("msg", 7, "go outside"))
+        handoff, = worker.drain()
+        self.assertEqual(handoff[:3], ("handoff", 7, "exterior"))
+        self.assertNotIn(7, worker.players)
+        self.assertNotIn(wizard,
+                         worker.world.locations["exterior"].characters)
+        # requests for the player are bounced back to the front-end
+        worker.handle(("msg", 7, "look"))
+        self.assertEqual(worker.drain(), [("bounce", ("msg", 7, "look"))])
+        # the other worker recreates the character
+        self.outside.handle(("enter", 7, "exterior", handoff[3]))
+        wizard = self.outside.players[7]
+        self.assertEqual(str(wizard), "Gandalf")
+        self.assertEqual(type(wizard).__name__, "Wizard")
+        self.assertEqual(wizard.inv.item_count, 3)
+        exterior = self.outside.world.locations["exterior"]
+        self.assertIn(wizard, exterior.characters)
+        self.outside.handle(("quit", 7))
+        self.assertEqual(self.outside.drain(),
+                         [("broadcast", "Gandalf quit the game.")])
+        self.assertNotIn(wizard, exterior.characters)
+
+    def test_hooks(self):
+        """test that entity hooks run once, in the worker that owns the
+        location"""
+        doormen = {}
+        for worker in (self.inside, self.outside):
+            for symbol in ("tavern", "exterior"):
+                doorman = Doorman()
+                doorman.set_location(worker.world.locations[symbol])
+                doormen[worker.zone, symbol] = doorman
+        self.inside.handle(("join", 7, "Wizard", "tavern"))
+        self.inside.handle(("msg", 7, "Gandalf"))
+        doormen[0, "tavern"].events.clear()
+        self.inside.handle(("msg", 7, "travel Swampy Tavern Exterior"))
+        handoff, = [reply for reply in self.inside.drain()
+                    if reply[0] == "handoff"]
+        # worker 0 does not touch its copy of the exterior
+        exterior = self.inside.world.locations["exterior"]
+        self.assertNotIn("Gandalf", map(str, exterior.characters))
+        self.assertEqual(doormen[0, "exterior"].events, [])
+        self.assertEqual(doormen[0, "tavern"].events, [("exit", "Gandalf")])
+        self.outside.handle(("enter", 7, "exterior", handoff[3]))
+        self.assertEqual(doormen[1, "exterior"].events,
+                         [("enter", "Gandalf")])
+        self.assertEqual(doormen[1, "tavern"].events, [])
+
+
+class TestShardedMudServer(unittest.TestCase):
+
+    def setUp(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.server = ShardedMudServer(TAVERN, shards=2, tcp_port=17721,
+                                           zones={"tavern": 0,
+                                                  "upstairs": 0,
+                                                  "exterior": 1,
+                                                  "basement": 1})
+        self.server.default_location = self.server.world.locations["tavern"]
+        self.server._outboxes = [queue.SimpleQueue(), queue.SimpleQueue()]
+
+    def sent(self, zone):
+        """return (and clear) the requests queued for [zone]"""
+        outbox = self.server._outboxes[zone]
+        return [outbox.get_nowait() for _ in range(outbox.qsize())]
+
+    def test_routing(self):
+        server = self.server
+        server.on_player_join(0)
+        server.on_player_msg(0, "go outside")
+        join, msg = self.sent(0)
+        self.assertEqual(join[:2], ("join", 0))
+        self.assertEqual(msg, ("msg", 0, "go outside"))
+        server.on_shard_reply(0, ("out", [(0, "hello"), (5, "nobody")]))
+        self.assertEqual(server.players[0].msgs.get_nowait(), "hello")
+        server.on_shard_reply(0, ("handoff", 0, "exterior", {}))
+        self.assertEqual(self.sent(1), [("enter", 0, "exterior", {})])
+        # requests that arrive after a handoff are rerouted
+        server.on_shard_reply(0, ("bounce", ("msg", 0, "look")))
+        self.assertEqual(self.sent(1), [("msg", 0, "look")])
+        server.on_player_quit(0)
+        self.assertEqual(self.sent(1), [("quit", 0)])
+        self.assertNotIn(0, server.players)
@@ -0,0 +1,115 @@
+"""testcases for the telnet module"""
+import unittest
+import zlib
+from swampymud import telnet
+from swampymud.telnet import TelnetSession, IAC, DO, DONT, WILL, WONT, \
+    SB, SE
+
+
+def cmd(*codes):
+    """convenience function for building telnet commands"""
+    return bytes(codes)
+
+
+class TestTelnetSession(unittest.TestCase):
+
+    def setUp(self):
+        self.session = TelnetSession()
+        self.start = self.session.start()
+
+    def test_start(self):
+        self.assertEqual(self.start,
+                         cmd(IAC, WILL, telnet.MCCP2,
+                             IAC, WILL, telnet.CHARSET,
+                             IAC, DO, telnet.NAWS,
+                             IAC, DO, telnet.TTYPE))
+        # without compression, MCCP2 is not offered
+        self.assertNotIn(cmd(IAC, WILL, telnet.MCCP2),
+                         TelnetSession(compress=False).start())
+
+    def test_lines(self):
+        session = self.session
+        self.assertEqual(session.feed(b"look\r\nsay hi"), ["look"])
+        self.assertEqual(session.feed(b"\r\0go north\n"),
+                         ["say hi", "go north"])
+        # commands are stripped out, even in the middle of a line
+        self.assertEqual(session.feed(b"he" + cmd(IAC, telnet.NOP) +
+                                      b"llo\r\n"), ["hello"])
+        # escaped IAC bytes are kept
+        self.assertEqual(session.feed(b"\xff\xff\n"), ["\xff"])
+        # commands may be split across reads
+        self.assertEqual(session.feed(cmd(IAC)), [])
+        self.assertEqual(session.feed(cmd(WILL, telnet.NAWS) + b"x\n"), ["x"])
+        self.assertEqual(session.data_to_send(), b"")
+
+    def test_naws_ttype(self):
+        session = self.session
+        session.feed(cmd(IAC, WILL, telnet.NAWS,
+                         IAC, SB, telnet.NAWS, 0, 80, 0, 24, IAC, SE))
+        self.assertEqual((session.width, session.height), (80, 24))
+        session.feed(cmd(IAC, WILL, telnet.TTYPE))
+        self.assertEqual(session.data_to_send(),
+                         cmd(IAC, SB, telnet.TTYPE, telnet.TTYPE_SEND,
+                             IAC, SE))
+        session.feed(cmd(IAC, SB, telnet.TTYPE, telnet.TTYPE_IS) +
+                     b"MUDLET" + cmd(IAC, SE))
+        self.assertEqual(session.terminal_type, "MUDLET")
+
+    def test_charset(self):
+        session = self.session
+        session.feed(cmd(IAC, DO, telnet.CHARSET))
+        self.assertEqual(session.data_to_send(),
+                         cmd(IAC, SB, telnet.CHARSET, telnet.CHARSET_REQUEST)
+                         + b";UTF-8" + cmd(IAC, SE))
+        session.feed(cmd(IAC, SB, telnet.CHARSET, telnet.CHARSET_ACCEPTED)
+                     + b"UTF-8" + cmd(IAC, SE))
+        self.assertEqual(session.encoding, "utf-8")
+        self.assertEqual(session.feed("café\n".encode()), ["café"])
+        self.assertEqual(session.encode("☃"), "☃".encode())
+
+    def test_refuse(self):
+        session = self.session
+        session.feed(cmd(IAC, DO, telnet.ECHO, IAC, WILL, telnet.SGA))
+        self.assertEqual(session.data_to_send(),
+                         cmd(IAC, WONT, telnet.ECHO, IAC, DONT, telnet.SGA))
+
+    def test_mccp2(self):
+        session = self.session
+        session.feed(cmd(IAC, DO, telnet.MCCP2))
+        self.assertTrue(session.compressing)
+        session.send_text("Hello!\r\n")
+        data = session.data_to_send()
+        start = cmd(IAC, SB, telnet.MCCP2, IAC, SE)
+        self.assertTrue(data.startswith(start))
+        decompressor = zlib.decompressobj()
+        self.assertEqual(decompressor.decompress(data[len(start):]),
+                         b"Hello!\r\n")
+        # replies to the client are compressed too
+        session.feed(cmd(IAC, DO, telnet.ECHO))
+        self.assertEqual(decompressor.decompress(session.data_to_send()),
+                         cmd(IAC, WONT, telnet.ECHO))
+        # turning compression off ends the stream
+        session.feed(cmd(IAC, DONT, telnet.MCCP2))
+        self.assertFalse(session.compressing)
+        self.assertEqual(decompressor.decompress(session.data_to_send()),
+                         cmd(IAC, WONT, telnet.MCCP2))
+        self.assertTrue(decompressor.eof)
+
+    def test_max_line(self):
+        session = TelnetSession(max_line=4)
+        self.assertEqual(session.feed(b"look\r\nhello"), ["look"])
+        # the rest of the long line is discarded, even across reads
+        self.assertEqual(session.feed(b" there\r\nsay\n"), [None, "say"])
+
+    def test_max_subneg(self):
+        session = self.session
+        session.feed(cmd(IAC, SB, telnet.NAWS))
+        session.feed(b"\0" * (10 * telnet.MAX_SUBNEG))
+        self.assertLessEqual(len(session._subneg), telnet.MAX_SUBNEG)
+        # the oversized subnegotiation is ignored
+        self.assertEqual(session.feed(cmd(0, 80, 0, 24, IAC, SE) + b"hi\n"),
+                         ["hi"])
+        self.assertIsNone(session.width)
+        # but later subnegotiations are handled as usual
+        session.feed(cmd(IAC, SB, telnet.NAWS, 0, 80, 0, 24, IAC, SE))
+        self.assertEqual((session.width, session.height), (80, 24))
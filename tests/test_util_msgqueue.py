@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+from swampymud.util.msgqueue import MessageQueue, OverflowPolicy
+
+def qlist(queue):
+    """empty [queue] into a list"""
+    msgs = []
+    while not queue.empty():
+        msgs.append(queue.get_nowait())
+    return msgs
+
+class TestMessageQueue(unittest.TestCase):
+
+    def test_unbounded(self):
+        mq = MessageQueue()
+        for i in range(100):
+            mq.put_nowait(str(i))
+        self.assertEqual(mq.qsize(), 100)
+        self.assertEqual(mq.nbytes, 190)
+        self.assertEqual(qlist(mq), [str(i) for i in range(100)])
+        self.assertEqual(mq.nbytes, 0)
+
+    def test_drop_oldest(self):
+        mq = MessageQueue(max_msgs=2)
+        for msg in ("a", "b", "c"):
+            mq.put_nowait(msg)
+        self.assertEqual(qlist(mq), ["b", "c"])
+        # messages can also be dropped to stay below max_bytes
+        mq = MessageQueue(max_bytes=6)
+        for msg in ("one", "two", "three"):
+            mq.put_nowait(msg)
+        self.assertEqual(qlist(mq), ["three"])
+        self.assertEqual(mq.stats, {OverflowPolicy.DROP_OLDEST: 1})
+
+    def test_encoded_size(self):
+        """test that max_bytes counts bytes of UTF-8, not characters"""
+        mq = MessageQueue(max_bytes=8)
+        for msg in ("café", "☃☃", "ok"):
+            mq.put_nowait(msg)
+        # "café" is 5 bytes and "☃☃" is 6
+        self.assertEqual(qlist(mq), ["☃☃", "ok"])
+        self.assertEqual(mq.nbytes, 0)
+
+    def test_drop_newest(self):
+        mq = MessageQueue(max_msgs=2, policy=OverflowPolicy.DROP_NEWEST)
+        for msg in ("a", "b", "c", "d"):
+            mq.put_nowait(msg)
+        self.assertEqual(qlist(mq), ["a", "b"])
+        self.assertEqual(mq.stats, {OverflowPolicy.DROP_NEWEST: 2})
+
+    def test_coalesce(self):
+        mq = MessageQueue(max_msgs=2, policy="coalesce")
+        for msg in ("a", "b", "c", "d"):
+            mq.put_nowait(msg)
+        self.assertEqual(qlist(mq), ["a\n\rb\n\rc", "d"])
+        self.assertEqual(mq.stats, {OverflowPolicy.COALESCE: 2})
+
+    def test_coalesce_bytes(self):
+        """test that COALESCE keeps as many of the newest messages as
+        fit within max_bytes (including separators)"""
+        mq = MessageQueue(max_bytes=10, policy=OverflowPolicy.COALESCE)
+        for msg in ("aa", "bb", "cc", "dd", "ee", "ff"):
+            mq.put_nowait(msg)
+        self.assertEqual(qlist(mq), ["dd\n\ree", "ff"])
+        mq = MessageQueue(max_bytes=10, policy=OverflowPolicy.COALESCE)
+        for msg in ("aaa", "bbb", "ccc", "ddd"):
+            mq.put_nowait(msg)
+        self.assertEqual(qlist(mq), ["ccc", "ddd"])
+
+    def test_disconnect(self):
+        mq = MessageQueue(max_bytes=5, policy=OverflowPolicy.DISCONNECT)
+        mq.put_nowait("hello")
+        self.assertFalse(mq.closed)
+        mq.put_nowait("!")
+        self.assertTrue(mq.closed)
+        # any later messages are ignored
+        mq.put_nowait("ignored")
+        self.assertEqual(qlist(mq), [""])
+        self.assertEqual(mq.stats, {OverflowPolicy.DISCONNECT: 1})
+
+    def test_get(self):
+        """test that a waiting consumer is woken by put_nowait"""
+        async def consume():
+            mq = MessageQueue(max_msgs=1)
+            getter = asyncio.ensure_future(mq.get())
+            await asyncio.sleep(0)
+            mq.put_nowait("hi")
+            return await getter
+        self.assertEqual(asyncio.run(consume()), "hi")
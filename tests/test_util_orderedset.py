@@ -0,0 +1,35 @@
+import unittest
+from swampymud.util.orderedset import OrderedSet
+
+
+class TestOrderedSet(unittest.TestCase):
+
+    def test_order(self):
+        party = OrderedSet(["frodo", "sam", "merry"])
+        party.add("pippin")
+        # adding a member twice should not change its position
+        party.add("sam")
+        self.assertEqual(list(party), ["frodo", "sam", "merry", "pippin"])
+        self.assertEqual(len(party), 4)
+        party.remove("sam")
+        party.add("sam")
+        self.assertEqual(list(party), ["frodo", "merry", "pippin", "sam"])
+
+    def test_membership(self):
+        party = OrderedSet()
+        self.assertFalse(party)
+        party.add("gandalf")
+        self.assertTrue(party)
+        self.assertTrue("gandalf" in party)
+        self.assertFalse("saruman" in party)
+        with self.assertRaises(KeyError):
+            party.remove("saruman")
+        party.discard("saruman")
+        party.discard("gandalf")
+        self.assertFalse("gandalf" in party)
+        self.assertEqual(len(party), 0)
+
+    def test_eq(self):
+        self.assertEqual(OrderedSet("abc"), OrderedSet("abc"))
+        self.assertNotEqual(OrderedSet("abc"), OrderedSet("cba"))
+        self.assertEqual(repr(OrderedSet("ab")), "OrderedSet(['a', 'b'])")
@@ -0,0 +1,41 @@
+import unittest
+from swampymud.util.ratelimit import TokenBucket
+
+
+class FakeClock:
+    """clock that only moves when told to"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=2, burst=3, clock=self.clock)
+
+    def test_burst(self):
+        """test that a full bucket allows [burst] tokens at once"""
+        self.assertEqual([self.bucket.take() for _ in range(4)],
+                         [True, True, True, False])
+        self.assertEqual(self.bucket.wait_time(), 0.5)
+
+    def test_refill(self):
+        """test that tokens are added at [rate] per second, up to
+        [burst]"""
+        for _ in range(3):
+            self.bucket.take()
+        self.clock.now = 0.5
+        self.assertTrue(self.bucket.take())
+        self.assertFalse(self.bucket.take())
+        self.clock.now = 100
+        self.assertEqual(self.bucket.wait_time(3), 0)
+        self.assertFalse(self.bucket.take(4))
+        self.assertTrue(self.bucket.take(3))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, TokenBucket, 0)
+        self.assertRaises(ValueError, TokenBucket, 1, burst=0)
@@ -1,6 +1,12 @@
 import unittest
 from swampymud.util.shadowdict import ShadowDict
 
+
+def all_layers(sd):
+    """return a dict mapping each key in ShadowDict [sd] to a list of
+    all the values stored under that key"""
+    return {key: sd.layers(key) for key in sd}
+
 class TestShadowdict(unittest.TestCase):
 
     def setUp(self):
@@ -105,24 +111,24 @@ class TestShadowdict(unittest.TestCase):
 
     def test_copy(self):
         self.copied = self.party.copy()
-        self.assertEqual(self.copied._dict, {
+        self.assertEqual(all_layers(self.copied), {
                                              "wizard": ["gandalf"],
                                              "thief": ["frodo"],
                                              "archer": ["legolas"]
                                             })
-        self.assertEqual(self.party._dict, {
+        self.assertEqual(all_layers(self.party), {
                                              "wizard": ["gandalf"],
                                              "thief": ["frodo"],
                                              "archer": ["legolas"]
                                             })
         # should not effect the original dict
         self.copied["wizard"] = 0x0100
-        self.assertEqual(self.copied._dict, {
+        self.assertEqual(all_layers(self.copied), {
                                              "wizard": ["gandalf", 0x0100],
                                              "thief": ["frodo"],
                                              "archer": ["legolas"]
                                             })
-        self.assertEqual(self.party._dict, {
+        self.assertEqual(all_layers(self.party), {
                                              "wizard": ["gandalf"],
                                              "thief": ["frodo"],
                                              "archer": ["legolas"]
@@ -139,14 +145,14 @@ class TestShadowdict(unittest.TestCase):
 
     def test_remove_value(self):
         self.party["wizard"] = "dumbledore"
-        self.assertEqual(self.party._dict, {
+        self.assertEqual(all_layers(self.party), {
                                              "wizard": ["gandalf", "dumbledore"],
                                              "thief": ["frodo"],
                                              "archer": ["legolas"]
                                             })
         # remove the shadowed value "gandalf" with key "wizard"
         self.party.remove_value("wizard", "gandalf")
-        self.assertEqual(self.party._dict, {
+        self.assertEqual(all_layers(self.party), {
                                              "wizard": ["dumbledore"],
                                              "thief": ["frodo"],
                                              "archer": ["legolas"]
@@ -155,7 +161,7 @@ class TestShadowdict(unittest.TestCase):
         # should remove the entire list
         # note that we can remove a value, even if it is already "exposed"
         self.party.remove_value("thief", "frodo")
-        self.assertEqual(self.party._dict, {
+        self.assertEqual(all_layers(self.party), {
                                              "wizard": ["dumbledore"],
                                              "archer": ["legolas"]
                                            })
@@ -167,7 +173,89 @@ class TestShadowdict(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.party.remove_value("wizard", "merlin")
         # check that nothing was affected
-        self.assertEqual(self.party._dict, {
+        self.assertEqual(all_layers(self.party), {
                                              "wizard": ["dumbledore"],
                                              "archer": ["legolas"]
-                                           })
\ No newline at end of file
+                                           })
+
+    def test_base(self):
+        base = {"wizard": "gandalf", "thief": "frodo"}
+        party = ShadowDict(base=base)
+        self.assertEqual(list(party.items()), [("wizard", "gandalf"),
+                                               ("thief", "frodo")])
+        party["wizard"] = "dumbledore"
+        party["archer"] = "legolas"
+        self.assertEqual(party["wizard"], "dumbledore")
+        self.assertEqual(list(party), ["wizard", "thief", "archer"])
+        self.assertEqual(len(party), 3)
+        del party["wizard"]
+        self.assertEqual(party["wizard"], "gandalf")
+        # deleting a base value hides it
+        del party["wizard"]
+        self.assertFalse("wizard" in party)
+        with self.assertRaises(KeyError):
+            party["wizard"]
+        party.remove_value("thief", "frodo")
+        self.assertEqual(list(party), ["archer"])
+        # the base itself should not be modified
+        self.assertEqual(base, {"wizard": "gandalf", "thief": "frodo"})
+        with self.assertRaises(KeyError):
+            party.remove_value("thief", "frodo")
+        with self.assertRaises(ValueError):
+            party.remove_value("archer", "robin hood")
+
+    def test_get(self):
+        lookups = []
+
+        class Base(dict):
+            def __getitem__(self, key):
+                lookups.append(key)
+                return super().__getitem__(key)
+
+        party = ShadowDict(base=Base(wizard="gandalf"))
+        party["archer"] = "legolas"
+        self.assertEqual(party.get("archer"), "legolas")
+        self.assertEqual(party.get("wizard"), "gandalf")
+        self.assertEqual(party.get("thief", "nobody"), "nobody")
+        self.assertIsNone(party.get("thief"))
+        # the base is only checked once per lookup
+        self.assertEqual(lookups, ["wizard", "thief", "thief"])
+
+    def test_push_remove(self):
+        token = self.party.push("wizard", "saruman")
+        self.party["wizard"] = "dumbledore"
+        self.assertEqual(self.party.layers("wizard"),
+                         ["gandalf", "saruman", "dumbledore"])
+        # remove the shadowed value by its token
+        self.party.remove(token)
+        self.assertEqual(self.party.layers("wizard"),
+                         ["gandalf", "dumbledore"])
+        # cannot remove the same value twice
+        with self.assertRaises(KeyError):
+            self.party.remove(token)
+        # removing the last value should remove the key
+        token = self.party.push("knight", "lancelot")
+        self.assertEqual(self.party["knight"], "lancelot")
+        self.party.remove(token)
+        self.assertFalse("knight" in self.party)
+        self.assertEqual(self.party.layers("knight"), [])
+        # tokens also work with a base
+        based = ShadowDict(base={"wizard": "gandalf"})
+        token = based.push("wizard", "merlin")
+        self.assertEqual(based.layers("wizard"), ["gandalf", "merlin"])
+        based.remove(token)
+        self.assertEqual(based["wizard"], "gandalf")
+
+    def test_version(self):
+        based = ShadowDict(base={"wizard": "gandalf"})
+        self.assertFalse(based.modified)
+        version = based.version
+        token = based.push("wizard", "merlin")
+        self.assertTrue(based.modified)
+        self.assertNotEqual(based.version, version)
+        version = based.version
+        based.remove(token)
+        self.assertNotEqual(based.version, version)
+        self.assertFalse(based.modified)
+        del based["wizard"]
+        self.assertTrue(based.modified)
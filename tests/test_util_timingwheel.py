@@ -0,0 +1,56 @@
+import unittest
+from swampymud.util.timingwheel import TimingWheel
+
+class TestTimingWheel(unittest.TestCase):
+
+    def setUp(self):
+        self.wheel = TimingWheel(size=4)
+
+    def run_ticks(self, ticks):
+        """advance the wheel [ticks] times, returning the due objects
+        from each tick"""
+        return [sorted(self.wheel.advance()) for _ in range(ticks)]
+
+    def test_schedule(self):
+        self.wheel.schedule("goblin", 1)
+        self.wheel.schedule("troll", 3)
+        self.assertEqual(self.run_ticks(6), [
+            ["goblin"], ["goblin"], ["goblin", "troll"],
+            ["goblin"], ["goblin"], ["goblin", "troll"]
+        ])
+        self.assertEqual(len(self.wheel), 2)
+        self.assertTrue("troll" in self.wheel)
+
+    def test_long_interval(self):
+        """test intervals longer than the wheel itself"""
+        self.wheel.schedule("dragon", 10)
+        results = self.run_ticks(20)
+        due = [tick + 1 for tick, objs in enumerate(results) if objs]
+        self.assertEqual(due, [10, 20])
+        # intervals that are a multiple of the size
+        self.wheel.cancel("dragon")
+        self.wheel.schedule("wyvern", 8)
+        results = self.run_ticks(16)
+        due = [tick + 1 for tick, objs in enumerate(results) if objs]
+        self.assertEqual(due, [8, 16])
+
+    def test_cancel(self):
+        self.wheel.schedule("goblin", 2)
+        self.wheel.schedule("troll", 2)
+        self.wheel.cancel("goblin")
+        # cancelling an unscheduled object does nothing
+        self.wheel.cancel("orc")
+        self.assertEqual(self.run_ticks(2), [[], ["troll"]])
+        self.assertFalse("goblin" in self.wheel)
+        self.assertEqual(len(self.wheel), 1)
+
+    def test_reschedule(self):
+        self.wheel.schedule("goblin", 1)
+        self.wheel.schedule("goblin", 2)
+        self.assertEqual(self.run_ticks(4), [[], ["goblin"], [], ["goblin"]])
+
+    def test_bad_interval(self):
+        with self.assertRaises(ValueError):
+            self.wheel.schedule("goblin", 0)
+        with self.assertRaises(ValueError):
+            self.wheel.schedule("goblin", 1.5)
@@ -1,5 +1,9 @@
 """unit tests for the swampymud.world module"""
+import asyncio
 import unittest
+import os
+import shutil
+import tempfile
 import importlib
 import warnings
 from swampymud import world as mudworld
@@ -92,6 +96,47 @@ class TestLoad(unittest.TestCase):
         self.assertEqual(result, expected)
 
 
+class TestCache(unittest.TestCase):
+    """test case for the binary cache used by read_worldfile"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.save_name = os.path.join(self.tmpdir, "simple.yaml")
+        shutil.copy("tests/saves/simple.yaml", self.save_name)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cache(self):
+        original = mudworld.read_worldfile(self.save_name)
+        cached = mudworld.read_worldfile(self.save_name, use_cache=True)
+        self.assertEqual(cached, original)
+        self.assertTrue(os.path.exists(self.save_name + ".cache"))
+        # the second read should come from the cache
+        cached = mudworld.read_worldfile(self.save_name, use_cache=True)
+        self.assertEqual(cached, original)
+        # touching the file forces a hash check, but same data
+        os.utime(self.save_name, ns=(0, 0))
+        cached = mudworld.read_worldfile(self.save_name, use_cache=True)
+        self.assertEqual(cached, original)
+
+    def test_stale_cache(self):
+        """the cache should be ignored if the world file changes"""
+        mudworld.read_worldfile(self.save_name, use_cache=True)
+        with open(self.save_name, "a") as save_file:
+            save_file.write("\n  Boring House Interior: Abra\n")
+        os.utime(self.save_name, ns=(0, 0))
+        cached = mudworld.read_worldfile(self.save_name, use_cache=True)
+        self.assertEqual(cached, mudworld.read_worldfile(self.save_name))
+
+    def test_bad_cache(self):
+        """a corrupted cache should be ignored"""
+        with open(self.save_name + ".cache", "w") as cache_file:
+            cache_file.write("garbage")
+        cached = mudworld.read_worldfile(self.save_name, use_cache=True)
+        self.assertEqual(cached, mudworld.read_worldfile(self.save_name))
+
+
 class TestPrelude(unittest.TestCase):
     """test case for prelude-related functions"""
 
@@ -325,8 +370,61 @@ class TestPersonae(unittest.TestCase):
             "Omitted 5 field(s). (Bad symbol.)"
         ])
 
-
-
+    def test_update_symbols(self):
+        """test that update_symbols replaces symbols, or raises a
+        KeyError for a bad symbol"""
+        person = import_class("tests.script.social", "Person")
+        data = {"_type": "^Person", "friends": ["$Jane", "Bill"]}
+        self.assertEqual(
+            mudworld.update_symbols(data, {"Jane": "jane_obj"},
+                                    {"Person": person}),
+            {"_type": person, "friends": ["jane_obj", "Bill"]}
+        )
+        with self.assertRaises(KeyError):
+            mudworld.update_symbols(data, {}, {"Person": person})
+
+    def test_resolve_symbols(self):
+        """test that resolve_symbols checks and updates in one pass"""
+        person = import_class("tests.script.social", "Person")
+        obj_names = {"Jane": "jane_obj", "Bill": "bill_obj"}
+        type_names = {"Person": person}
+        data = {
+            "John": {
+                "_type": "^Person",
+                "friends": ["$Jane", "$Zach", "$Bill"],
+                "nested": [{"pet": "$Rex"}, {"pet": "$Jane"}],
+                "age": 30
+            },
+            "Zach": {"_type": "^Whoops"}
+        }
+        errors = []
+        resolved = mudworld.resolve_symbols(data, obj_names, type_names,
+                                            errors)
+        self.assertEqual(resolved, {
+            "John": {
+                "_type": person,
+                "friends": ["jane_obj", "bill_obj"],
+                "nested": [{}, {"pet": "jane_obj"}],
+                "age": 30
+            },
+            "Zach": {}
+        })
+        # the original data should be untouched
+        self.assertEqual(data["John"]["friends"], ["$Jane", "$Zach", "$Bill"])
+        self.assertEqual(errors, [
+            (["John", "friends", 1], "$Zach"),
+            (["John", "nested", 0, "pet"], "$Rex"),
+            (["Zach", "_type"], "^Whoops"),
+        ])
+        with warnings.catch_warnings(record=True) as warn_list:
+            warnings.simplefilter("always")
+            mudworld.warn_bad_symbols(errors)
+        self.assertEqual([str(warn.message) for warn in warn_list], [
+            "Unknown object symbol '$Zach' at 'John.friends[1]'.",
+            "Unknown object symbol '$Rex' at 'John.nested[0].pet'.",
+            "Unknown type symbol '^Whoops' at 'Zach._type'.",
+            "Omitted 3 field(s). (Bad symbol.)"
+        ])
 
     def test_skim_empty(self):
         """test that no locations are skimmed from empty personae"""
@@ -636,6 +734,49 @@ class TestWorld(unittest.TestCase):
         inside, = tuple(house.exits)
         self.assertTrue(inside.destination is interior)
 
+    def test_to_file(self):
+        """to_file should stream out the same data as save()"""
+        world = mudworld.World.from_file("tests/saves/simple.yaml")
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for name in ("simple.yaml", "simple.yaml.gz"):
+                save_name = os.path.join(tmpdir, name)
+                world.to_file(save_name)
+                self.assertEqual(mudworld.read_worldfile(save_name),
+                                 world.save())
+            # the .gz file should actually be compressed
+            with open(save_name, "rb") as save_file:
+                self.assertEqual(save_file.read(2), b"\x1f\x8b")
+            # cached reads should handle gzip too
+            self.assertEqual(mudworld.read_worldfile(save_name, True),
+                             world.save())
+            reloaded = mudworld.World.from_file(save_name)
+            self.assertEqual(set(map(str, reloaded.locations.values())),
+                             set(map(str, world.locations.values())))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_to_file_error(self):
+        """if saving fails, the existing world file is left intact"""
+        world = mudworld.World.from_file("tests/saves/simple.yaml")
+        tmpdir = tempfile.mkdtemp()
+        try:
+            save_name = os.path.join(tmpdir, "simple.yaml")
+            world.to_file(save_name)
+            with open(save_name) as save_file:
+                original = save_file.read()
+            location = next(iter(world.locations.values()))
+
+            def broken_save():
+                raise ValueError("cannot save")
+            location.save = broken_save
+            self.assertRaises(ValueError, world.to_file, save_name)
+            with open(save_name) as save_file:
+                self.assertEqual(save_file.read(), original)
+            self.assertEqual(os.listdir(tmpdir), ["simple.yaml"])
+        finally:
+            shutil.rmtree(tmpdir)
+
 
 class TestLocationScripts(unittest.TestCase):
     """integration tests for scripts that call mudscript.import_location"""
@@ -677,7 +818,7 @@ class TestLocationScripts(unittest.TestCase):
         # our two normal humans from the tavern
         human1, human2 = tuple(world.locations["Tavern"].characters)
         # get our evil dark_lord
-        dark_lord = world.locations["tower"].characters[0]
+        dark_lord, = tuple(world.locations["tower"].characters)
 
         # move dark lord to the tavern
         dark_lord.set_location(world.locations["Tavern"])
@@ -696,3 +837,97 @@ class TestLocationScripts(unittest.TestCase):
         self.assertEqual(human1.msgs.get_nowait(),
                          "You have been captured!")
         self.assertTrue(human1 in world.locations["dungeon"].characters)
+
+
+class TestAutosave(unittest.TestCase):
+    """testcase for incremental saves with a journal"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.save_name = os.path.join(self.tmpdir, "world.yaml")
+        self.world = mudworld.World.from_file("tests/saves/dark_lord.yaml")
+        self.autosave = mudworld.Autosave(self.world, self.save_name)
+
+    def tearDown(self):
+        self.autosave.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def find_location(self, world, name):
+        """return a location in [world] by its name"""
+        for loc in world.locations.values():
+            if loc.name == name:
+                return loc
+
+    def test_checkpoint(self):
+        """test that only changed objects are saved to the journal"""
+        # first checkpoint saves all 6 objects in the world
+        self.assertEqual(self.autosave.checkpoint(), 6)
+        # files are written in the background
+        self.autosave.flush()
+        self.assertTrue(os.path.exists(self.save_name))
+        journal = mudworld.journal_names(self.save_name)[1]
+        self.assertFalse(os.path.exists(journal))
+        # nothing has changed, so nothing is saved
+        self.assertEqual(self.autosave.checkpoint(), 0)
+
+        # move the dark lord to the tavern
+        tower = self.find_location(self.world, "Dark Tower")
+        tavern = self.find_location(self.world, "Half Silver Tavern")
+        dark_lord, = tuple(tower.characters)
+        dark_lord.set_location(tavern)
+        # tower, tavern, and the dark lord should be saved
+        self.assertEqual(self.autosave.checkpoint(), 3)
+        self.autosave.flush()
+        self.assertTrue(os.path.exists(journal))
+
+        # loading the world file should merge in the journal
+        world = mudworld.World.from_file(self.save_name)
+        self.assertFalse(os.path.exists(journal))
+        tower = self.find_location(world, "Dark Tower")
+        tavern = self.find_location(world, "Half Silver Tavern")
+        self.assertEqual(list(tower.characters), [])
+        self.assertEqual(sorted(map(str, tavern.characters)),
+                         ["Alan", "Mayberry", "Vennicule"])
+
+    def test_new_character(self):
+        """characters added after the first checkpoint are saved, and
+        characters that leave the world are dropped"""
+        Humanoid = import_class("tests.script.basic_rpg", "Humanoid")
+        self.autosave.checkpoint()
+        tavern = self.find_location(self.world, "Half Silver Tavern")
+        dungeon = self.find_location(self.world, "Dark Dungeon")
+        prisoner = Humanoid("Jim")
+        prisoner.set_location(dungeon)
+        alan, mayberry = tuple(tavern.characters)
+        alan.despawn()
+        self.autosave.checkpoint()
+        self.autosave.flush()
+        # merge the journal into the world file
+        old_journal, journal = mudworld.journal_names(self.save_name)
+        mudworld.compact_journal(self.save_name, [old_journal, journal])
+
+        save_data = mudworld.read_worldfile(self.save_name)
+        names = sorted(data["name"] for data in save_data["personae"].values()
+                       if data["_type"] == "^Humanoid")
+        self.assertEqual(names, ["Jim", "Mayberry"])
+        world = mudworld.World.from_file(self.save_name)
+        dungeon = self.find_location(world, "Dark Dungeon")
+        self.assertEqual(list(map(str, dungeon.characters)), ["Jim"])
+
+    def test_compact(self):
+        """test that compaction runs after any pending journal writes"""
+        self.autosave.checkpoint()
+        tower = self.find_location(self.world, "Dark Tower")
+        tavern = self.find_location(self.world, "Half Silver Tavern")
+        dark_lord, = tuple(tower.characters)
+        dark_lord.set_location(tavern)
+        self.autosave.checkpoint()
+
+        async def compact():
+            await self.autosave.compact()
+        asyncio.run(compact())
+        for journal in mudworld.journal_names(self.save_name):
+            self.assertFalse(os.path.exists(journal))
+        world = mudworld.World.from_file(self.save_name)
+        tower = self.find_location(world, "Dark Tower")
+        self.assertEqual(list(tower.characters), [])